@@ -1,9 +1,11 @@
-from flask import Flask, render_template
+from flask import Flask, render_template, jsonify
 from flask_cors import CORS
 from .config import Config
 from .extensions import mongo, bcrypt, jwt, socketio
+from .models import indexes
+from .cli import register_cli
 
-from .routes import auth, profile, file_upload, data, token_usage, file_routes,file_upload, otp_auth, project_routes, admin_routes, book_routes, collection_routes
+from .routes import auth, profile, file_upload, data, token_usage, file_routes,file_upload, otp_auth, project_routes, admin_routes, book_routes, collection_routes, bulk_routes
 
 
 def create_app():
@@ -21,12 +23,34 @@ def create_app():
     
     with app.app_context():
         print("MongoDB Instance:", mongo.db)
+        if app.config["APPLY_INDEXES_ON_STARTUP"]:
+            try:
+                report = indexes.apply_indexes(mongo)
+                if report["created"]:
+                    print("Created indexes:", ", ".join(report["created"]))
+                for error in report["errors"]:
+                    print(f"Could not create index {error['index']}: {error['error']}")
+            except Exception as e:
+                print(f"Could not apply indexes: {e}")
         
     from app import socket_events
         
     @app.route("/")
     def index():
         return render_template("index.html")
+
+    @app.route("/ready")
+    def ready():
+        """Readiness probe: fails while a required index is missing."""
+        try:
+            report = indexes.readiness_report(mongo)
+        except Exception as e:
+            return jsonify({"status": "unavailable", "error": str(e)}), 503
+        if report["requiredMissing"]:
+            return jsonify({"status": "missing-indexes", "missing": report["missing"]}), 503
+        return jsonify({"status": "ready"}), 200
+
+    register_cli(app)
     
     # Register blueprints
     app.register_blueprint(auth.bp)
@@ -40,6 +64,7 @@ def create_app():
     app.register_blueprint(admin_routes.admin_bp)
     app.register_blueprint(book_routes.book_bp)
     app.register_blueprint(collection_routes.collection_bp)
+    app.register_blueprint(bulk_routes.bulk_bp)
 
 
     return app
\ No newline at end of file
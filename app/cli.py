@@ -0,0 +1,53 @@
+import json
+import click
+from .extensions import mongo
+from .models import access_model, indexes, ocr_model
+from .helpers.mailer import deliver_outbox
+from .helpers.response_cache import BOOKS, invalidate
+
+def register_cli(app):
+    @app.cli.group("indexes")
+    def indexes_cli():
+        """Manage the MongoDB indexes declared in app/models/indexes.py."""
+
+    @indexes_cli.command("apply")
+    def apply_indexes_command():
+        """Create any missing indexes."""
+        report = indexes.apply_indexes(mongo)
+        click.echo(json.dumps(report, indent=2))
+        if report["errors"]:
+            raise SystemExit(1)
+
+    @indexes_cli.command("check")
+    def check_indexes_command():
+        """Report missing, unregistered and unused indexes; exits 1 if a required index is missing."""
+        report = indexes.check_indexes(mongo)
+        click.echo(json.dumps(report, indent=2))
+        if report["requiredMissing"]:
+            raise SystemExit(1)
+
+    @app.cli.group("migrate")
+    def migrate_cli():
+        """One-off data migrations."""
+
+    @migrate_cli.command("ocr-status")
+    def migrate_ocr_status_command():
+        """Mirror OCR status and progress onto every book."""
+        written = ocr_model.backfill_book_ocr_status(mongo)
+        invalidate(BOOKS)
+        click.echo(f"Updated {written} books")
+
+    @migrate_cli.command("user-access")
+    def migrate_user_access_command():
+        """Build the materialized access sets of every user."""
+        written = access_model.rebuild_all_user_access(mongo)
+        click.echo(f"Rebuilt access for {written} users")
+
+    @app.cli.group("email")
+    def email_cli():
+        """Outgoing email."""
+
+    @email_cli.command("deliver")
+    def deliver_email_command():
+        """Send every due message in the email outbox."""
+        click.echo(json.dumps(deliver_outbox()))
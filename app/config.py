@@ -1,17 +1,115 @@
 import os
+import json
 from datetime import timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
 
 
 class Config:
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/user")
     JWT_SECRET_KEY = os.getenv("keepsecure", "NOTHINGISECURE")
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=12) 
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7) 
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=12)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)
 
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app/uploads")
-    
+    BOOK_UPLOAD_FOLDER = os.getenv("BOOK_UPLOAD_FOLDER", "Uploads/books")
+
     ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
-    
-    
+
+    # List endpoints: default and maximum page size for cursor pagination
+    PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 50))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 500))
+    NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", 500))
+
+    # Catalog response cache: Redis when reachable, otherwise an in-process LRU
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", os.getenv("REDIS_URL", ""))
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+
+    # Per-user authorization context (role, status, projects), reused across
+    # requests until the user's auth version changes or the TTL runs out
+    AUTH_CONTEXT_TTL = int(os.getenv("AUTH_CONTEXT_TTL", 60))
+    AUTH_CONTEXT_MAX_ENTRIES = int(os.getenv("AUTH_CONTEXT_MAX_ENTRIES", 10000))
+
+    # Outgoing email, queued in the email_outbox collection and delivered by a
+    # worker over pooled SMTP connections. EMAIL_BACKEND=file writes .eml files
+    # to EMAIL_SINK_FOLDER instead; a local SMTP sink (EMAIL_HOST=localhost,
+    # EMAIL_USE_TLS=false, no EMAIL_USER) also works for offline testing
+    EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "smtp")
+    EMAIL_HOST = os.getenv("EMAIL_HOST", "localhost")
+    EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
+    EMAIL_USER = os.getenv("EMAIL_USER", "")
+    EMAIL_PASS = os.getenv("EMAIL_PASS", "")
+    EMAIL_FROM = os.getenv("EMAIL_FROM", EMAIL_USER)
+    EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
+    EMAIL_SINK_FOLDER = os.getenv("EMAIL_SINK_FOLDER", os.path.join(os.path.dirname(os.path.dirname(__file__)), "app/cache/emails"))
+    EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", 2))
+    EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 100))
+    EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", 300))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 6))
+    EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", 30))
+    EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", 7))
+
+    # Most operations accepted by one POST /api/bulk request
+    BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", 1000))
+
+    # Create the indexes declared in app/models/indexes.py when the app starts
+    APPLY_INDEXES_ON_STARTUP = os.getenv("APPLY_INDEXES_ON_STARTUP", "true").lower() == "true"
+
+    # Storage quotas (0 means unlimited)
+    MAX_TOTAL_UPLOAD_MB = int(os.getenv("MAX_TOTAL_UPLOAD_MB", 150))
+    MAX_CONTENT_LENGTH = MAX_TOTAL_UPLOAD_MB * 1024 * 1024
+    USER_STORAGE_QUOTA_MB = {
+        "user": int(os.getenv("USER_STORAGE_QUOTA_MB", 1024)),
+        "project_manager": int(os.getenv("PM_STORAGE_QUOTA_MB", 2048)),
+        "book_manager": int(os.getenv("BM_STORAGE_QUOTA_MB", 20480)),
+        "admin": int(os.getenv("ADMIN_STORAGE_QUOTA_MB", 0)),
+    }
+    ROLE_STORAGE_QUOTA_MB = {
+        "user": int(os.getenv("ROLE_USER_STORAGE_QUOTA_MB", 0)),
+        "project_manager": int(os.getenv("ROLE_PM_STORAGE_QUOTA_MB", 0)),
+        "book_manager": int(os.getenv("ROLE_BM_STORAGE_QUOTA_MB", 0)),
+        "admin": int(os.getenv("ROLE_ADMIN_STORAGE_QUOTA_MB", 0)),
+    }
+    STORAGE_RECONCILE_WORKERS = int(os.getenv("STORAGE_RECONCILE_WORKERS", 8))
+
+    # File serving: "python" streams from Flask, "x-accel" hands off to nginx,
+    # "x-sendfile" hands off to Apache/lighttpd
+    FILE_SERVING_MODE = os.getenv("FILE_SERVING_MODE", "python")
+    USE_X_SENDFILE = FILE_SERVING_MODE == "x-sendfile"
+    X_ACCEL_UPLOADS_PREFIX = os.getenv("X_ACCEL_UPLOADS_PREFIX", "/_protected/uploads")
+    X_ACCEL_BOOKS_PREFIX = os.getenv("X_ACCEL_BOOKS_PREFIX", "/_protected/books")
+    X_ACCEL_PAGES_PREFIX = os.getenv("X_ACCEL_PAGES_PREFIX", "/_protected/pages")
+    X_ACCEL_EXPORTS_PREFIX = os.getenv("X_ACCEL_EXPORTS_PREFIX", "/_protected/exports")
+    FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", 3600))
+
+    # Single-page extraction
+    PAGE_CACHE_FOLDER = os.getenv("PAGE_CACHE_FOLDER", os.path.join(os.path.dirname(os.path.dirname(__file__)), "app/cache/pages"))
+    PDF_DOCUMENT_POOL_SIZE = int(os.getenv("PDF_DOCUMENT_POOL_SIZE", 16))
+    MAX_EXTRACT_PAGES = int(os.getenv("MAX_EXTRACT_PAGES", 20))
+    PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", 512))
+
+    # Exports
+    EXPORT_FOLDER = os.getenv("EXPORT_FOLDER", os.path.join(os.path.dirname(os.path.dirname(__file__)), "app/cache/exports"))
+    EXPORT_TMP_TTL = int(os.getenv("EXPORT_TMP_TTL", 3600))
+    EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", 1024))
+    EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 4))
+
+    # Signed file URLs
+    FILE_URL_SECRET = os.getenv("FILE_URL_SECRET", JWT_SECRET_KEY)
+    REQUIRE_SIGNED_FILE_URLS = os.getenv("REQUIRE_SIGNED_FILE_URLS", "true").lower() == "true"
+    SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", 3600))
+    SIGNED_EXPORT_URL_TTL = int(os.getenv("SIGNED_EXPORT_URL_TTL", 7 * 24 * 3600))
+
+    # LLM usage rollups (retention in days, 0 keeps forever)
+    LLM_TOKEN_PRICES = json.loads(os.getenv("LLM_TOKEN_PRICES", "{}"))  # {"openai": {"prompt": 0.5, "completion": 1.5}} per 1M tokens
+    USAGE_EVENT_RETENTION_DAYS = int(os.getenv("USAGE_EVENT_RETENTION_DAYS", 14))
+    USAGE_HOURLY_RETENTION_DAYS = int(os.getenv("USAGE_HOURLY_RETENTION_DAYS", 90))
+    USAGE_DAILY_RETENTION_DAYS = int(os.getenv("USAGE_DAILY_RETENTION_DAYS", 0))
+    USAGE_ROLLUP_LAG_SECONDS = int(os.getenv("USAGE_ROLLUP_LAG_SECONDS", 60))
+
+
 
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
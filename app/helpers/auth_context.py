@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from bson import ObjectId
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from ..extensions import mongo
+from ..models import access_model
+from ..models.user import UserRoles
+from .response_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+class AuthContext:
+    """
+    Who the caller is: role, account status, and the projects, collections and
+    books they can reach, taken from their materialized access sets.
+    """
+
+    def __init__(self, user, access):
+        self.user = user
+        self.user_id = str(user["_id"])
+        self.role = user.get("role")
+        self.is_active = bool(user.get("isActive", False))
+        self.is_blocked = bool(user.get("isBlocked", False))
+        self.owned_project_ids = frozenset(str(pid) for pid in access.get("ownedProjectIds", []))
+        self.project_ids = frozenset(str(pid) for pid in access.get("projectIds", []))
+        self.collection_ids = frozenset(str(cid) for cid in access.get("collectionIds", []))
+        self.book_ids = frozenset(str(bid) for bid in access.get("bookIds", []))
+
+    @property
+    def allowed(self):
+        """Same rule as login: blocked users never, inactive users only when admin."""
+        return not self.is_blocked and (self.is_active or self.role == UserRoles.ADMIN)
+
+    def owns_project(self, project_id):
+        return str(project_id) in self.owned_project_ids
+
+    def in_project(self, project_id):
+        return str(project_id) in self.project_ids
+
+    def can_access_collection(self, collection_id):
+        return str(collection_id) in self.collection_ids
+
+    def can_access_book(self, book_id):
+        return str(book_id) in self.book_ids
+
+    def can_read_book(self, book_id, visibility):
+        """Books the caller reaches through their access sets, any public book, and everything for admins."""
+        return self.role == UserRoles.ADMIN or visibility == "public" or self.can_access_book(book_id)
+
+    def unreadable_book_ids(self, book_ids):
+        """
+        The given book ids the caller may not read (see can_read_book), including
+        ones that do not exist, with one query for those outside the access sets.
+        """
+        rest = [ObjectId(bid) for bid in dict.fromkeys(str(bid) for bid in book_ids) if not self.can_access_book(bid)]
+        if not rest:
+            return []
+        readable = {book["_id"] for book in mongo.db.books.find({"_id": {"$in": rest}}, {"visibility": 1})
+                    if self.can_read_book(book["_id"], book.get("visibility"))}
+        return [str(bid) for bid in rest if bid not in readable]
+
+class _ContextCache:
+    """Process-local contexts, each stored with the auth version it was built at."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry or entry[0] != version or entry[1] < time.monotonic():
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[2]
+
+    def set(self, user_id, version, context, ttl, max_entries):
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + ttl, context)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+_cache = _ContextCache()
+
+def _version_key(user_id):
+    return f"auth:{user_id}"
+
+def _load_context(user_id):
+    user = mongo.db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    if not user:
+        return None
+    return AuthContext(user, access_model.get_user_access(mongo, user_id))
+
+def get_auth_context():
+    """
+    The caller's AuthContext, resolved once per request. Between requests it is
+    kept for AUTH_CONTEXT_TTL seconds and reused while the user's auth version
+    (held in the response cache backend, so shared through Redis) is unchanged.
+    Returns None for an unknown or malformed identity.
+    """
+    if has_request_context() and "auth_context" in g:
+        return g.auth_context
+
+    user_id = str(get_jwt_identity())
+    if not ObjectId.is_valid(user_id):
+        return None
+    try:
+        version = get_response_cache().versions([_version_key(user_id)])[0]
+    except Exception as e:
+        logger.error(f"Auth version unavailable, loading context uncached: {e}")
+        version = None
+
+    context = _cache.get(user_id, version) if version is not None else None
+    if context is None:
+        context = _load_context(user_id)
+        if context is not None and version is not None:
+            _cache.set(user_id, version, context, current_app.config["AUTH_CONTEXT_TTL"],
+                       current_app.config["AUTH_CONTEXT_MAX_ENTRIES"])
+    if has_request_context():
+        g.auth_context = context
+    return context
+
+def invalidate_auth_context(*user_ids):
+    """Call after changing a user's role, status, profile or project memberships."""
+    user_ids = [str(user_id) for user_id in user_ids if user_id]
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        _cache.discard(user_id)
+    try:
+        get_response_cache().bump([_version_key(user_id) for user_id in user_ids])
+    except Exception as e:
+        logger.error(f"Could not invalidate auth context for {', '.join(user_ids)}: {e}")
+    if has_request_context() and g.get("auth_context") and g.auth_context.user_id in user_ids:
+        g.pop("auth_context")
+
+def refresh_access(*user_ids):
+    """Rebuilds the access sets of the given users after a membership change and drops their cached contexts."""
+    invalidate_auth_context(*access_model.rebuild_user_access(mongo, user_ids))
@@ -1,16 +1,31 @@
 from functools import wraps
-from flask_jwt_extended import get_jwt_identity
-from flask import jsonify
-from ..models.user import User
+from bson import ObjectId
+from flask import g, jsonify
+from ..extensions import mongo
+from .auth_context import get_auth_context
 
 def role_required(allowed_roles):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            user_id = get_jwt_identity()
-            user = User.find_by_id(user_id)
-            if not user or user.get("role") not in allowed_roles:
+            context = get_auth_context()
+            if not context or context.role not in allowed_roles:
                 return jsonify({"message": "You are not authorized to access this resource."}), 403
+            if not context.allowed:
+                return jsonify({"message": "Your account is deactivated or blocked. Please contact an admin."}), 403
+            g.current_user = context.user
             return func(*args, **kwargs)
         return wrapper
     return decorator
+
+def project_owner_error(project_id, message):
+    """
+    None when the caller created the project, answered from the auth context;
+    otherwise the 404 or 403 (with `message`) response to return.
+    """
+    context = get_auth_context()
+    if context and context.owns_project(project_id):
+        return None
+    if not mongo.db["project-details"].find_one({"_id": ObjectId(project_id)}, {"_id": 1}):
+        return jsonify({"error": "Project not found"}), 404
+    return jsonify({"error": message}), 403
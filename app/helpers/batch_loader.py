@@ -0,0 +1,97 @@
+from bson import ObjectId
+from flask import g, has_app_context
+
+class BatchLoader:
+    """
+    Identity map over one collection and key field. Ids are queued with prime()
+    and every pending id is fetched in a single $in query the first time any of
+    them is loaded; a document is never fetched twice in the same loader.
+
+    With key="_id" each id maps to one document. With any other key (including
+    array fields such as "collectionIds") each id maps to the list of matching
+    documents.
+    """
+
+    def __init__(self, mongo, collection_name, key="_id", projection=None, object_ids=True):
+        self.mongo = mongo
+        self.collection_name = collection_name
+        self.key = key
+        # The key field is needed to map documents back to the ids they answer
+        self.projection = {**projection, key: 1} if projection and key != "_id" else projection
+        self.object_ids = object_ids
+        self._cache = {}
+        self._pending = set()
+        self.queries = 0
+
+    def _normalize(self, value):
+        if self.object_ids:
+            if isinstance(value, ObjectId):
+                return value
+            return ObjectId(value) if ObjectId.is_valid(str(value)) else None
+        return str(value) if value is not None else None
+
+    def prime(self, ids):
+        for value in ids:
+            normalized = self._normalize(value)
+            if normalized is not None and normalized not in self._cache:
+                self._pending.add(normalized)
+        return self
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = list(self._pending), set()
+        many = self.key != "_id"
+        for value in pending:
+            self._cache[value] = [] if many else None
+        self.queries += 1
+        for doc in self.mongo.db[self.collection_name].find({self.key: {"$in": pending}}, self.projection):
+            if not many:
+                self._cache[doc["_id"]] = doc
+                continue
+            values = doc.get(self.key)
+            for value in values if isinstance(values, list) else [values]:
+                if value in self._cache and doc not in self._cache[value]:
+                    self._cache[value].append(doc)
+
+    def load(self, value):
+        normalized = self._normalize(value)
+        if normalized is None:
+            return [] if self.key != "_id" else None
+        if normalized not in self._cache:
+            self._pending.add(normalized)
+            self._flush()
+        elif self._pending:
+            self._flush()
+        return self._cache.get(normalized)
+
+    def load_many(self, values):
+        self.prime(values)
+        self._flush()
+        return [self.load(value) for value in values]
+
+    def clear(self):
+        self._cache.clear()
+        self._pending.clear()
+
+def get_loader(mongo, collection_name, key="_id", projection=None, object_ids=True):
+    """
+    The request's loader for (collection, key, projection), kept on flask.g so
+    every model function in the request shares one identity map. Outside an app
+    context a fresh loader is returned.
+    """
+    if not has_app_context():
+        return BatchLoader(mongo, collection_name, key, projection, object_ids)
+    loaders = g.setdefault("_batch_loaders", {})
+    cache_key = (collection_name, key, tuple(sorted(projection.items())) if projection else None, object_ids)
+    if cache_key not in loaders:
+        loaders[cache_key] = BatchLoader(mongo, collection_name, key, projection, object_ids)
+    return loaders[cache_key]
+
+def clear_loaders(collection_name=None):
+    """Drops cached documents (of one collection, or all) after a write in the same request."""
+    if not has_app_context():
+        return
+    for (name, *_), loader in g.get("_batch_loaders", {}).items():
+        if collection_name is None or name == collection_name:
+            loader.clear()
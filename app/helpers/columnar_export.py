@@ -0,0 +1,126 @@
+import os
+import json
+import shutil
+import zipfile
+import tempfile
+from itertools import islice
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is optional; columnar exports answer 501 without it
+    pa = pq = ds = None
+
+COLUMNAR_FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+BATCH_SIZE = 5000
+SCHEMA_VERSION = 1
+
+STRING_FIELDS = [
+    "bookId", "userId", "chunkId", "sourceUrl", "eventName", "description", "location", "place",
+    "startDate", "endDate", "keyDetails", "day", "month", "year", "generalComments",
+]
+INT_FIELDS = ["chunkIndex", "eventIndex", "page", "yearStart", "yearEnd"]
+
+def columnar_available():
+    return pa is not None
+
+def event_schema():
+    fields = [pa.field(name, pa.string()) for name in STRING_FIELDS]
+    fields += [pa.field(name, pa.int32()) for name in INT_FIELDS]
+    fields += [
+        pa.field("participants", pa.list_(pa.string())),
+        pa.field("createdAt", pa.timestamp("ms", tz="UTC")),
+    ]
+    return pa.schema(fields, metadata={"histoai.schema_version": str(SCHEMA_VERSION)})
+
+def _as_strings(values):
+    return [None if value is None else str(value) for value in values]
+
+def events_to_batch(events, schema=None):
+    """
+    Builds one RecordBatch from a list of event documents, column by column:
+    each field is gathered once and converted by Arrow in a single call.
+    """
+    schema = schema or event_schema()
+    columns = {name: [event.get(name) for event in events] for name in schema.names}
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if field.name in STRING_FIELDS:
+            values = _as_strings(values)
+        elif field.name == "participants":
+            values = [_as_strings(value) if isinstance(value, list) else None for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def iter_event_batches(events, batch_size=BATCH_SIZE, schema=None):
+    schema = schema or event_schema()
+    events = iter(events)
+    while True:
+        chunk = list(islice(events, batch_size))
+        if not chunk:
+            return
+        yield events_to_batch(chunk, schema)
+
+def write_columnar_export(events, output_path, fmt):
+    """Writes events as a Parquet file or an Arrow IPC file, one batch at a time. Returns the row count."""
+    schema = event_schema()
+    row_count = 0
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(output_path, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(output_path, schema)
+    try:
+        for batch in iter_event_batches(events, schema=schema):
+            writer.write_batch(batch)
+            row_count += batch.num_rows
+    finally:
+        writer.close()
+    return row_count
+
+def write_partitioned_dataset(events, dataset_dir, fmt, manifest):
+    """
+    Writes events as a hive-partitioned dataset (bookId=<id>/part-N) that pandas,
+    pyarrow and DuckDB can open as one table. The manifest goes to _manifest.json,
+    which dataset readers skip. Returns the row count.
+    """
+    schema = event_schema()
+    counter = {"rows": 0}
+
+    def counted_batches():
+        for batch in iter_event_batches(events, schema=schema):
+            counter["rows"] += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted_batches(),
+        dataset_dir,
+        schema=schema,
+        format="parquet" if fmt == "parquet" else "ipc",
+        partitioning=ds.partitioning(pa.schema([("bookId", pa.string())]), flavor="hive"),
+        basename_template="part-{i}." + ("parquet" if fmt == "parquet" else "arrow"),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    with open(os.path.join(dataset_dir, "_manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump({**manifest, "format": fmt, "schemaVersion": SCHEMA_VERSION, "rows": counter["rows"]}, manifest_file, indent=2)
+    return counter["rows"]
+
+def zip_dataset(dataset_dir, zip_path, root_name):
+    """Zips a dataset directory without recompressing the already compressed files."""
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for folder, _, files in os.walk(dataset_dir):
+            for name in sorted(files):
+                path = os.path.join(folder, name)
+                archive.write(path, os.path.join(root_name, os.path.relpath(path, dataset_dir)))
+    return zip_path
+
+def build_dataset_archive(events, export_folder, zip_path, fmt, manifest, root_name):
+    """Writes the dataset into a scratch directory, zips it to zip_path and removes the scratch copy."""
+    dataset_dir = tempfile.mkdtemp(prefix="tmp-dataset-", dir=export_folder)
+    try:
+        row_count = write_partitioned_dataset(events, dataset_dir, fmt, manifest)
+        zip_dataset(dataset_dir, zip_path, root_name)
+    finally:
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+    return row_count
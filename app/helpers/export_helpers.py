@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import xlsxwriter
+from bson import ObjectId
+from flask import current_app, send_file
+from werkzeug.utils import secure_filename
+from ..models import event_model
+from ..models.user import UserRoles
+from .structured_index import iter_structured_entries
+from .file_helpers import evict_lru_files
+from .file_serving import send_stored_file
+from .signed_urls import sign_source_url
+from . import columnar_export
+
+EXPORT_COLUMNS = [column for column, _ in event_model.EXPORT_FIELDS] + ["Source URL"]
+SHEET_NAME = "Structured Data"
+# Bump when the layout of generated exports changes so cached files are rebuilt
+EXPORT_FORMAT_VERSION = 1
+
+def _is_empty_row(row):
+    return all(row[column] == "N/A" for column in EXPORT_COLUMNS if column != "Source URL")
+
+def iter_upload_events(mongo, upload, structured_path):
+    """
+    Yields an upload's event documents, from the events collection when it was
+    normalized at ingest and from the NDJSON copy of its structured data otherwise.
+    """
+    if upload.get("events_count") is not None:
+        return event_model.get_book_events(mongo, upload["_id"], {"_id": 0})
+    return (
+        event
+        for entry in iter_structured_entries(structured_path)
+        for event in event_model.normalize_structured_data([entry], upload["_id"], upload.get("user_id"))
+    )
+
+def iter_export_rows(mongo, upload, structured_path):
+    """Yields non-empty export rows one at a time. Source URLs are yielded unsigned."""
+    for event in iter_upload_events(mongo, upload, structured_path):
+        row = event_model.event_to_export_row(event)
+        if not _is_empty_row(row):
+            yield row
+
+def write_excel_export(rows, output_path, link_builder):
+    """
+    Streams rows into an xlsx file using xlsxwriter's constant_memory mode, which
+    flushes each row to a temp file as soon as the next one starts. Returns the row count.
+    """
+    workbook = xlsxwriter.Workbook(output_path, {
+        "constant_memory": True,
+        "tmpdir": os.path.dirname(output_path),
+        "strings_to_formulas": False,
+        "strings_to_urls": False
+    })
+    worksheet = workbook.add_worksheet(SHEET_NAME)
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    hyperlink_format = workbook.add_format({"font_color": "blue", "underline": 1})
+    source_url_column_index = EXPORT_COLUMNS.index("Source URL")
+
+    worksheet.write_row(0, 0, EXPORT_COLUMNS, header_format)
+    row_count = 0
+    try:
+        for row_num, row in enumerate(rows, start=1):
+            for col, column in enumerate(EXPORT_COLUMNS[:source_url_column_index]):
+                value = row.get(column)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    worksheet.write_number(row_num, col, value)
+                elif value is not None:
+                    worksheet.write_string(row_num, col, str(value))
+            url = row.get("Source URL")
+            if url and url != "N/A":
+                worksheet.write_url(row_num, source_url_column_index, link_builder(url), hyperlink_format, "Open PDF")
+            elif url:
+                worksheet.write_string(row_num, source_url_column_index, url)
+            row_count += 1
+    finally:
+        # Closing also removes the worksheet's constant_memory temp file
+        workbook.close()
+    return row_count
+
+def resolve_export_scope(mongo, context, collection_id=None, project_id=None):
+    """
+    Resolves a collection or project to the book ids it covers, checking that the
+    caller's AuthContext may read it (in their access sets, or admin). Books in it
+    that the caller cannot reach themselves are left out and listed separately.
+    Returns ({"name", "bookIds", "unreachableIds"}, 200) or ({"error"}, status).
+    """
+    is_admin = context is not None and context.role == UserRoles.ADMIN
+    scope, status = _export_scope(mongo, context, is_admin, collection_id, project_id)
+    if status != 200:
+        return scope, status
+    reachable, unreachable = [], []
+    for book_id in scope["bookIds"]:
+        (reachable if is_admin or context.can_access_book(book_id) else unreachable).append(book_id)
+    scope.update(bookIds=reachable, unreachableIds=unreachable)
+    return scope, status
+
+def _export_scope(mongo, context, is_admin, collection_id, project_id):
+    if collection_id:
+        if not ObjectId.is_valid(collection_id):
+            return {"error": "Invalid collection ID"}, 400
+        collection = mongo.db["collections"].find_one({"_id": ObjectId(collection_id)})
+        if not collection:
+            return {"error": "Collection not found"}, 404
+        if not (is_admin or (context and context.can_access_collection(collection_id))):
+            return {"error": "Unauthorized"}, 403
+        return {"name": collection.get("name") or collection_id, "bookIds": [str(bid) for bid in collection.get("bookIds", [])]}, 200
+
+    if project_id:
+        if not ObjectId.is_valid(project_id):
+            return {"error": "Invalid project ID"}, 400
+        project = mongo.db["project-details"].find_one({"_id": ObjectId(project_id)})
+        if not project:
+            return {"error": "Project not found"}, 404
+        if not (is_admin or (context and context.in_project(project_id))):
+            return {"error": "Unauthorized"}, 403
+        book_ids = [str(bid) for bid in project.get("bookIds", [])]
+        collection_ids = [ObjectId(cid) for cid in project.get("collectionIds", []) if ObjectId.is_valid(cid)]
+        if collection_ids:
+            for collection in mongo.db["collections"].find({"_id": {"$in": collection_ids}}, {"bookIds": 1}):
+                book_ids.extend(str(bid) for bid in collection.get("bookIds", []))
+        return {"name": project.get("name") or project_id, "bookIds": list(dict.fromkeys(book_ids))}, 200
+
+    return {"error": "collectionId or projectId is required"}, 400
+
+def resolve_scope_uploads(mongo, context, book_ids, projection):
+    """
+    Maps library book ids (`books` ids, as held by collections and projects) to
+    the structured-data upload linked to each by uploads.libraryBookId: the
+    caller's latest one, or anyone's latest for admins. Scope checks cover the
+    collection or project, not the uploads, so other users' uploads are never
+    read. Returns (uploads in book order, skipped entries for unmatched books).
+    """
+    query = {"libraryBookId": {"$in": list(book_ids)}}
+    if context.role != UserRoles.ADMIN:
+        query["user_id"] = context.user_id
+    latest = {}
+    for upload in mongo.db.uploads.find(query, {**projection, "libraryBookId": 1}).sort("upload_time", -1):
+        latest.setdefault(upload["libraryBookId"], upload)
+    uploads = [latest[book_id] for book_id in book_ids if book_id in latest]
+    skipped = [{"bookId": book_id, "reason": "No structured data of yours is linked to this book"}
+               for book_id in book_ids if book_id not in latest]
+    return uploads, skipped
+
+def new_export_path(extension="xlsx"):
+    export_folder = current_app.config["EXPORT_FOLDER"]
+    os.makedirs(export_folder, exist_ok=True)
+    purge_stale_exports(export_folder)
+    return os.path.join(export_folder, f"tmp-{uuid.uuid4().hex}.{extension}")
+
+def purge_stale_exports(export_folder):
+    """Removes one-off export files that a front server may have already streamed."""
+    cutoff = time.time() - current_app.config["EXPORT_TMP_TTL"]
+    for name in os.listdir(export_folder):
+        path = os.path.join(export_folder, name)
+        if name.startswith("tmp-") and os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def export_link_expiry(now=None):
+    """
+    Expiry for links written into cached exports. It is rounded up to a TTL-sized
+    bucket so repeat downloads share one file, and is always at least one TTL away.
+    """
+    ttl = current_app.config["SIGNED_EXPORT_URL_TTL"]
+    now = int(now or time.time())
+    return (now // ttl + 2) * ttl
+
+def export_cache_key(upload, structured_path, user_id, link_expiry, fmt="xlsx"):
+    """Hash of everything a generated export depends on."""
+    try:
+        stat = os.stat(structured_path)
+        structured_version = f"{stat.st_mtime_ns}:{stat.st_size}"
+    except (OSError, TypeError):
+        structured_version = "-"
+    parts = [
+        str(EXPORT_FORMAT_VERSION), fmt, str(upload["_id"]), str(user_id),
+        structured_version, str(upload.get("events_count")), str(link_expiry)
+    ]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def cached_export_path(book_id, cache_key, extension="xlsx"):
+    return os.path.join(current_app.config["EXPORT_FOLDER"], f"{book_id}-{cache_key}.{extension}")
+
+def get_cached_export(path):
+    """Returns the path if it is cached, marking it as recently used (atime) for eviction."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    os.utime(path, (time.time(), stat.st_mtime))
+    return path
+
+def store_cached_export(tmp_path, cache_path):
+    os.replace(tmp_path, cache_path)
+    evict_lru_files(os.path.dirname(cache_path), current_app.config["EXPORT_CACHE_MAX_MB"] * 1024 * 1024, keep=cache_path)
+    return cache_path
+
+def invalidate_book_exports(book_id):
+    """Drops every cached export of a book. Called when it is re-processed, renamed or deleted."""
+    export_folder = current_app.config["EXPORT_FOLDER"]
+    if not os.path.isdir(export_folder):
+        return 0
+    removed = 0
+    for name in os.listdir(export_folder):
+        if name.startswith(f"{book_id}-"):
+            try:
+                os.remove(os.path.join(export_folder, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+def build_book_export(mongo, upload, structured_path, user_id, fmt="xlsx", link_base=None):
+    """
+    Returns (cache_path, cache_key) for a book's export, generating it into the
+    export cache on a miss, or (None, None) when the book has nothing to export.
+    xlsx links are signed for user_id and prefixed with link_base; columnar
+    formats keep Source URLs unsigned, so their key has no link expiry.
+    """
+    link_expiry = export_link_expiry() if fmt == "xlsx" else 0
+    cache_key = export_cache_key(upload, structured_path, user_id, link_expiry, fmt=fmt)
+    cache_path = cached_export_path(upload["_id"], cache_key, fmt)
+    if get_cached_export(cache_path):
+        return cache_path, cache_key
+
+    export_path = new_export_path(fmt)
+    try:
+        if fmt == "xlsx":
+            def build_link(url):
+                return f"{link_base}/{sign_source_url(url, user_id, expires_at=link_expiry)}"
+            rows = iter_export_rows(mongo, upload, structured_path)
+            row_count = write_excel_export(rows, export_path, build_link)
+        else:
+            events = iter_upload_events(mongo, upload, structured_path)
+            row_count = columnar_export.write_columnar_export(events, export_path, fmt)
+    except Exception:
+        if os.path.exists(export_path):
+            os.remove(export_path)
+        raise
+
+    if not row_count:
+        os.remove(export_path)
+        return None, None
+    return store_cached_export(export_path, cache_path), cache_key
+
+def iter_bulk_export_members(app, mongo, uploads, skipped, user_id, fmt, link_base, max_workers):
+    """
+    Builds (or reuses cached) exports of several books on a thread pool and yields
+    (arcname, open file) for each one in completion order, followed by a
+    manifest.json of what was included and skipped. Cached files are opened in
+    the worker, so eviction cannot remove them before they are streamed.
+    """
+    upload_folder = app.config["UPLOAD_FOLDER"]
+    skipped = list(skipped)
+    exported = []
+    used_names = set()
+
+    def export_one(upload):
+        with app.app_context():
+            structured_path = os.path.join(upload_folder, upload.get("structured_data_path") or "")
+            cache_path, _ = build_book_export(mongo, upload, structured_path, user_id, fmt=fmt, link_base=link_base)
+            return open(cache_path, "rb") if cache_path else None
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    futures = {executor.submit(export_one, upload): upload for upload in uploads}
+    try:
+        for future in as_completed(futures):
+            upload = futures[future]
+            upload_id = str(upload["_id"])
+            book_id = upload.get("libraryBookId") or upload_id
+            try:
+                export_file = future.result()
+            except Exception as e:
+                print(f"Error exporting book {book_id}: {e}")
+                skipped.append({"bookId": book_id, "reason": "Export failed"})
+                continue
+            if export_file is None:
+                skipped.append({"bookId": book_id, "reason": "No structured data to export"})
+                continue
+
+            base_name = secure_filename(os.path.splitext(upload.get("filename") or "")[0]) or upload_id
+            arcname = f"{base_name}.{fmt}"
+            if arcname in used_names:
+                arcname = f"{base_name}-{upload_id}.{fmt}"
+            used_names.add(arcname)
+            with export_file:
+                yield arcname, export_file
+            exported.append({"bookId": book_id, "uploadId": upload_id, "file": arcname})
+
+        manifest = {"format": fmt, "exported": exported, "skipped": skipped}
+        yield "manifest.json", json.dumps(manifest, indent=2).encode("utf-8")
+    finally:
+        # On an early disconnect, stop pending work and close files nobody will read,
+        # including those of exports still running, once they finish
+        for future in futures:
+            if not future.cancel():
+                future.add_done_callback(_close_export_file)
+        executor.shutdown(wait=False)
+
+def _close_export_file(future):
+    if future.exception() is None and future.result():
+        future.result().close()
+
+def send_cached_export(cache_path, cache_key, download_name):
+    """Serves a cached export with its cache key as the ETag (sendfile or X-Accel)."""
+    return send_stored_file(
+        os.path.dirname(cache_path),
+        os.path.basename(cache_path),
+        accel_prefix=current_app.config["X_ACCEL_EXPORTS_PREFIX"],
+        download_name=download_name,
+        etag=cache_key
+    )
+
+def send_export_file(export_path, download_name):
+    """
+    Sends a one-off export. In "python" mode the file is opened and unlinked
+    straight away, and the open handle is streamed through the server's file
+    wrapper; with X-Accel/X-Sendfile the front server reads it later, so it is
+    left for purge_stale_exports.
+    """
+    if current_app.config["FILE_SERVING_MODE"] == "python":
+        export_file = open(export_path, "rb")
+        os.remove(export_path)
+        return send_file(export_file, as_attachment=True, download_name=download_name)
+    return send_stored_file(
+        os.path.dirname(export_path),
+        os.path.basename(export_path),
+        accel_prefix=current_app.config["X_ACCEL_EXPORTS_PREFIX"],
+        download_name=download_name,
+        etag=os.path.splitext(os.path.basename(export_path))[0]
+    )
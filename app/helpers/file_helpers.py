@@ -1,9 +1,14 @@
 import os
+import hashlib
+import time
 from werkzeug.utils import secure_filename
 from flask import current_app
 import fitz
 from PIL import Image
 
+# Cached files touched this recently may still be in flight to a client
+RECENT_USE_SECONDS = 120
+
 def allowed_file(filename):
     return "." in filename and \
            filename.rsplit(".", 1)[1].lower() in current_app.config["ALLOWED_EXTENSIONS"]
@@ -28,4 +33,44 @@ def create_pdf_preview(file_path):
         print(f"Failed to create preview: {e}")
         raise
 
-    return preview_filename
\ No newline at end of file
+    return preview_filename
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """Streams a file through SHA-256 and returns the hex digest."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def evict_lru_files(folder, max_bytes, keep=None):
+    """
+    Removes least recently used files (by atime) from a cache folder until it
+    fits in max_bytes. Temporary files still being written, `keep` (the entry
+    about to be served) and anything used in the last RECENT_USE_SECONDS, which
+    another request may still be sending or handing to the front server, are
+    never removed, so the folder can briefly run over budget.
+    """
+    recent = time.time() - RECENT_USE_SECONDS
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.startswith("tmp-") or name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for used_at, size, path in sorted(entries):
+        if total <= max_bytes or used_at >= recent:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
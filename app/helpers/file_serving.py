@@ -0,0 +1,55 @@
+import os
+import mimetypes
+from urllib.parse import quote
+from flask import current_app, request, send_file, jsonify, Response
+from werkzeug.security import safe_join
+
+def content_etag(stat):
+    """
+    ETag from the file's mtime and size, as nginx computes it. Stored files are
+    only ever replaced, never edited in place, so this changes whenever the
+    content does without reading the file.
+    """
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def send_stored_file(base_dir, relative_path, accel_prefix=None, download_name=None, etag=None):
+    """
+    Serves a stored file with ETag/Last-Modified validation and Range support.
+    Callers that already know a content hash can pass it as `etag` instead.
+    In "x-accel" mode only headers are returned and nginx streams the bytes from
+    `accel_prefix`; in "x-sendfile" mode Flask emits X-Sendfile via USE_X_SENDFILE.
+    """
+    file_path = safe_join(os.path.abspath(base_dir), relative_path)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({"error": "File not found"}), 404
+
+    stat = os.stat(file_path)
+    etag = etag or content_etag(stat)
+    max_age = current_app.config["FILE_CACHE_MAX_AGE"]
+
+    if current_app.config["FILE_SERVING_MODE"] == "x-accel":
+        mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        response = Response(status=200, mimetype=mimetype)
+        prefix = (accel_prefix or current_app.config["X_ACCEL_UPLOADS_PREFIX"]).rstrip("/")
+        response.headers["X-Accel-Redirect"] = f"{prefix}/{quote(relative_path)}"
+        response.headers["Accept-Ranges"] = "bytes"
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.cache_control.private = True
+        response.cache_control.max_age = max_age
+        if download_name:
+            response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+        # Range handling is left to nginx; only the validators are checked here
+        return response.make_conditional(request)
+
+    response = send_file(
+        file_path,
+        conditional=True,
+        etag=etag,
+        last_modified=stat.st_mtime,
+        max_age=max_age,
+        as_attachment=bool(download_name),
+        download_name=download_name
+    )
+    response.cache_control.private = True
+    return response
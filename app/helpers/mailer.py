@@ -0,0 +1,229 @@
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.mime.text import MIMEText
+from flask import current_app
+from ..extensions import mongo
+from ..models import outbox_model
+
+logger = logging.getLogger(__name__)
+
+class SMTPPool:
+    """
+    Keeps up to `size` logged-in SMTP connections open between deliveries, so a
+    batch pays for connect, STARTTLS and login once instead of once per message.
+    A pooled connection is checked with NOOP before reuse and replaced if the
+    server has dropped it.
+    """
+
+    def __init__(self, host, port, user, password, use_tls, size, timeout=30):
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.user:
+            smtp.login(self.user, self.password)
+        return smtp
+
+    def acquire(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except smtplib.SMTPException:
+                pass
+            self.discard(smtp)
+
+    def release(self, smtp):
+        try:
+            self._idle.put_nowait(smtp)
+        except queue.Full:
+            self.discard(smtp)
+
+    def discard(self, smtp):
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def send(self, messages, on_progress=None):
+        """
+        Sends MIME messages over one pooled connection. Returns {index: error}
+        for the ones that failed. A dropped connection is reopened once per
+        message; if the server cannot be reached at all the rest of the batch
+        fails at once instead of timing out message by message. `on_progress`
+        is called between messages, so long batches can keep their claim alive.
+        """
+        errors = {}
+        smtp = None
+        for index, message in enumerate(messages):
+            if index and on_progress:
+                on_progress()
+            for _ in range(2):
+                if smtp is None:
+                    try:
+                        smtp = self.acquire()
+                    except (smtplib.SMTPException, OSError) as e:
+                        errors.update((i, str(e)) for i in range(index, len(messages)))
+                        return errors
+                try:
+                    smtp.send_message(message)
+                    errors.pop(index, None)
+                    break
+                except smtplib.SMTPServerDisconnected as e:
+                    smtp = None
+                    errors[index] = str(e)
+                except smtplib.SMTPRecipientsRefused as e:
+                    errors[index] = str(e)
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    errors[index] = str(e)
+                    self.discard(smtp)
+                    smtp = None
+                    break
+        if smtp:
+            self.release(smtp)
+        return errors
+
+class FileSink:
+    """
+    Offline backend: writes every message to `folder` as an .eml file instead
+    of sending it, for development and tests without a mail server.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def send(self, messages, on_progress=None):
+        os.makedirs(self.folder, exist_ok=True)
+        for message in messages:
+            path = os.path.join(self.folder, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.eml")
+            with open(path, "wb") as f:
+                f.write(message.as_bytes())
+        return {}
+
+_backend_lock = threading.Lock()
+
+def get_mail_backend():
+    """The app's delivery backend, created once per process so SMTP connections are reused across batches."""
+    with _backend_lock:
+        if "mail_backend" not in current_app.extensions:
+            config = current_app.config
+            if config["EMAIL_BACKEND"] == "file":
+                backend = FileSink(config["EMAIL_SINK_FOLDER"])
+            else:
+                backend = SMTPPool(config["EMAIL_HOST"], config["EMAIL_PORT"], config["EMAIL_USER"],
+                                   config["EMAIL_PASS"], config["EMAIL_USE_TLS"], config["EMAIL_POOL_SIZE"])
+            current_app.extensions["mail_backend"] = backend
+        return current_app.extensions["mail_backend"]
+
+def _mime(message):
+    mime = MIMEText(message["html"], "html")
+    mime["Subject"] = message["subject"]
+    mime["From"] = current_app.config["EMAIL_FROM"]
+    mime["To"] = message["to"]
+    return mime
+
+def render_emails(template_name, subject, recipients, **context):
+    """
+    One rendered message per recipient. The Jinja template is compiled once and
+    filled in for each recipient, who is available to it as `recipient`
+    (a dict with at least "email").
+    """
+    template = current_app.jinja_env.get_template(template_name)
+    context.setdefault("year", datetime.now(timezone.utc).year)
+    return [
+        {"to": recipient["email"], "subject": subject, "html": template.render(recipient=recipient, **context)}
+        for recipient in recipients if recipient.get("email")
+    ]
+
+def queue_email(template_name, subject, recipients, **context):
+    """
+    Renders and queues an email to every recipient in the outbox, then asks a
+    worker to deliver it; handlers never talk to the mail server. Without a
+    reachable worker the outbox is delivered here instead.
+    """
+    queued = len(outbox_model.enqueue_emails(mongo, render_emails(template_name, subject, recipients, **context)))
+    if queued:
+        try:
+            from celery_worker import deliver_email_outbox_task
+            deliver_email_outbox_task.delay()
+        except Exception as e:
+            logger.warning(f"Could not queue email delivery, delivering inline: {e}")
+            deliver_outbox()
+    return queued
+
+def send_email_now(template_name, subject, recipients, deliver_by=None, **context):
+    """
+    Renders and sends an email right away from this process, ahead of anything
+    queued, for mail the user is waiting on such as OTPs. The messages are kept
+    in the outbox; any that fail are retried by the worker until `deliver_by`.
+    Returns the number of messages that could not be sent now.
+    """
+    messages = outbox_model.enqueue_emails(
+        mongo, render_emails(template_name, subject, recipients, **context),
+        deliver_by=deliver_by, lease_seconds=current_app.config["EMAIL_LEASE_SECONDS"]
+    )
+    return len(_send_claimed(messages)) if messages else 0
+
+def _send_claimed(batch):
+    """
+    Sends a claimed batch, renewing its lease as messages go out so a slow
+    server cannot let the claim lapse and another worker send them again, then
+    records the results. Returns {index: error}.
+    """
+    config = current_app.config
+    backend = get_mail_backend()
+    lease_seconds = config["EMAIL_LEASE_SECONDS"]
+    renewed_at = [time.monotonic()]
+
+    def renew():
+        if time.monotonic() - renewed_at[0] > lease_seconds / 3:
+            outbox_model.renew_lease(mongo, batch[0]["claimToken"], lease_seconds)
+            renewed_at[0] = time.monotonic()
+
+    try:
+        errors = backend.send([_mime(message) for message in batch], on_progress=renew)
+    except Exception as e:
+        logger.error(f"Email delivery failed for a batch of {len(batch)}: {e}")
+        errors = {index: str(e) for index in range(len(batch))}
+    outbox_model.record_results(
+        mongo,
+        [message["_id"] for index, message in enumerate(batch) if index not in errors],
+        [(batch[index], error) for index, error in errors.items()],
+        config["EMAIL_MAX_ATTEMPTS"], config["EMAIL_RETRY_BASE_SECONDS"], config["EMAIL_OUTBOX_RETENTION_DAYS"]
+    )
+    return errors
+
+def deliver_outbox():
+    """
+    Sends due outbox messages, EMAIL_BATCH_SIZE at a time over pooled
+    connections, until none are left. Failed messages are retried with
+    exponential backoff up to EMAIL_MAX_ATTEMPTS or their deadline.
+    Returns {"sent", "failed"}.
+    """
+    config = current_app.config
+    totals = {"sent": 0, "failed": 0}
+    while True:
+        batch = outbox_model.claim_batch(
+            mongo, config["EMAIL_BATCH_SIZE"], config["EMAIL_LEASE_SECONDS"], config["EMAIL_OUTBOX_RETENTION_DAYS"]
+        )
+        if not batch:
+            return totals
+        errors = _send_claimed(batch)
+        totals["sent"] += len(batch) - len(errors)
+        totals["failed"] += len(errors)
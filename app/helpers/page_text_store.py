@@ -0,0 +1,110 @@
+import os
+import mmap
+import struct
+import zlib
+from bisect import bisect_right
+import fitz  # PyMuPDF
+
+MAGIC = b"HPTS1\x00"
+HEADER = struct.Struct("<6sI")       # magic, page count
+ENTRY = struct.Struct("<QIQI")       # blob offset, blob length, char offset, char length
+STORE_SUFFIX = ".pages"
+PAGE_SEPARATOR = "\n"
+
+def store_path_for(pdf_path):
+    """The page-text store lives next to its PDF: "book.pdf" -> "book.pages"."""
+    return os.path.splitext(pdf_path)[0] + STORE_SUFFIX
+
+def write_page_text_store(store_path, pages):
+    """
+    Writes a list of page texts (index 0 is page 1) as a compact store: a fixed
+    header, one table entry per page and zlib-compressed page blobs. Char offsets
+    refer to the pages joined with PAGE_SEPARATOR, skipping empty pages, which is
+    exactly the text extract_full_text used to produce.
+    """
+    blobs = [zlib.compress(text.encode("utf-8")) for text in pages]
+    table_end = HEADER.size + ENTRY.size * len(pages)
+
+    entries = []
+    blob_offset = table_end
+    char_offset = 0
+    for text, blob in zip(pages, blobs):
+        entries.append(ENTRY.pack(blob_offset, len(blob), char_offset, len(text)))
+        blob_offset += len(blob)
+        if text:
+            char_offset += len(text) + len(PAGE_SEPARATOR)
+
+    tmp_path = f"{store_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(pages)))
+        f.writelines(entries)
+        f.writelines(blobs)
+    os.replace(tmp_path, store_path)
+    return store_path
+
+class PageTextStore:
+    """Read-only, memory-mapped view over a page-text store."""
+
+    def __init__(self, store_path):
+        self._file = open(store_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a page-text store: {store_path}")
+        self._entries = [ENTRY.unpack_from(self._map, HEADER.size + i * ENTRY.size) for i in range(count)]
+        self._char_offsets = [entry[2] for entry in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def page_text(self, page_number):
+        """Text of a 1-based page."""
+        blob_offset, blob_length, _, _ = self._entries[page_number - 1]
+        return zlib.decompress(self._map[blob_offset:blob_offset + blob_length]).decode("utf-8")
+
+    def iter_pages(self):
+        for page_number in range(1, len(self) + 1):
+            yield page_number, self.page_text(page_number)
+
+    def full_text(self):
+        return PAGE_SEPARATOR.join(text for _, text in self.iter_pages() if text)
+
+    def page_offsets(self):
+        """(page number, char offset, char length) for every page."""
+        return [(i + 1, entry[2], entry[3]) for i, entry in enumerate(self._entries)]
+
+    def page_for_offset(self, char_offset):
+        """1-based page containing a char offset of full_text()."""
+        # Empty pages share the offset of the next page with text; bisect_right lands on the latter
+        index = bisect_right(self._char_offsets, char_offset) - 1
+        return max(index, 0) + 1
+
+def build_page_text_store(pdf_path, pages=None):
+    """
+    Writes the store for a PDF. OCR can pass its own `pages`; otherwise the
+    embedded text layer is extracted with PyMuPDF.
+    """
+    if pages is None:
+        with fitz.open(pdf_path) as doc:
+            pages = [page.get_text("text").strip() for page in doc]
+    return write_page_text_store(store_path_for(pdf_path), pages)
+
+def open_page_text_store(pdf_path):
+    """Opens the store for a PDF, building it first if it is missing or older than the PDF."""
+    store_path = store_path_for(pdf_path)
+    if not os.path.exists(store_path) or os.path.getmtime(store_path) < os.path.getmtime(pdf_path):
+        build_page_text_store(pdf_path)
+    return PageTextStore(store_path)
@@ -0,0 +1,154 @@
+import base64
+from itertools import islice
+from urllib.parse import urlencode
+from bson import json_util
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+class PaginationError(ValueError):
+    pass
+
+class PageRequest:
+    """Sort field and direction (1 or -1), page size and decoded cursor of one list request."""
+
+    def __init__(self, sort_field, direction, limit, cursor=None, unpaginated=False, stream=False):
+        self.sort_field = sort_field
+        self.direction = direction
+        self.limit = limit
+        self.cursor = cursor
+        self.unpaginated = unpaginated
+        self.stream = stream
+
+    @property
+    def sort(self):
+        return [(self.sort_field, self.direction), ("_id", self.direction)]
+
+def wants_ndjson():
+    """True when the client prefers application/x-ndjson over JSON."""
+    return request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def iter_batches(items, size):
+    """Lists of up to `size` items from any iterable, so lazy cursors stay lazy."""
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+def encode_cursor(doc, sort_field):
+    """Opaque cursor holding the (sortField, _id) of the last document on a page."""
+    payload = json_util.dumps([sort_field, doc.get(sort_field), doc["_id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, sort_field):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        field, value, doc_id = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if field != sort_field:
+        raise PaginationError("Cursor does not match the requested sort")
+    return value, doc_id
+
+def parse_page_request(sorts, default_sort):
+    """
+    Reads sort, limit, cursor and all from the query string. `sorts` maps the
+    public sort names to document fields, and each must be backed by an index
+    ending in _id; a leading "-" sorts descending. all=true returns the whole
+    list and exists only for clients that have not moved to cursors yet. With
+    Accept: application/x-ndjson every document after the cursor is streamed.
+    Raises PaginationError on bad input.
+    """
+    sort = request.args.get("sort", default_sort)
+    direction = -1 if sort.startswith("-") else 1
+    name = sort.lstrip("-")
+    if name not in sorts:
+        raise PaginationError(f"sort must be one of {', '.join(sorts)} (prefix with - for descending)")
+    sort_field = sorts[name]
+
+    stream = wants_ndjson()
+    unpaginated = stream or request.args.get("all", "").lower() == "true"
+    limit = request.args.get("limit", current_app.config["PAGE_SIZE_DEFAULT"], type=int)
+    limit = max(1, min(limit, current_app.config["PAGE_SIZE_MAX"]))
+
+    cursor = request.args.get("cursor")
+    if cursor and (stream or not unpaginated):
+        cursor = decode_cursor(cursor, sort_field)
+    else:
+        cursor = None
+    return PageRequest(sort_field, direction, limit, cursor, unpaginated, stream)
+
+def _after_cursor(page):
+    """
+    Documents after the cursor in (sortField, _id) order. Documents without the
+    sort field sort as null, before every value ascending and after every value
+    descending, so they are matched explicitly.
+    """
+    value, doc_id = page.cursor
+    field = page.sort_field
+    past = "$gt" if page.direction == 1 else "$lt"
+    if value is None:
+        clauses = [{field: None, "_id": {past: doc_id}}]
+        if page.direction == 1:
+            clauses.append({field: {"$exists": True, "$ne": None}})
+        return {"$or": clauses}
+    clauses = [{field: {past: value}}, {field: value, "_id": {past: doc_id}}]
+    if page.direction == -1:
+        clauses.append({field: None})
+    return {"$or": clauses}
+
+def paginate(collection, query, page, projection=None):
+    """
+    (documents, next cursor) for one page of `query`, fetched in one indexed
+    query with limit + 1 to detect the last page. The cursor is None on the last
+    page and when the request asked for every document. When streaming, the
+    documents are the live Mongo cursor, read NDJSON_BATCH_SIZE at a time;
+    callers should serialize them lazily and hand the result to page_response.
+    """
+    if page.cursor:
+        query = {"$and": [query, _after_cursor(page)]} if query else _after_cursor(page)
+    if projection and page.sort_field not in projection:
+        # The cursor is built from the sort field, so it cannot be projected out
+        projection = {**projection, page.sort_field: 1}
+    cursor = collection.find(query, projection).sort(page.sort)
+    if page.stream:
+        return cursor.batch_size(current_app.config["NDJSON_BATCH_SIZE"]), None
+    if page.unpaginated:
+        return list(cursor), None
+
+    docs = list(cursor.limit(page.limit + 1))
+    if len(docs) <= page.limit:
+        return docs, None
+    docs = docs[:page.limit]
+    return docs, encode_cursor(docs[-1], page.sort_field)
+
+def page_response(items, next_cursor, key=None):
+    """
+    JSON response for a page. With `key` the body is {key: items, "nextCursor": ...};
+    without it the body stays a bare list (for endpoints that always returned
+    one) and the cursor is sent in the X-Next-Cursor and Link headers.
+    `items` may be any iterable; NDJSON clients get it streamed instead.
+    """
+    if wants_ndjson():
+        return stream_ndjson(items), 200
+    items = list(items)
+    if key:
+        return jsonify({key: items, "nextCursor": next_cursor}), 200
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        args = {**request.args.to_dict(), "cursor": next_cursor}
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response, 200
+
+def stream_ndjson(items):
+    """
+    One JSON document per line, written as each item is produced so memory stays
+    flat and the first line goes out as soon as the first batch is read.
+    """
+    def generate():
+        for item in items:
+            yield current_app.json.dumps(item) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
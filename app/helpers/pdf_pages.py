@@ -0,0 +1,170 @@
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import fitz  # PyMuPDF
+from flask import current_app, request, jsonify
+from werkzeug.security import safe_join
+from .file_helpers import evict_lru_files
+from .file_serving import send_stored_file
+
+IMAGE_FORMATS = {"png": "png", "jpg": "jpeg", "jpeg": "jpeg"}
+DEFAULT_DPI = 110
+# Requested resolutions are rounded up to one of these so the page cache holds
+# a handful of renderings per page rather than one per distinct dpi value
+DPI_STEPS = (72, 110, 150, 200, 300)
+
+class DocumentPool:
+    """
+    LRU pool of open PyMuPDF documents keyed by (path, mtime), so repeated page
+    requests against the same book skip re-opening and re-parsing its xref table.
+    Each document carries its own lock because fitz documents are not thread-safe,
+    and a count of the requests holding it: a document evicted while checked out
+    is closed by the last of them, never under their feet.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def document(self, file_path):
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+        entry = self._checkout(key)
+        if entry is None:
+            # Parse outside the pool lock; if another request opened it meanwhile, use theirs
+            opened = {"doc": fitz.open(file_path), "lock": threading.Lock(), "users": 0, "evicted": False}
+            entry = self._checkout(key, opened)
+            if entry is not opened:
+                opened["doc"].close()
+        try:
+            with entry["lock"]:
+                yield entry["doc"]
+        finally:
+            with self._lock:
+                entry["users"] -= 1
+                close = entry["evicted"] and entry["users"] == 0
+            if close:
+                entry["doc"].close()
+
+    def _checkout(self, key, opened=None):
+        """The pooled entry for `key` with its user count taken, adding `opened` if there is none."""
+        with self._lock:
+            entry = self._docs.get(key)
+            if entry:
+                self._docs.move_to_end(key)
+            elif opened is None:
+                return None
+            else:
+                entry = self._docs[key] = opened
+            entry["users"] += 1
+            idle = self._evict()
+        for doc in idle:
+            doc.close()
+        return entry
+
+    def _evict(self):
+        """Drops the oldest entries past max_size; returns the idle documents for the caller to close."""
+        idle = []
+        while len(self._docs) > self.max_size:
+            _, entry = self._docs.popitem(last=False)
+            entry["evicted"] = True
+            if entry["users"] == 0:
+                idle.append(entry["doc"])
+        return idle
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_document_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DocumentPool(current_app.config["PDF_DOCUMENT_POOL_SIZE"])
+    return _pool
+
+def parse_page_range(value):
+    """Parses "7" or "7-9" into a 1-based inclusive (start, end) tuple."""
+    start, _, end = str(value).partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    if start < 1 or end < start:
+        raise ValueError("Invalid page range")
+    return start, end
+
+def extract_pages(pdf_path, start, end, fmt="pdf", dpi=DEFAULT_DPI):
+    """
+    Writes pages start..end (1-based) as a standalone PDF, or a single page as an
+    image, into the page cache and returns the cached file name. Cached files are
+    keyed by the source file's mtime, so a replaced book never serves stale pages,
+    and the cache is trimmed to PAGE_CACHE_MAX_MB, least recently used first.
+    """
+    cache_dir = current_app.config["PAGE_CACHE_FOLDER"]
+    stat = os.stat(pdf_path)
+    key = hashlib.sha1(f"{pdf_path}:{stat.st_mtime_ns}:{start}:{end}:{fmt}:{dpi}".encode("utf-8")).hexdigest()
+    extension = "pdf" if fmt == "pdf" else fmt
+    cache_name = f"{key}.{extension}"
+    cache_path = os.path.join(cache_dir, cache_name)
+    try:
+        # Mark as recently used (atime) for eviction
+        os.utime(cache_path, (time.time(), os.stat(cache_path).st_mtime))
+        return cache_name
+    except OSError:
+        pass
+
+    with get_document_pool().document(pdf_path) as doc:
+        if end > doc.page_count:
+            raise ValueError(f"Page range exceeds document length ({doc.page_count} pages)")
+        if fmt == "pdf":
+            out = fitz.open()
+            out.insert_pdf(doc, from_page=start - 1, to_page=end - 1)
+            data = out.tobytes(garbage=3, deflate=True)
+            out.close()
+        else:
+            pix = doc[start - 1].get_pixmap(dpi=dpi)
+            data = pix.tobytes(IMAGE_FORMATS[fmt])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, cache_path)
+    evict_lru_files(cache_dir, current_app.config["PAGE_CACHE_MAX_MB"] * 1024 * 1024, keep=cache_path)
+    return cache_name
+
+def wants_page_extract():
+    return bool(request.args.get("page") or request.args.get("pages"))
+
+def send_page_extract(base_dir, relative_path):
+    """Handles ?page=N / ?pages=N-M [&format=png|jpg&dpi=] for a stored PDF."""
+    pdf_path = safe_join(os.path.abspath(base_dir), relative_path)
+    if pdf_path is None or not pdf_path.lower().endswith(".pdf") or not os.path.isfile(pdf_path):
+        return jsonify({"error": "File not found"}), 404
+    try:
+        start, end = parse_page_range(request.args.get("pages") or request.args.get("page"))
+    except ValueError:
+        return jsonify({"error": "Invalid page range"}), 400
+
+    fmt = request.args.get("format", "pdf").lower()
+    if fmt != "pdf" and fmt not in IMAGE_FORMATS:
+        return jsonify({"error": "format must be pdf, png or jpg"}), 400
+    if fmt != "pdf" and start != end:
+        return jsonify({"error": "Images can only be rendered for a single page"}), 400
+    if end - start + 1 > current_app.config["MAX_EXTRACT_PAGES"]:
+        return jsonify({"error": f"At most {current_app.config['MAX_EXTRACT_PAGES']} pages can be extracted"}), 400
+    requested_dpi = request.args.get("dpi", DEFAULT_DPI, type=int)
+    dpi = next((step for step in DPI_STEPS if step >= requested_dpi), DPI_STEPS[-1])
+
+    try:
+        cache_name = extract_pages(pdf_path, start, end, fmt, dpi)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 416
+
+    return send_stored_file(
+        current_app.config["PAGE_CACHE_FOLDER"],
+        cache_name,
+        accel_prefix=current_app.config["X_ACCEL_PAGES_PREFIX"]
+    )
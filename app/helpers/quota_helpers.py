@@ -0,0 +1,50 @@
+from functools import wraps
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from ..extensions import mongo
+from .auth_context import get_auth_context
+from ..models import usage_model
+
+MB = 1024 * 1024
+
+def user_quota_bytes(role):
+    return current_app.config["USER_STORAGE_QUOTA_MB"].get(role, 0) * MB
+
+def role_quota_bytes(role):
+    return current_app.config["ROLE_STORAGE_QUOTA_MB"].get(role, 0) * MB
+
+def reserve_upload(user_id, role, size):
+    """Charges a stored file against the user's and role's quotas."""
+    return usage_model.reserve_storage(
+        mongo, user_id, role, size,
+        user_quota_bytes=user_quota_bytes(role),
+        role_quota_bytes=role_quota_bytes(role)
+    )
+
+def storage_quota_required(func):
+    """
+    Rejects an upload from its Content-Length before the body is read, using the
+    per-request limit and the user's stored usage counter. The final charge is
+    still made atomically with reserve_upload once the real size is known.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        incoming = request.content_length or 0
+        max_request_bytes = current_app.config["MAX_TOTAL_UPLOAD_MB"] * MB
+        if incoming > max_request_bytes:
+            return jsonify({"error": f"Upload exceeds the {current_app.config['MAX_TOTAL_UPLOAD_MB']} MB limit"}), 413
+
+        user_id = get_jwt_identity()
+        context = get_auth_context()
+        role = context.role if context and context.role else "user"
+        quota = user_quota_bytes(role)
+        if quota:
+            usage = usage_model.get_user_usage(mongo, user_id)
+            if usage["bytes"] + incoming > quota:
+                return jsonify({
+                    "error": "Storage quota exceeded",
+                    "usedBytes": usage["bytes"],
+                    "quotaBytes": quota
+                }), 413
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, make_response, request
+from .pagination import wants_ndjson
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Namespaces a cached response can depend on; a write bumps the namespace's
+# version, which changes every key built on it, so old entries are never read again
+BOOKS = "books"
+COLLECTIONS = "collections"
+PROJECTS = "projects"
+
+class LRUBackend:
+    """
+    Bounded in-process cache whose entries expire after the TTL, like Redis's.
+    Versions live in the same process, so with several worker processes each one
+    only sees its own invalidations (the TTL bounds how stale the others get);
+    use Redis there.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def versions(self, namespaces):
+        with self._lock:
+            return [self._versions.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is None:
+                return None
+            expires_at, entry = stored
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisBackend:
+    """Shared cache for every worker; entries expire after the TTL, versions never do."""
+
+    def __init__(self, client, prefix="response-cache"):
+        self.client = client
+        self.prefix = prefix
+
+    def versions(self, namespaces):
+        values = self.client.mget([f"{self.prefix}:version:{namespace}" for namespace in namespaces])
+        return [int(value) if value else 0 for value in values]
+
+    def bump(self, namespaces):
+        pipeline = self.client.pipeline()
+        for namespace in namespaces:
+            pipeline.incr(f"{self.prefix}:version:{namespace}")
+        pipeline.execute()
+
+    def get(self, key):
+        value = self.client.get(f"{self.prefix}:entry:{key}")
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return etag.decode(), body
+
+    def set(self, key, entry, ttl):
+        etag, body = entry
+        self.client.set(f"{self.prefix}:entry:{key}", etag.encode() + b"\n" + body, ex=ttl)
+
+def _create_backend(app):
+    url = app.config["RESPONSE_CACHE_REDIS_URL"]
+    if url and redis is not None:
+        try:
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()
+            return RedisBackend(client)
+        except redis.RedisError as e:
+            logger.warning(f"Response cache falling back to in-process LRU, Redis unavailable: {e}")
+    return LRUBackend(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+
+def get_response_cache():
+    """The app's cache backend, chosen on first use."""
+    if "response_cache" not in current_app.extensions:
+        current_app.extensions["response_cache"] = _create_backend(current_app)
+    return current_app.extensions["response_cache"]
+
+def invalidate(*namespaces):
+    """Drops every cached response that depends on any of `namespaces`. Call after the write succeeds."""
+    if not current_app.config["RESPONSE_CACHE_ENABLED"]:
+        return
+    try:
+        get_response_cache().bump(namespaces)
+    except Exception as e:
+        logger.error(f"Could not invalidate cached responses for {', '.join(namespaces)}: {e}")
+
+def _cache_key(namespaces, versions, per_user, view_args):
+    user = g.get("current_user") or {}
+    parts = {
+        "endpoint": request.endpoint,
+        "role": user.get("role"),
+        "user": str(user.get("_id")) if per_user else None,
+        "args": view_args,
+        "query": request.query_string.decode(),
+        "versions": dict(zip(namespaces, versions)),
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def cached_response(*namespaces, per_user=False):
+    """
+    Caches the JSON body of a successful GET, keyed by endpoint, the caller's
+    role (and id with per_user), view arguments, query string and the current
+    version of each namespace. Every response carries an ETag, and requests
+    whose If-None-Match matches get a 304. Goes under role_required so the
+    caller is known. NDJSON streams are never cached.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not current_app.config["RESPONSE_CACHE_ENABLED"] or wants_ndjson():
+                return func(*args, **kwargs)
+
+            cache = get_response_cache()
+            try:
+                key = _cache_key(namespaces, cache.versions(namespaces), per_user, kwargs)
+                entry = cache.get(key)
+            except Exception as e:
+                logger.error(f"Response cache unavailable: {e}")
+                key, entry = None, None
+
+            if entry is None:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                if key:
+                    try:
+                        cache.set(key, (etag, body), current_app.config["RESPONSE_CACHE_TTL"])
+                    except Exception as e:
+                        logger.error(f"Could not store cached response: {e}")
+            else:
+                etag, body = entry
+                response = current_app.response_class(body, mimetype="application/json")
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,68 @@
+import hmac
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request, jsonify
+
+def _signature(path, user_id, expires):
+    message = f"{path}\n{user_id}\n{expires}".encode("utf-8")
+    secret = current_app.config["FILE_URL_SECRET"].encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
+
+def sign_path(path, user_id, expires_in=None, expires_at=None):
+    """
+    Appends uid/exp/sig query parameters to a relative upload path such as
+    "folder/book.pdf" or "folder/book.pdf#page=3". Absolute URLs are returned untouched.
+    """
+    if not path or path.startswith(("http://", "https://")):
+        return path
+    path, _, fragment = path.lstrip("/").partition("#")
+    if expires_at is None:
+        expires_at = int(time.time()) + (expires_in or current_app.config["SIGNED_URL_TTL"])
+    query = urlencode({"uid": user_id, "exp": int(expires_at), "sig": _signature(path, user_id, int(expires_at))})
+    signed = f"{path}?{query}"
+    return f"{signed}#{fragment}" if fragment else signed
+
+def sign_source_url(source_url, user_id, expires_in=None, expires_at=None):
+    """
+    Signs a chunk "Source URL" ("folder/book.pdf#page=12"). The page fragment becomes
+    a ?page= argument so the link fetches only that page instead of the whole book.
+    """
+    if not source_url or source_url.startswith(("http://", "https://")):
+        return source_url
+    path, _, fragment = source_url.lstrip("/").partition("#")
+    page = fragment[len("page="):] if fragment.startswith("page=") else ""
+    if not page.isdigit():
+        return sign_path(source_url, user_id, expires_in, expires_at)
+    signed = sign_path(path, user_id, expires_in, expires_at)
+    return f"{signed}&page={page}"
+
+def verify_signature(path, args):
+    """Checks a signed path against its query arguments without touching the database."""
+    user_id, expires, signature = args.get("uid"), args.get("exp"), args.get("sig")
+    if not user_id or not expires or not signature:
+        return False
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(path, user_id, expires))
+
+def signed_url_required(prefix):
+    """
+    Protects a file route: the part of the request path after `prefix` must carry
+    a valid, unexpired signature from sign_path. Disabled by REQUIRE_SIGNED_FILE_URLS=false.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_app.config["REQUIRE_SIGNED_FILE_URLS"]:
+                path = request.path[len(prefix):] if request.path.startswith(prefix) else request.path
+                if not verify_signature(path, request.args):
+                    return jsonify({"error": "Invalid or expired file link"}), 403
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+
+INDEX_VERSION = 1
+INDEX_CACHE_SIZE = 64
+YEAR_PATTERN = re.compile(r"\b(\d{3,4})\b")
+PAGE_PATTERN = re.compile(r"#page=(\d+)")
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+def parse_result_events(entry):
+    """Parses the JSON string in an entry's "Result" field and returns its list of event dicts."""
+    result_data = entry.get("Result") if isinstance(entry, dict) else None
+    if not result_data or not isinstance(result_data, str) or not result_data.strip():
+        return []
+    try:
+        parsed_result = json.loads(result_data)
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(parsed_result, dict):
+        return []
+    events = parsed_result.get("Events")
+    if not isinstance(events, list):
+        return []
+    return [event for event in events if isinstance(event, dict)]
+
+def extract_years(event):
+    """All plausible years mentioned in an event's Year/Start Date/End Date fields."""
+    years = set()
+    for field in ("Year", "Start Date", "End Date"):
+        value = event.get(field)
+        if value is None:
+            continue
+        for match in YEAR_PATTERN.findall(str(value)):
+            years.add(int(match))
+    return sorted(years)
+
+def page_from_source_url(source_url):
+    match = PAGE_PATTERN.search(source_url or "")
+    return int(match.group(1)) if match else None
+
+def split_participants(event):
+    """An event's "Participants/People" as a list of names, whether given as a list or a comma-separated string."""
+    people = event.get("Participants/People")
+    if isinstance(people, list):
+        return [str(p).strip() for p in people if p]
+    if isinstance(people, str) and people.strip() and people != "N/A":
+        return [p.strip() for p in people.split(",") if p.strip()]
+    return []
+
+def index_paths(structured_path):
+    base = os.path.splitext(structured_path)[0]
+    return f"{base}.ndjson", f"{base}.idx.json"
+
+def build_structured_index(structured_path):
+    """
+    Rewrites a book's structured JSON as NDJSON (one entry per line) plus a small
+    index holding each line's byte offset and the page, years, locations and
+    participants of its events, so readers can filter and page without parsing
+    the whole book.
+    """
+    ndjson_path, idx_path = index_paths(structured_path)
+    with open(structured_path, "r", encoding="utf-8") as json_file:
+        structured_data = json.load(json_file)
+
+    entries = []
+    offset = 0
+    with open(f"{ndjson_path}.tmp", "wb") as ndjson_file:
+        for entry in structured_data:
+            line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+            ndjson_file.write(line)
+            events = parse_result_events(entry)
+            entries.append({
+                "o": offset,
+                "l": len(line),
+                "page": page_from_source_url(entry.get("Source URL")) if isinstance(entry, dict) else None,
+                "years": sorted({year for event in events for year in extract_years(event)}),
+                "locations": sorted({str(event.get(field)).lower() for event in events
+                                     for field in ("Location", "Place") if event.get(field)}),
+                "participants": sorted({p.lower() for event in events for p in split_participants(event)}),
+            })
+            offset += len(line)
+    os.replace(f"{ndjson_path}.tmp", ndjson_path)
+
+    with open(f"{idx_path}.tmp", "w", encoding="utf-8") as idx_file:
+        json.dump({"version": INDEX_VERSION, "entries": entries}, idx_file)
+    os.replace(f"{idx_path}.tmp", idx_path)
+    return idx_path
+
+def load_structured_index(structured_path):
+    """Returns the parsed index, (re)building it when missing or older than the structured JSON."""
+    ndjson_path, idx_path = index_paths(structured_path)
+    source_mtime = os.stat(structured_path).st_mtime_ns
+    if not os.path.exists(idx_path) or not os.path.exists(ndjson_path) \
+            or os.stat(idx_path).st_mtime_ns < source_mtime:
+        build_structured_index(structured_path)
+
+    key = (idx_path, os.stat(idx_path).st_mtime_ns)
+    with _index_lock:
+        if key in _index_cache:
+            _index_cache.move_to_end(key)
+            return _index_cache[key]
+
+    with open(idx_path, "r", encoding="utf-8") as idx_file:
+        index = json.load(idx_file)
+    if index.get("version") != INDEX_VERSION:
+        build_structured_index(structured_path)
+        return load_structured_index(structured_path)
+
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+def _matches(meta, filters):
+    page = meta.get("page")
+    if filters.get("page_from") is not None and (page is None or page < filters["page_from"]):
+        return False
+    if filters.get("page_to") is not None and (page is None or page > filters["page_to"]):
+        return False
+    if filters.get("year_from") is not None or filters.get("year_to") is not None:
+        low = filters.get("year_from") if filters.get("year_from") is not None else float("-inf")
+        high = filters.get("year_to") if filters.get("year_to") is not None else float("inf")
+        if not any(low <= year <= high for year in meta["years"]):
+            return False
+    if filters.get("location") and not any(filters["location"] in loc for loc in meta["locations"]):
+        return False
+    if filters.get("participant") and not any(filters["participant"] in p for p in meta["participants"]):
+        return False
+    return True
+
+def query_structured_data(structured_path, filters=None, cursor=0, limit=None, fields=None):
+    """
+    Returns (entries, next_cursor). The cursor is the position of the next entry to
+    scan; only matching lines are read from the NDJSON file. Raises ValueError for
+    a cursor outside 0..len(entries).
+    """
+    filters = filters or {}
+    index = load_structured_index(structured_path)
+    ndjson_path, _ = index_paths(structured_path)
+    metas = index["entries"]
+    if not 0 <= cursor <= len(metas):
+        raise ValueError("Invalid cursor")
+
+    results = []
+    position = cursor
+    with open(ndjson_path, "rb") as ndjson_file:
+        while position < len(metas):
+            if limit is not None and len(results) >= limit:
+                break
+            meta = metas[position]
+            position += 1
+            if not _matches(meta, filters):
+                continue
+            ndjson_file.seek(meta["o"])
+            entry = json.loads(ndjson_file.read(meta["l"]))
+            if fields and isinstance(entry, dict):
+                entry = {field: entry.get(field) for field in fields}
+            results.append(entry)
+
+    next_cursor = position if position < len(metas) else None
+    return results, next_cursor
+
+def iter_structured_entries(structured_path):
+    """Streams entries one at a time from the NDJSON copy instead of loading the whole JSON."""
+    load_structured_index(structured_path)
+    ndjson_path, _ = index_paths(structured_path)
+    with open(ndjson_path, "rb") as ndjson_file:
+        for line in ndjson_file:
+            if line.strip():
+                yield json.loads(line)
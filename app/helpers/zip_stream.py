@@ -0,0 +1,49 @@
+import zipfile
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+class _StreamBuffer:
+    """Write-only, unseekable sink for ZipFile; the bytes written so far are drained by the caller."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(members):
+    """
+    Yields a ZIP archive piece by piece. `members` yields (arcname, fileobj) pairs
+    or (arcname, bytes); each file is copied in blocks and its bytes are yielded
+    as soon as they are written, so nothing is buffered beyond one block.
+    Entries are stored, since the exports inside are already compressed.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, source in members:
+            if isinstance(source, bytes):
+                archive.writestr(arcname, source)
+            else:
+                with archive.open(arcname, "w", force_zip64=True) as dest:
+                    while True:
+                        block = source.read(COPY_BLOCK_SIZE)
+                        if not block:
+                            break
+                        dest.write(block)
+                        yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
@@ -0,0 +1,88 @@
+from bson import ObjectId
+from datetime import datetime, timezone
+
+USER_ACCESS_COLLECTION = "user_access"
+PROJECT_COLLECTION = "project-details"
+COLLECTIONS_COLLECTION = "collections"
+BOOK_COLLECTION = "books"
+
+# A user reaches a project they created or belong to, every collection they
+# created or that sits in one of those projects, and every book they uploaded
+# or that sits in one of those projects or collections. Books can only be put
+# into a collection or project by someone who may already read them
+# (AuthContext.can_read_book).
+ACCESS_FIELDS = ("ownedProjectIds", "projectIds", "collectionIds", "bookIds")
+
+def _object_ids(values):
+    return [value if isinstance(value, ObjectId) else ObjectId(value)
+            for value in values if value and ObjectId.is_valid(str(value))]
+
+def compute_user_access(mongo, user_id):
+    """The access sets of one user, computed from projects, collections and books."""
+    user_id = ObjectId(user_id)
+    owned, projects, collection_ids, book_ids = [], [], set(), set()
+    for project in mongo.db[PROJECT_COLLECTION].find(
+        {"$or": [{"createdBy": user_id}, {"memberIds": user_id}]},
+        {"createdBy": 1, "collectionIds": 1, "bookIds": 1}
+    ):
+        projects.append(project["_id"])
+        if project.get("createdBy") == user_id:
+            owned.append(project["_id"])
+        collection_ids.update(_object_ids(project.get("collectionIds", [])))
+        book_ids.update(_object_ids(project.get("bookIds", [])))
+
+    for collection in mongo.db[COLLECTIONS_COLLECTION].find(
+        {"$or": [{"createdBy": user_id}, {"_id": {"$in": list(collection_ids)}}]}, {"bookIds": 1}
+    ):
+        collection_ids.add(collection["_id"])
+        book_ids.update(_object_ids(collection.get("bookIds", [])))
+
+    book_ids.update(book["_id"] for book in mongo.db[BOOK_COLLECTION].find({"createdBy": user_id}, {"_id": 1}))
+    return {
+        "ownedProjectIds": owned,
+        "projectIds": projects,
+        "collectionIds": sorted(collection_ids),
+        "bookIds": sorted(book_ids),
+    }
+
+def rebuild_user_access(mongo, user_ids):
+    """Recomputes and stores the access sets of each user. Returns the ids rebuilt, as strings."""
+    rebuilt = []
+    for user_id in dict.fromkeys(str(user_id) for user_id in user_ids if user_id and ObjectId.is_valid(str(user_id))):
+        access = compute_user_access(mongo, user_id)
+        mongo.db[USER_ACCESS_COLLECTION].update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": {**access, "updatedAt": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        rebuilt.append(user_id)
+    return rebuilt
+
+def get_user_access(mongo, user_id):
+    """The stored access sets of a user, built on first use."""
+    access = mongo.db[USER_ACCESS_COLLECTION].find_one({"_id": ObjectId(user_id)})
+    if access is None:
+        rebuild_user_access(mongo, [user_id])
+        access = mongo.db[USER_ACCESS_COLLECTION].find_one({"_id": ObjectId(user_id)})
+    return access
+
+def project_user_ids(mongo, project_ids):
+    """Creators and members of the given projects."""
+    user_ids = set()
+    for project in mongo.db[PROJECT_COLLECTION].find(
+        {"_id": {"$in": _object_ids(project_ids)}}, {"createdBy": 1, "memberIds": 1}
+    ):
+        if project.get("createdBy"):
+            user_ids.add(str(project["createdBy"]))
+        user_ids.update(str(member_id) for member_id in project.get("memberIds", []))
+    return user_ids
+
+def users_with_access(mongo, field, ids):
+    """Users whose `field` set contains any of `ids`, read from the multikey index."""
+    return {str(access["_id"]) for access in mongo.db[USER_ACCESS_COLLECTION].find(
+        {field: {"$in": _object_ids(ids)}}, {"_id": 1}
+    )}
+
+def rebuild_all_user_access(mongo):
+    """Backfill: rebuilds the access sets of every user. Returns how many were written."""
+    return len(rebuild_user_access(mongo, (user["_id"] for user in mongo.db.users.find({}, {"_id": 1}))))
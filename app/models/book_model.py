@@ -1,10 +1,12 @@
+import os
 from bson import ObjectId
 from datetime import datetime, timezone
-from ..models.user import User
+from ..helpers.pagination import PageRequest, paginate
 
 BOOK_COLLECTION = "books"
 PROJECT_COLLECTION = "project-details"
 OCR_PROCESS_COLLECTION = "ocr_process"
+BOOK_VISIBILITIES = ("private", "public")
 
 def serialize_book(book):
     return {
@@ -20,21 +22,45 @@ def serialize_book(book):
         "frontPageImagePath": book.get("frontPageImagePath"),
         "previewUrl": book.get("previewUrl"),
         "ocrProcessId": str(book["ocrProcessId"]) if book.get("ocrProcessId") else None,
+        "ocrStatus": book.get("ocrStatus", "pending"),
+        "ocrProgress": book.get("ocrProgress", 0),
         "createdBy": str(book["createdBy"]) if book.get("createdBy") else None,
         "createdAt": book.get("createdAt", datetime.now(timezone.utc)).isoformat(),
         "updatedAt": book.get("updatedAt", datetime.now(timezone.utc)).isoformat()
     }
 
+# Every field serialize_book reads, for queries that only list books
+BOOK_PROJECTION = {field: 1 for field in (
+    "fileName", "bookName", "author", "author2", "edition", "fileSize", "pages", "visibility",
+    "frontPageImagePath", "previewUrl", "ocrProcessId", "ocrStatus", "ocrProgress",
+    "createdBy", "createdAt", "updatedAt"
+)}
+
 def create_book(mongo, book_data):
     result = mongo.db[BOOK_COLLECTION].insert_one(book_data)
     return str(result.inserted_id)
 
+# Public sort names for book lists; each is indexed behind (ocrStatus, visibility)
+BOOK_SORTS = {"createdAt": "createdAt", "bookName": "bookName"}
+
+def find_books_by_ocr_status(mongo, statuses, page, visibility=None):
+    """
+    One page of books whose mirrored ocrStatus is one of `statuses`, read with a
+    single query on an (ocrStatus, visibility, <sort>, _id) index. Every value of
+    visibility is listed when it is not filtered so the index still provides the
+    sort. Returns (books, next cursor); books are serialized lazily.
+    """
+    query = {
+        "ocrStatus": {"$in": list(statuses)},
+        "visibility": visibility if visibility else {"$in": list(BOOK_VISIBILITIES)},
+    }
+    books, next_cursor = paginate(mongo.db[BOOK_COLLECTION], query, page)
+    return (serialize_book(book) for book in books), next_cursor
+
 def get_all_books(mongo):
     # Only return books with completed OCR processes
-    ocr_processes = mongo.db[OCR_PROCESS_COLLECTION].find({"status": "completed"})
-    completed_book_ids = [ocr_process["bookId"] for ocr_process in ocr_processes]
-    books = mongo.db[BOOK_COLLECTION].find({"_id": {"$in": completed_book_ids}})
-    return [serialize_book(book) for book in books]
+    books, _ = find_books_by_ocr_status(mongo, ["completed"], PageRequest("createdAt", -1, None, unpaginated=True))
+    return list(books)
 
 def get_book_by_id(mongo, book_id):
     book = mongo.db[BOOK_COLLECTION].find_one({"_id": ObjectId(book_id)})
@@ -66,17 +92,60 @@ def get_books_by_creator(mongo, user_id):
     books = mongo.db[BOOK_COLLECTION].find({"createdBy": ObjectId(user_id)})
     return [serialize_book(book) for book in books]
 
-def get_book_details_for_email(mongo, book_id, deletion_time):
-    book = mongo.db[BOOK_COLLECTION].find_one({"_id": ObjectId(book_id)})
-    if not book:
-        return None
-    uploader_id = book.get("createdBy")
-    uploader = User.find_by_id(uploader_id) if uploader_id else None
+# Fields needed to delete a book, release its storage, remove its files and name it in the notification
+DELETION_PROJECTION = {field: 1 for field in (
+    "bookName", "author", "author2", "edition", "fileName", "frontPageImagePath",
+    "fileSize", "storageBytes", "createdBy"
+)}
+
+def find_books_for_deletion(mongo, book_ids):
+    """
+    The existing books among `book_ids` and their uploaders, with one $in query
+    each. Returns (books, {uploader ObjectId: user}).
+    """
+    books = list(mongo.db[BOOK_COLLECTION].find(
+        {"_id": {"$in": [ObjectId(bid) for bid in book_ids]}}, DELETION_PROJECTION
+    ))
+    uploader_ids = list({book["createdBy"] for book in books if book.get("createdBy")})
+    uploaders = {user["_id"]: user for user in mongo.db.users.find(
+        {"_id": {"$in": uploader_ids}}, {"fullName": 1, "email": 1, "role": 1}
+    )} if uploader_ids else {}
+    return books, uploaders
+
+def book_email_details(book, uploader):
+    """How a deleted book is described in the deletion email."""
     return {
         "bookName": book.get("bookName", "Untitled"),
         "author": book.get("author", "Unknown"),
-        "author2": book.get("author2", "N/A"),  # Default to "N/A" for email if not present
+        "author2": book.get("author2") or "N/A",
         "edition": book.get("edition", "N/A"),
         "uploaderName": uploader.get("fullName", "Unknown") if uploader else "Unknown",
-        "deletionTime": deletion_time
-    }
\ No newline at end of file
+    }
+
+def delete_books(mongo, book_ids):
+    """Deletes many books in one write. Returns how many were deleted."""
+    return mongo.db[BOOK_COLLECTION].delete_many({"_id": {"$in": list(book_ids)}}).deleted_count
+
+def remove_unreferenced_files(mongo, folder, file_names):
+    """
+    Removes the given PDFs and previews from `folder` unless a remaining book
+    still points at them; identical uploads share one file. Returns the names removed.
+    """
+    file_names = {os.path.basename(name) for name in file_names if name}
+    if not file_names:
+        return []
+    in_use = set()
+    for book in mongo.db[BOOK_COLLECTION].find(
+        {"$or": [{"fileName": {"$in": list(file_names)}}, {"frontPageImagePath": {"$in": list(file_names)}}]},
+        {"fileName": 1, "frontPageImagePath": 1}
+    ):
+        in_use.update((book.get("fileName"), book.get("frontPageImagePath")))
+
+    removed = []
+    for name in sorted(file_names - in_use):
+        try:
+            os.remove(os.path.join(folder, name))
+            removed.append(name)
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,200 @@
+from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from . import access_model
+from .book_model import BOOK_VISIBILITIES
+from .user import UserRoles
+
+PROJECT_COLLECTION = "project-details"
+COLLECTIONS_COLLECTION = "collections"
+BOOK_COLLECTION = "books"
+
+# Operation -> (target id field, id list field)
+OPERATIONS = {
+    "project.addBooks": ("projectId", "bookIds"),
+    "project.removeBooks": ("projectId", "bookIds"),
+    "project.addMembers": ("projectId", "memberIds"),
+    "project.removeMembers": ("projectId", "memberIds"),
+    "project.addCollections": ("projectId", "collectionIds"),
+    "project.removeCollections": ("projectId", "collectionIds"),
+    "collection.addBooks": ("collectionId", "bookIds"),
+    "collection.removeBooks": ("collectionId", "bookIds"),
+    "book.setVisibility": ("bookId", None),
+}
+
+class _Rejected(Exception):
+    def __init__(self, message, code=400):
+        super().__init__(message)
+        self.code = code
+
+def _object_ids(values):
+    if not isinstance(values, list):
+        return []
+    return list(dict.fromkeys(ObjectId(v) for v in values if isinstance(v, str) and ObjectId.is_valid(v)))
+
+def _parse(index, raw):
+    """One request entry as {"index", "op", "target", "ids", "visibility"}; raises _Rejected."""
+    if not isinstance(raw, dict) or raw.get("op") not in OPERATIONS:
+        raise _Rejected(f"op must be one of {', '.join(OPERATIONS)}")
+    target_field, ids_field = OPERATIONS[raw["op"]]
+    target = raw.get(target_field)
+    if not isinstance(target, str) or not ObjectId.is_valid(target):
+        raise _Rejected(f"Invalid {target_field}")
+    op = {"index": index, "op": raw["op"], "target": ObjectId(target), "ids": [], "visibility": None}
+    if ids_field:
+        op["ids"] = _object_ids(raw.get(ids_field))
+        if not op["ids"]:
+            raise _Rejected(f"At least one valid ID is required in {ids_field}")
+    else:
+        op["visibility"] = str(raw.get("visibility", "")).lower()
+        if op["visibility"] not in BOOK_VISIBILITIES:
+            raise _Rejected("Invalid visibility. Use 'private' or 'public'")
+    return op
+
+def _load(mongo, ops):
+    """Every project, collection, book and user the operations mention, with one $in query each."""
+    wanted = {"projects": set(), "collections": set(), "books": set(), "users": set()}
+    for op in ops:
+        kind, action = op["op"].split(".")
+        wanted[{"project": "projects", "collection": "collections", "book": "books"}[kind]].add(op["target"])
+        if action.endswith("Books"):
+            wanted["books"].update(op["ids"])
+        elif action.endswith("Collections"):
+            wanted["collections"].update(op["ids"])
+        elif action.endswith("Members"):
+            wanted["users"].update(op["ids"])
+
+    def by_id(collection, ids, projection):
+        return {doc["_id"]: doc for doc in mongo.db[collection].find({"_id": {"$in": list(ids)}}, projection)} if ids else {}
+
+    return {
+        "projects": by_id(PROJECT_COLLECTION, wanted["projects"], {"createdBy": 1}),
+        "collections": by_id(COLLECTIONS_COLLECTION, wanted["collections"], {"createdBy": 1}),
+        "books": by_id(BOOK_COLLECTION, wanted["books"], {"ocrStatus": 1, "visibility": 1}),
+        "users": by_id("users", wanted["users"], {"_id": 1}),
+    }
+
+def _check(op, docs, context):
+    """Authorizes one operation against the loaded documents and narrows its ids; raises _Rejected."""
+    kind, action = op["op"].split(".")
+    adding = action.startswith("add")
+    if kind == "project":
+        if op["target"] not in docs["projects"]:
+            raise _Rejected("Project not found", 404)
+        if not context.owns_project(op["target"]):
+            raise _Rejected("Unauthorized: Only the project creator can change the project", 403)
+    elif kind == "collection":
+        collection = docs["collections"].get(op["target"])
+        if not collection:
+            raise _Rejected("Collection not found", 404)
+        if str(collection.get("createdBy")) != context.user_id:
+            raise _Rejected("Only the creator can update this collection", 403)
+    else:
+        book = docs["books"].get(op["target"])
+        if context.role != UserRoles.BM:
+            raise _Rejected("Only book managers can change book visibility", 403)
+        if not book:
+            raise _Rejected("Book not found", 404)
+        if op["visibility"] == "public" and book.get("ocrStatus") != "completed":
+            raise _Rejected("Cannot set visibility to public until OCR process is completed")
+        return
+
+    if not adding:
+        return
+    if action == "addBooks":
+        known = docs["books"]
+        if kind == "project":
+            # Only books with completed OCR can join a project
+            op["ids"] = [bid for bid in op["ids"] if known.get(bid, {}).get("ocrStatus") == "completed"]
+            if not op["ids"]:
+                raise _Rejected("No books with completed OCR provided")
+        # Projects and collections grant access to their books, so only readable ones can be added
+        if any(bid in known and not context.can_read_book(bid, known[bid].get("visibility")) for bid in op["ids"]):
+            raise _Rejected("You cannot add books you do not have access to", 403)
+        if kind == "project":
+            return
+    else:
+        known = docs["collections"] if action == "addCollections" else docs["users"]
+    op["ids"] = [i for i in op["ids"] if i in known]
+    if not op["ids"]:
+        raise _Rejected("None of the given IDs exist", 404)
+
+def _writes(op, now):
+    """(collection name, write) pairs for one validated operation."""
+    kind, action = op["op"].split(".")
+    if kind == "book":
+        return [(BOOK_COLLECTION, UpdateOne({"_id": op["target"]}, {"$set": {"visibility": op["visibility"], "updatedAt": now}}))]
+
+    field = OPERATIONS[op["op"]][1]
+    if action.startswith("add"):
+        change = {"$addToSet": {field: {"$each": op["ids"]}}, "$set": {"updatedAt": now}}
+    else:
+        change = {"$pull": {field: {"$in": op["ids"]}}, "$set": {"updatedAt": now}}
+    collection = PROJECT_COLLECTION if kind == "project" else COLLECTIONS_COLLECTION
+    writes = [(collection, UpdateOne({"_id": op["target"]}, change))]
+    if op["op"] == "project.addCollections":
+        writes.append((COLLECTIONS_COLLECTION, UpdateMany(
+            {"_id": {"$in": op["ids"]}}, {"$set": {"projectId": op["target"], "updatedAt": now}}
+        )))
+    elif op["op"] == "project.removeCollections":
+        writes.append((COLLECTIONS_COLLECTION, UpdateMany(
+            {"_id": {"$in": op["ids"]}}, {"$unset": {"projectId": ""}, "$set": {"updatedAt": now}}
+        )))
+    return writes
+
+def _affected_user_ids(mongo, ops):
+    """Users whose access sets may change, read before anything is written."""
+    project_ids = [op["target"] for op in ops if op["op"].startswith("project.")]
+    collection_ids = [op["target"] for op in ops if op["op"].startswith("collection.")]
+    user_ids = access_model.project_user_ids(mongo, project_ids) if project_ids else set()
+    if collection_ids:
+        user_ids |= access_model.users_with_access(mongo, "collectionIds", collection_ids)
+    user_ids.update(str(i) for op in ops if op["op"] == "project.addMembers" for i in op["ids"])
+    return user_ids
+
+def apply_operations(mongo, raw_ops, context):
+    """
+    Validates and applies a batch of membership operations. All documents are
+    read with one $in query per collection, and all writes go out as one
+    ordered bulk_write per collection. Returns {"results": one entry per
+    operation, in order, "changed": names of collections written, "userIds":
+    users whose access sets must be rebuilt}.
+    """
+    results = [None] * len(raw_ops)
+    ops = []
+    for index, raw in enumerate(raw_ops):
+        try:
+            ops.append(_parse(index, raw))
+        except _Rejected as e:
+            results[index] = {"index": index, "status": "error", "code": e.code, "error": str(e)}
+
+    docs = _load(mongo, ops)
+    valid = []
+    for op in ops:
+        try:
+            _check(op, docs, context)
+            valid.append(op)
+        except _Rejected as e:
+            results[op["index"]] = {"index": op["index"], "op": op["op"], "status": "error", "code": e.code, "error": str(e)}
+
+    user_ids = _affected_user_ids(mongo, valid)
+    now = datetime.now(timezone.utc)
+    batches = {}
+    for op in valid:
+        results[op["index"]] = {"index": op["index"], "op": op["op"], "status": "ok"}
+        for collection, write in _writes(op, now):
+            batches.setdefault(collection, []).append((op["index"], write))
+
+    for collection, batch in batches.items():
+        try:
+            mongo.db[collection].bulk_write([write for _, write in batch], ordered=True)
+        except BulkWriteError as e:
+            # Ordered: the first failing write and everything after it were not applied
+            failed_at = e.details["writeErrors"][0]["index"]
+            message = e.details["writeErrors"][0].get("errmsg", "Write failed")
+            for position, (index, _) in enumerate(batch[failed_at:], start=failed_at):
+                results[index].update({"status": "error", "code": 500,
+                                       "error": message if position == failed_at else "Not applied after an earlier write failed"})
+
+    return {"results": results, "changed": set(batches), "userIds": user_ids}
@@ -1,14 +1,17 @@
 from bson import ObjectId
 from datetime import datetime, timezone
+from ..helpers.batch_loader import get_loader
+from ..helpers.pagination import iter_batches, paginate
 
 COLLECTIONS_COLLECTION = "collections"
 PROJECT_COLLECTION = "project-details"
 
+# Public sort names for collection lists, each backed by a (<field>, _id) index
+COLLECTION_SORTS = {"createdAt": "createdAt", "name": "name"}
+
 def serialize_collection(doc, mongo):
-    project_cursor = mongo.db[PROJECT_COLLECTION].find({
-        "collectionIds": {"$in": [doc["_id"]]}
-    })
-    project_ids = [str(p["_id"]) for p in project_cursor]
+    projects = get_loader(mongo, PROJECT_COLLECTION, key="collectionIds", projection={"_id": 1}).load(doc["_id"])
+    project_ids = [str(p["_id"]) for p in projects]
     return {
         "_id": str(doc["_id"]),
         "name": doc.get("name"),
@@ -19,20 +22,28 @@ def serialize_collection(doc, mongo):
         "updatedAt": doc.get("updatedAt", datetime.now(timezone.utc)).isoformat(),
     }
 
-def get_visible_collections(mongo, user_id, member_project_ids):
-    query = {
-        "$or": [
-            {"createdBy": ObjectId(user_id)},
-            {"_id": {
-                "$in": mongo.db[PROJECT_COLLECTION].distinct(
-                    "collectionIds",
-                    {"_id": {"$in": member_project_ids}}
-                )
-            }}
-        ]
-    }
-    docs = mongo.db[COLLECTIONS_COLLECTION].find(query)
-    return [serialize_collection(d, mongo) for d in docs]
+def iter_serialized_collections(docs, mongo, batch_size=500):
+    """
+    Serializes collections lazily, batch_size at a time, with one project-details
+    query per batch. The loader is cleared between batches so streaming a long
+    cursor does not accumulate documents.
+    """
+    loader = get_loader(mongo, PROJECT_COLLECTION, key="collectionIds", projection={"_id": 1})
+    for batch in iter_batches(docs, batch_size):
+        loader.prime(d["_id"] for d in batch)
+        for d in batch:
+            yield serialize_collection(d, mongo)
+        loader.clear()
+
+def serialize_collections(docs, mongo):
+    """Serializes many collections with one project-details query per 500 of them."""
+    return list(iter_serialized_collections(docs, mongo))
+
+def get_visible_collections(mongo, collection_ids, page):
+    """(collections, next cursor) for one page of the given collections, normally the caller's access set."""
+    query = {"_id": {"$in": [ObjectId(cid) for cid in collection_ids]}}
+    docs, next_cursor = paginate(mongo.db[COLLECTIONS_COLLECTION], query, page)
+    return iter_serialized_collections(docs, mongo), next_cursor
 
 def create_collection(mongo, data):
     data["createdAt"] = datetime.now(timezone.utc)
@@ -42,7 +53,7 @@ def create_collection(mongo, data):
 
 def get_all_collections(mongo):
     docs = mongo.db[COLLECTIONS_COLLECTION].find()
-    return [serialize_collection(d) for d in docs]
+    return serialize_collections(docs, mongo)
 
 def get_collection_by_id(mongo, collection_id):
     doc = mongo.db[COLLECTIONS_COLLECTION].find_one({"_id": ObjectId(collection_id)})
@@ -64,7 +75,7 @@ def get_project_collections(mongo, project_id):
         return []
     
     collections = mongo.db[COLLECTIONS_COLLECTION].find({"_id": {"$in": collection_ids}})
-    return [serialize_collection(doc, mongo) for doc in collections]
+    return serialize_collections(collections, mongo)
 
 def update_collection(mongo, collection_id, update_data):
     update_data["updatedAt"] = datetime.now(timezone.utc)
@@ -0,0 +1,124 @@
+import os
+import json
+from datetime import datetime, timezone
+from ..helpers.structured_index import parse_result_events, extract_years, page_from_source_url, split_participants
+
+EVENTS_COLLECTION = "events"
+UPLOADS_COLLECTION = "uploads"
+INSERT_BATCH_SIZE = 1000
+
+EXPORT_FIELDS = [
+    ("Event Name", "eventName"),
+    ("Description", "description"),
+    ("Participants", "participants"),
+    ("Location", "location"),
+    ("Place", "place"),
+    ("Start Date", "startDate"),
+    ("End Date", "endDate"),
+    ("Key Details", "keyDetails"),
+    ("Day", "day"),
+    ("Month", "month"),
+    ("Year", "year"),
+    ("General Comments", "generalComments"),
+]
+
+def normalize_structured_data(structured_data, book_id, user_id=None):
+    """Parses every entry's Result once and returns one document per event."""
+    now = datetime.now(timezone.utc)
+    docs = []
+    for chunk_index, entry in enumerate(structured_data):
+        if not isinstance(entry, dict):
+            continue
+        source_url = entry.get("Source URL")
+        for event_index, event in enumerate(parse_result_events(entry)):
+            years = extract_years(event)
+            docs.append({
+                "bookId": str(book_id),
+                "userId": str(user_id) if user_id else None,
+                "chunkId": entry.get("Chunk ID"),
+                "chunkIndex": chunk_index,
+                "eventIndex": event_index,
+                "page": page_from_source_url(source_url),
+                "sourceUrl": source_url,
+                "eventName": event.get("Event Name"),
+                "description": event.get("Description"),
+                "participants": split_participants(event) or None,
+                "location": event.get("Location"),
+                "place": event.get("Place"),
+                "startDate": event.get("Start Date"),
+                "endDate": event.get("End Date"),
+                "keyDetails": event.get("Key Details"),
+                "day": event.get("Day"),
+                "month": event.get("Month"),
+                "year": event.get("Year"),
+                "yearStart": years[0] if years else None,
+                "yearEnd": years[-1] if years else None,
+                "generalComments": event.get("General Comments"),
+                "createdAt": now
+            })
+    return docs
+
+def replace_book_events(mongo, book_id, docs):
+    """Replaces all events of a book, inserting in unordered batches."""
+    collection = mongo.db[EVENTS_COLLECTION]
+    collection.delete_many({"bookId": str(book_id)})
+    for start in range(0, len(docs), INSERT_BATCH_SIZE):
+        collection.insert_many(docs[start:start + INSERT_BATCH_SIZE], ordered=False)
+    return len(docs)
+
+def ingest_structured_data(mongo, structured_data, book_id, user_id=None):
+    return replace_book_events(mongo, book_id, normalize_structured_data(structured_data, book_id, user_id))
+
+def ingest_structured_file(mongo, structured_path, book_id, user_id=None):
+    with open(structured_path, "r", encoding="utf-8") as json_file:
+        structured_data = json.load(json_file)
+    return ingest_structured_data(mongo, structured_data, book_id, user_id)
+
+def has_book_events(mongo, book_id):
+    return mongo.db[EVENTS_COLLECTION].find_one({"bookId": str(book_id)}, {"_id": 1}) is not None
+
+def get_book_events(mongo, book_id, projection=None, batch_size=1000):
+    return mongo.db[EVENTS_COLLECTION].find(
+        {"bookId": str(book_id)}, projection
+    ).sort([("chunkIndex", 1), ("eventIndex", 1)]).batch_size(batch_size)
+
+def get_books_events(mongo, book_ids, projection=None, batch_size=1000):
+    """Events of several books in one query, ordered by book and position."""
+    return mongo.db[EVENTS_COLLECTION].find(
+        {"bookId": {"$in": [str(book_id) for book_id in book_ids]}}, projection
+    ).sort([("bookId", 1), ("chunkIndex", 1), ("eventIndex", 1)]).batch_size(batch_size)
+
+def books_with_events(mongo, book_ids):
+    return mongo.db[EVENTS_COLLECTION].distinct("bookId", {"bookId": {"$in": [str(book_id) for book_id in book_ids]}})
+
+def delete_book_events(mongo, book_id):
+    return mongo.db[EVENTS_COLLECTION].delete_many({"bookId": str(book_id)}).deleted_count
+
+def event_to_export_row(event):
+    """Maps an event document back to the export's column layout."""
+    row = {}
+    for column, field in EXPORT_FIELDS:
+        value = event.get(field)
+        if field == "participants":
+            value = ", ".join(value) if isinstance(value, list) else None
+        row[column] = "N/A" if value is None else value
+    row["Source URL"] = event.get("sourceUrl")
+    return row
+
+def backfill_events(mongo, upload_folder):
+    """Normalizes structured data for uploads that were processed before the events collection existed."""
+    ingested = 0
+    query = {"events_count": {"$exists": False}}
+    for upload in mongo.db[UPLOADS_COLLECTION].find(query, {"structured_data_path": 1, "user_id": 1}):
+        if not upload.get("structured_data_path"):
+            continue
+        structured_path = os.path.join(upload_folder, upload["structured_data_path"])
+        if not os.path.exists(structured_path):
+            continue
+        try:
+            event_count = ingest_structured_file(mongo, structured_path, upload["_id"], upload.get("user_id"))
+            mongo.db[UPLOADS_COLLECTION].update_one({"_id": upload["_id"]}, {"$set": {"events_count": event_count}})
+            ingested += 1
+        except Exception as e:
+            print(f"Error backfilling events for {upload['_id']}: {e}")
+    return ingested
@@ -3,6 +3,8 @@ import shutil
 from flask import current_app
 # from bson import ObjectId
 from ..extensions import mongo
+from . import usage_model, event_model, token_ledger_model
+from ..helpers.export_helpers import invalidate_book_exports
 # from ..helpers.file_helpers import create_pdf_preview
 
 def rename_book(mongo, book_id, new_name, user_id):
@@ -37,10 +39,20 @@ def rename_book(mongo, book_id, new_name, user_id):
         if os.path.exists(old_csv_path):
             os.rename(old_csv_path, new_csv_path)
 
+        old_pages_path = os.path.join(new_folder_path, f"{old_file_base}.pages")
+        new_pages_path = os.path.join(new_folder_path, f"{new_name}.pages")
+        if os.path.exists(old_pages_path):
+            os.rename(old_pages_path, new_pages_path)
+
         old_json_path = os.path.join(new_folder_path, f"{os.path.splitext(old_filename)[0]}_structured.json")
         new_json_path = os.path.join(new_folder_path, f"{new_name}_structured.json")
         if os.path.exists(old_json_path):
             os.rename(old_json_path, new_json_path)
+
+        for suffix in (".ndjson", ".idx.json"):
+            old_index_path = os.path.join(new_folder_path, f"{old_file_base}_structured{suffix}")
+            if os.path.exists(old_index_path):
+                os.rename(old_index_path, os.path.join(new_folder_path, f"{new_name}_structured{suffix}"))
             
         old_jpg_path = os.path.join(new_folder_path, f"{old_file_base}.jpg")
         new_jpg_path = os.path.join(new_folder_path, f"{new_name}.jpg")
@@ -61,12 +73,28 @@ def rename_book(mongo, book_id, new_name, user_id):
                 "preview_url": f"{new_folder_name}/{new_name}.jpg"
             }}
         )
+        invalidate_book_exports(book_id)
+        token_ledger_model.rename_book_usage(mongo, book_id, f"{new_name}.pdf")
 
         return {"message": "Book renamed successfully", "book_id": book_id}, 200
 
     return {"error": "Folder not found"}, 500
 
 
+def link_library_book(mongo, book_id, library_book_id, user_id):
+    """
+    Records which library book (a `books` id, as held by collections and projects)
+    an upload's structured data was extracted from, or clears it with None.
+    """
+    result = mongo.db.uploads.update_one(
+        {"_id": (book_id), "user_id": user_id},
+        {"$set": {"libraryBookId": library_book_id}}
+    )
+    if not result.matched_count:
+        return {"error": "Book not found"}, 404
+    return {"message": "Library book linked", "book_id": book_id, "libraryBookId": library_book_id}, 200
+
+
 def delete_book(mongo, book_id, user_id):
     """Deletes a book's folder and associated database record."""
     book = mongo.db.uploads.find_one({"_id":(book_id), "user_id": user_id})
@@ -83,6 +111,9 @@ def delete_book(mongo, book_id, user_id):
 
         # Remove entry from MongoDB
         mongo.db.uploads.delete_one({"_id":(book_id)})
+        usage_model.release_upload_storage(mongo, book)
+        event_model.delete_book_events(mongo, book_id)
+        invalidate_book_exports(book_id)
 
         return {"message": "Book deleted successfully", "book_id": book_id}, 200
 
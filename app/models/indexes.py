@@ -0,0 +1,161 @@
+import time
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+# Declarative index registry: collection -> list of specs. Every spec is created
+# idempotently by apply_indexes; "required": False marks indexes that only help
+# and should not fail the readiness check when they are missing.
+INDEX_REGISTRY = {
+    "users": [
+        {"keys": [("email", ASCENDING)]},
+        {"keys": [("role", ASCENDING)]},
+        {"keys": [("createdAt", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("fullName", ASCENDING), ("_id", ASCENDING)], "required": False},
+    ],
+    "books": [
+        {"keys": [("bookName", ASCENDING)]},
+        {"keys": [("contentHash", ASCENDING)]},
+        {"keys": [("createdBy", ASCENDING)]},
+        {"keys": [("ocrStatus", ASCENDING), ("visibility", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("ocrStatus", ASCENDING), ("visibility", ASCENDING), ("bookName", ASCENDING), ("_id", ASCENDING)], "required": False},
+    ],
+    "ocr_process": [
+        {"keys": [("bookId", ASCENDING)]},
+        {"keys": [("status", ASCENDING)]},
+    ],
+    "project-details": [
+        {"keys": [("memberIds", ASCENDING)]},
+        {"keys": [("collectionIds", ASCENDING)]},
+        {"keys": [("bookIds", ASCENDING)]},
+        {"keys": [("createdBy", ASCENDING)]},
+        {"keys": [("createdAt", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("name", ASCENDING), ("_id", ASCENDING)], "required": False},
+    ],
+    "collections": [
+        {"keys": [("createdBy", ASCENDING)]},
+        {"keys": [("bookIds", ASCENDING)], "required": False},
+        {"keys": [("createdAt", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("name", ASCENDING), ("_id", ASCENDING)], "required": False},
+    ],
+    "uploads": [
+        {"keys": [("user_id", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("upload_time", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("user_id", ASCENDING), ("filename", ASCENDING), ("_id", ASCENDING)], "required": False},
+        {"keys": [("upload_time", DESCENDING), ("_id", DESCENDING)]},
+        {"keys": [("filename", ASCENDING), ("_id", ASCENDING)], "required": False},
+        {"keys": [("libraryBookId", ASCENDING), ("upload_time", DESCENDING)], "required": False},
+    ],
+    "user_access": [
+        {"keys": [("projectIds", ASCENDING)]},
+        {"keys": [("collectionIds", ASCENDING)]},
+        {"keys": [("bookIds", ASCENDING)], "required": False},
+    ],
+    "email_outbox": [
+        {"keys": [("status", ASCENDING), ("nextAttemptAt", ASCENDING)]},
+        {"keys": [("claimToken", ASCENDING)], "options": {"sparse": True}},
+        {"keys": [("expiresAt", ASCENDING)], "options": {"expireAfterSeconds": 0}},
+    ],
+    "storage_usage": [
+        {"keys": [("scope", ASCENDING), ("bytes", DESCENDING)], "required": False},
+    ],
+    "events": [
+        {"keys": [("bookId", ASCENDING), ("chunkIndex", ASCENDING), ("eventIndex", ASCENDING)]},
+        {"keys": [("yearStart", ASCENDING), ("yearEnd", ASCENDING)], "required": False},
+        {"keys": [("participants", ASCENDING)], "required": False},
+        {"keys": [("location", ASCENDING)], "required": False},
+    ],
+    "token_ledger": [
+        {"keys": [("userId", ASCENDING), ("createdAt", DESCENDING)]},
+        {"keys": [("bookId", ASCENDING)]},
+        {"keys": [("model", ASCENDING), ("createdAt", DESCENDING)], "required": False},
+        {"keys": [("day", ASCENDING), ("userId", ASCENDING)], "required": False},
+    ],
+    "usage_events": [
+        {"keys": [("createdAt", ASCENDING)]},
+        {"keys": [("expiresAt", ASCENDING)], "options": {"expireAfterSeconds": 0}},
+    ],
+    "usage_rollups": [
+        {"keys": [("granularity", ASCENDING), ("bucketStart", ASCENDING)]},
+        {"keys": [("granularity", ASCENDING), ("userId", ASCENDING), ("bucketStart", ASCENDING)]},
+        {"keys": [("expiresAt", ASCENDING)], "options": {"expireAfterSeconds": 0}},
+    ],
+}
+
+READINESS_CACHE_SECONDS = 30
+_readiness_cache = {"checkedAt": 0, "report": None}
+
+def index_name(keys):
+    """The name MongoDB gives an index by default, e.g. "userId_1_createdAt_-1"."""
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+def apply_indexes(mongo, registry=None):
+    """
+    Creates every registered index. create_indexes is a no-op for indexes that
+    already exist with the same options, so this is safe to run at every startup.
+    Returns {"created": [...], "errors": [...]} with "collection.index" names.
+    """
+    registry = registry or INDEX_REGISTRY
+    report = {"created": [], "errors": []}
+    for collection_name, specs in registry.items():
+        collection = mongo.db[collection_name]
+        try:
+            existing = set(collection.index_information())
+        except PyMongoError:
+            existing = set()
+        for spec in specs:
+            name = index_name(spec["keys"])
+            try:
+                collection.create_indexes([IndexModel(spec["keys"], name=name, **spec.get("options", {}))])
+                if name not in existing:
+                    report["created"].append(f"{collection_name}.{name}")
+            except PyMongoError as e:
+                report["errors"].append({"index": f"{collection_name}.{name}", "error": str(e)})
+    return report
+
+def _index_usage(collection):
+    """{index name: ops since the server started}, or None when $indexStats is unavailable."""
+    try:
+        return {stat["name"]: stat["accesses"]["ops"] for stat in collection.aggregate([{"$indexStats": {}}])}
+    except (PyMongoError, NotImplementedError, KeyError):
+        return None
+
+def check_indexes(mongo, registry=None):
+    """
+    Compares the registry with the database. Reports registered indexes that are
+    missing (and whether any of them is required), indexes present in the database
+    but not registered, and registered indexes with no recorded use.
+    """
+    registry = registry or INDEX_REGISTRY
+    report = {"missing": [], "unregistered": [], "unused": [], "requiredMissing": False}
+    for collection_name, specs in registry.items():
+        collection = mongo.db[collection_name]
+        try:
+            existing = set(collection.index_information())
+        except PyMongoError:
+            existing = set()
+        registered = {index_name(spec["keys"]): spec for spec in specs}
+
+        for name, spec in registered.items():
+            if name not in existing:
+                required = spec.get("required", True)
+                report["missing"].append({"index": f"{collection_name}.{name}", "required": required})
+                report["requiredMissing"] = report["requiredMissing"] or required
+
+        report["unregistered"].extend(
+            f"{collection_name}.{name}" for name in sorted(existing - set(registered) - {"_id_"})
+        )
+
+        usage = _index_usage(collection)
+        if usage is not None:
+            report["unused"].extend(
+                f"{collection_name}.{name}" for name in sorted(registered) if usage.get(name) == 0
+            )
+    return report
+
+def readiness_report(mongo):
+    """check_indexes, cached for READINESS_CACHE_SECONDS so probes do not list indexes on every call."""
+    now = time.time()
+    if _readiness_cache["report"] is None or now - _readiness_cache["checkedAt"] > READINESS_CACHE_SECONDS:
+        _readiness_cache["report"] = check_indexes(mongo)
+        _readiness_cache["checkedAt"] = now
+    return _readiness_cache["report"]
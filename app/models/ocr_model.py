@@ -1,7 +1,12 @@
 from bson import ObjectId
 from datetime import datetime, timezone
+from pymongo import ReturnDocument, UpdateOne
 
 OCR_PROCESS_COLLECTION = "ocr_process"
+BOOK_COLLECTION = "books"
+
+# Statuses listed by the processing view; anything not "completed" is still in flight
+OCR_ACTIVE_STATUSES = ("pending", "processing", "failed")
 
 def serialize_ocr_process(ocr_process):
     return {
@@ -28,8 +33,31 @@ def create_ocr_process(mongo, book_id):
         "completedAt": None
     }
     result = mongo.db[OCR_PROCESS_COLLECTION].insert_one(ocr_process_data)
+    _mirror_to_book(mongo, ocr_process_data)
     return str(result.inserted_id)
 
+def _book_status_fields(ocr_process):
+    return {
+        "ocrStatus": ocr_process.get("status", "pending"),
+        "ocrProgress": ocr_process.get("progress", 0),
+        "ocrUpdatedAt": ocr_process.get("updatedAt") or ocr_process.get("startedAt"),
+    }
+
+def _mirror_to_book(mongo, ocr_process):
+    """
+    Copies status and progress from an OCR process onto its book. The write only
+    applies if the book holds an older (or no) ocrUpdatedAt, so a slow writer can
+    never move the book back to a stale status.
+    """
+    fields = _book_status_fields(ocr_process)
+    mongo.db[BOOK_COLLECTION].update_one(
+        {
+            "_id": ocr_process["bookId"],
+            "$or": [{"ocrUpdatedAt": {"$lte": fields["ocrUpdatedAt"]}}, {"ocrUpdatedAt": None}]
+        },
+        {"$set": fields}
+    )
+
 def get_ocr_process_by_book(mongo, book_id):
     ocr_process = mongo.db[OCR_PROCESS_COLLECTION].find_one({"bookId": ObjectId(book_id)})
     if not ocr_process:
@@ -40,21 +68,72 @@ def get_all_ocr_processes(mongo):
     ocr_processes = mongo.db[OCR_PROCESS_COLLECTION].find()
     return [serialize_ocr_process(ocr_process) for ocr_process in ocr_processes]
 
-def update_ocr_process(mongo, ocr_process_id, update_fields):
+def _update_ocr_process(mongo, query, update_fields):
     update_fields["updatedAt"] = datetime.now(timezone.utc)
-    result = mongo.db[OCR_PROCESS_COLLECTION].update_one(
-        {"_id": ObjectId(ocr_process_id)},
-        {"$set": update_fields}
+    ocr_process = mongo.db[OCR_PROCESS_COLLECTION].find_one_and_update(
+        query, {"$set": update_fields}, return_document=ReturnDocument.AFTER
     )
-    return result.modified_count > 0
-
-def mark_ocr_process_complete(mongo, book_id):
-    ocr_process = mongo.db[OCR_PROCESS_COLLECTION].find_one({"bookId": ObjectId(book_id)})
     if not ocr_process:
         return False
+    _mirror_to_book(mongo, ocr_process)
+    return True
+
+def update_ocr_process(mongo, ocr_process_id, update_fields):
+    """Updates an OCR process and mirrors its status and progress onto the book."""
+    return _update_ocr_process(mongo, {"_id": ObjectId(ocr_process_id)}, update_fields)
+
+def update_ocr_process_by_book(mongo, book_id, update_fields):
+    return _update_ocr_process(mongo, {"bookId": ObjectId(book_id)}, update_fields)
+
+def fail_ocr_processes_for_books(mongo, book_ids, message):
+    """Marks the OCR processes of many books failed in one write; nothing is mirrored, for books being deleted."""
+    return mongo.db[OCR_PROCESS_COLLECTION].update_many(
+        {"bookId": {"$in": list(book_ids)}},
+        {"$set": {"status": "failed", "errorMessage": message, "updatedAt": datetime.now(timezone.utc)}}
+    ).modified_count
+
+def mark_ocr_process_complete(mongo, book_id):
     update_fields = {
         "status": "completed",
         "progress": 100,
         "completedAt": datetime.now(timezone.utc)
     }
-    return update_ocr_process(mongo, ocr_process["_id"], update_fields)
\ No newline at end of file
+    return update_ocr_process_by_book(mongo, book_id, update_fields)
+
+def backfill_book_ocr_status(mongo, batch_size=500):
+    """
+    Copies the status of every OCR process onto its book (ocrStatus, ocrProgress,
+    ocrUpdatedAt), and marks books without a process as pending. Safe to rerun;
+    also repairs books whose process was updated by a writer that bypassed this
+    module. Returns the number of books written.
+    """
+    written = 0
+    operations = []
+    seen = set()
+
+    def flush():
+        nonlocal written, operations
+        if operations:
+            written += mongo.db[BOOK_COLLECTION].bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    projection = {"bookId": 1, "status": 1, "progress": 1, "updatedAt": 1, "startedAt": 1}
+    for ocr_process in mongo.db[OCR_PROCESS_COLLECTION].find({}, projection):
+        seen.add(ocr_process["bookId"])
+        operations.append(UpdateOne({"_id": ocr_process["bookId"]}, {"$set": _book_status_fields(ocr_process)}))
+        if len(operations) >= batch_size:
+            flush()
+    flush()
+
+    for book in mongo.db[BOOK_COLLECTION].find({"ocrStatus": None}, {"_id": 1}):
+        if book["_id"] not in seen:
+            operations.append(UpdateOne({"_id": book["_id"]}, {"$set": {"ocrStatus": "pending", "ocrProgress": 0}}))
+            if len(operations) >= batch_size:
+                flush()
+    flush()
+
+    # Catalog queries match on visibility too, so it must be present on every book
+    written += mongo.db[BOOK_COLLECTION].update_many(
+        {"visibility": None}, {"$set": {"visibility": "private"}}
+    ).modified_count
+    return written
@@ -0,0 +1,96 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateMany, UpdateOne
+
+OUTBOX_COLLECTION = "email_outbox"
+
+# pending -> sending (claimed by a worker) -> sent, or back to pending with a
+# later nextAttemptAt after a failure, or failed once the attempts run out
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+def enqueue_emails(mongo, messages, deliver_by=None, lease_seconds=None):
+    """
+    Queues already rendered messages ({"to", "subject", "html"}) with one insert
+    and returns the stored documents. Messages with a `deliver_by` deadline are
+    never sent after it. With `lease_seconds` they are stored already claimed,
+    for a caller that sends them itself, so no worker picks them up meanwhile.
+    """
+    if not messages:
+        return []
+    now = datetime.now(timezone.utc)
+    claim = {"status": PENDING}
+    if lease_seconds:
+        claim = {"status": SENDING, "claimToken": uuid.uuid4().hex, "leaseUntil": now + timedelta(seconds=lease_seconds)}
+    docs = [{
+        "to": message["to"],
+        "subject": message["subject"],
+        "html": message["html"],
+        "attempts": 0,
+        "nextAttemptAt": now,
+        "deliverBy": deliver_by,
+        "createdAt": now,
+        **claim,
+    } for message in messages]
+    mongo.db[OUTBOX_COLLECTION].insert_many(docs)
+    return docs
+
+def claim_batch(mongo, limit, lease_seconds, retention_days):
+    """
+    Claims up to `limit` due messages for this worker, including ones whose
+    previous worker died mid-send (lease expired), in three queries. Another
+    worker racing for the same messages loses the update_many and gets none of
+    them. Unclaimed messages past their deliverBy deadline are marked failed.
+    """
+    now = datetime.now(timezone.utc)
+    unclaimed = {"$or": [
+        {"status": PENDING, "nextAttemptAt": {"$lte": now}},
+        {"status": SENDING, "leaseUntil": {"$lt": now}},
+    ]}
+    mongo.db[OUTBOX_COLLECTION].update_many(
+        {**unclaimed, "deliverBy": {"$lte": now}},
+        {"$set": {"status": FAILED, "lastError": "Not delivered before its deadline",
+                  "expiresAt": now + timedelta(days=retention_days)},
+         "$unset": {"claimToken": "", "leaseUntil": ""}}
+    )
+    ids = [doc["_id"] for doc in mongo.db[OUTBOX_COLLECTION].find(unclaimed, {"_id": 1}).sort("nextAttemptAt", 1).limit(limit)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    mongo.db[OUTBOX_COLLECTION].update_many(
+        {"_id": {"$in": ids}, **unclaimed},
+        {"$set": {"status": SENDING, "claimToken": token, "leaseUntil": now + timedelta(seconds=lease_seconds)}}
+    )
+    return list(mongo.db[OUTBOX_COLLECTION].find({"claimToken": token}))
+
+def renew_lease(mongo, claim_token, lease_seconds):
+    """Extends the lease on the messages of a claim that are still being sent."""
+    mongo.db[OUTBOX_COLLECTION].update_many(
+        {"claimToken": claim_token, "status": SENDING},
+        {"$set": {"leaseUntil": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}}
+    )
+
+def record_results(mongo, sent_ids, failures, max_attempts, retry_base_seconds, retention_days):
+    """
+    Marks sent messages (kept for `retention_days`) and reschedules failures
+    ([(message, error)]) with exponential backoff, in one bulk_write. A failure
+    whose next attempt would fall past its deliverBy deadline is not retried.
+    """
+    now = datetime.now(timezone.utc)
+    operations = []
+    if sent_ids:
+        sent = {"status": SENT, "sentAt": now, "expiresAt": now + timedelta(days=retention_days)}
+        operations.append(UpdateMany({"_id": {"$in": list(sent_ids)}}, {"$set": sent, "$unset": {"claimToken": "", "leaseUntil": ""}}))
+    for message, error in failures:
+        attempts = message["attempts"] + 1
+        update = {"attempts": attempts, "lastError": error}
+        next_attempt = now + timedelta(seconds=retry_base_seconds * 2 ** (attempts - 1))
+        deliver_by = message.get("deliverBy")
+        if deliver_by and deliver_by.tzinfo is None:
+            deliver_by = deliver_by.replace(tzinfo=timezone.utc)  # PyMongo returns naive UTC datetimes
+        if attempts >= max_attempts or (deliver_by and next_attempt >= deliver_by):
+            update.update({"status": FAILED, "expiresAt": now + timedelta(days=retention_days)})
+        else:
+            update.update({"status": PENDING, "nextAttemptAt": next_attempt})
+        operations.append(UpdateOne({"_id": message["_id"]}, {"$set": update, "$unset": {"claimToken": "", "leaseUntil": ""}}))
+    if operations:
+        mongo.db[OUTBOX_COLLECTION].bulk_write(operations, ordered=False)
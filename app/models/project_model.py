@@ -1,5 +1,8 @@
 from bson import ObjectId
 from datetime import datetime, timezone
+from ..helpers.pagination import paginate
+from . import book_model, collection_model
+from .user import User
 
 def serialize_project(project):
     return {
@@ -15,10 +18,13 @@ def serialize_project(project):
     }
 
 COLLECTION_NAME = "project-details"
-# Get all projects
-def get_all_projects(mongo):
-    projects = mongo.db["project-details"].find()
-    return [serialize_project(p) for p in projects]
+# Public sort names for project lists, each backed by a (<field>, _id) index
+PROJECT_SORTS = {"createdAt": "createdAt", "name": "name"}
+
+# Get one page of all projects
+def get_all_projects(mongo, page):
+    projects, next_cursor = paginate(mongo.db[COLLECTION_NAME], {}, page)
+    return (serialize_project(p) for p in projects), next_cursor
 
 def get_project_by_id(mongo, project_id):
     project = mongo.db[COLLECTION_NAME].find_one({"_id": ObjectId(project_id)})
@@ -49,9 +55,43 @@ def get_projects_by_creator(mongo, user_id):
 
 
 def get_projects_by_member(mongo, user_id):
-    return list(
-        mongo.db.projects.find({
-            "memberIds": ObjectId(user_id)
-        })
-    )
+    projects = mongo.db[COLLECTION_NAME].find({
+        "memberIds": ObjectId(user_id)
+    })
+    return [serialize_project(p) for p in projects]
+
+def get_project_workspace(mongo, project_id):
+    """
+    A project with its members, books (with their mirrored OCR state) and
+    collections. The query count does not grow with the project: the project,
+    then users, books and collections by $in, and one project-details lookup
+    per 500 collections for their projectIds. Returns None when the project
+    does not exist.
+    """
+    project = mongo.db[COLLECTION_NAME].find_one({"_id": ObjectId(project_id)})
+    if not project:
+        return None
+
+    member_ids = project.get("memberIds", [])
+    book_ids = [ObjectId(bid) for bid in project.get("bookIds", []) if ObjectId.is_valid(bid)]
+    collection_ids = [ObjectId(cid) for cid in project.get("collectionIds", []) if ObjectId.is_valid(cid)]
+
+    members = User.find_by_ids(member_ids) if member_ids else []
+    books = [book_model.serialize_book(book) for book in mongo.db[book_model.BOOK_COLLECTION].find(
+        {"_id": {"$in": book_ids}}, book_model.BOOK_PROJECTION
+    )] if book_ids else []
+    collections = collection_model.serialize_collections(
+        mongo.db[collection_model.COLLECTIONS_COLLECTION].find({"_id": {"$in": collection_ids}}), mongo
+    ) if collection_ids else []
 
+    ocr_summary = {}
+    for book in books:
+        ocr_summary[book["ocrStatus"]] = ocr_summary.get(book["ocrStatus"], 0) + 1
+
+    return {
+        "project": serialize_project(project),
+        "members": members,
+        "books": books,
+        "collections": collections,
+        "ocrSummary": ocr_summary,
+    }
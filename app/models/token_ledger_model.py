@@ -0,0 +1,177 @@
+import os
+from datetime import datetime, timezone
+from ..helpers.structured_index import load_structured_index
+
+TOKEN_LEDGER_COLLECTION = "token_ledger"
+UPLOADS_COLLECTION = "uploads"
+
+# Keys the LLM services use to report usage on a streamed chunk
+PROMPT_TOKEN_KEYS = ("prompt_tokens", "input_tokens", "Prompt Tokens")
+COMPLETION_TOKEN_KEYS = ("completion_tokens", "output_tokens", "Completion Tokens")
+
+def _first_int(source, keys):
+    for key in keys:
+        value = source.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return int(value)
+    return None
+
+def usage_from_chunk(chunk_response):
+    """
+    (prompt_tokens, completion_tokens) reported on one streamed LLM chunk, read
+    from a nested "usage"/"Usage" object or from the chunk itself; None when absent.
+    """
+    if not isinstance(chunk_response, dict):
+        return None, None
+    usage = chunk_response.get("usage") or chunk_response.get("Usage")
+    source = usage if isinstance(usage, dict) else chunk_response
+    return _first_int(source, PROMPT_TOKEN_KEYS), _first_int(source, COMPLETION_TOKEN_KEYS)
+
+class UsageCounter:
+    """Accumulates chunk and token counts while an LLM response is streamed."""
+
+    def __init__(self):
+        self.chunks = 0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+
+    def add(self, chunk_response):
+        self.chunks += 1
+        prompt_tokens, completion_tokens = usage_from_chunk(chunk_response)
+        if prompt_tokens is not None:
+            self.prompt_tokens = (self.prompt_tokens or 0) + prompt_tokens
+        if completion_tokens is not None:
+            self.completion_tokens = (self.completion_tokens or 0) + completion_tokens
+
+def record_usage(mongo, book_id, user_id, book_name, model, chunks,
+                 prompt_tokens=None, completion_tokens=None, endpoint="upload-pdf", created_at=None):
+    """
+    Writes one ledger entry per processed book. The entry id is derived from the
+    book, so re-running ingest or the backfill does not count a book twice.
+    `tokensUsed` keeps the historical meaning (structured entries per book).
+    """
+    created_at = created_at or datetime.now(timezone.utc)
+    total_tokens = None
+    if prompt_tokens is not None or completion_tokens is not None:
+        total_tokens = (prompt_tokens or 0) + (completion_tokens or 0)
+    entry = {
+        "userId": str(user_id),
+        "bookId": str(book_id),
+        "bookName": book_name,
+        "model": model or "unknown",
+        "endpoint": endpoint,
+        "chunks": chunks,
+        "tokensUsed": chunks,
+        "promptTokens": prompt_tokens,
+        "completionTokens": completion_tokens,
+        "totalTokens": total_tokens,
+        "createdAt": created_at,
+        "day": created_at.strftime("%Y-%m-%d"),
+    }
+    mongo.db[TOKEN_LEDGER_COLLECTION].replace_one({"_id": f"ingest:{book_id}"}, entry, upsert=True)
+    return entry
+
+def rename_book_usage(mongo, book_id, book_name):
+    mongo.db[TOKEN_LEDGER_COLLECTION].update_many({"bookId": str(book_id)}, {"$set": {"bookName": book_name}})
+
+def _usage_totals():
+    return {
+        "tokensUsed": {"$sum": "$tokensUsed"},
+        "chunks": {"$sum": "$chunks"},
+        "promptTokens": {"$sum": {"$ifNull": ["$promptTokens", 0]}},
+        "completionTokens": {"$sum": {"$ifNull": ["$completionTokens", 0]}},
+        "totalTokens": {"$sum": {"$ifNull": ["$totalTokens", 0]}},
+        "books": {"$sum": 1},
+    }
+
+def _match(user_id=None, start=None, end=None, model=None):
+    match = {}
+    if user_id:
+        match["userId"] = str(user_id)
+    if model:
+        match["model"] = model
+    if start or end:
+        match["createdAt"] = {}
+        if start:
+            match["createdAt"]["$gte"] = start
+        if end:
+            match["createdAt"]["$lt"] = end
+    return match
+
+def get_user_book_usage(mongo, user_id):
+    """(total tokensUsed, per-book rows) for one user, in the legacy token_usage shape."""
+    entries = list(mongo.db[TOKEN_LEDGER_COLLECTION].find(
+        {"userId": str(user_id)},
+        {"_id": 0, "bookId": 1, "bookName": 1, "tokensUsed": 1, "promptTokens": 1,
+         "completionTokens": 1, "model": 1, "createdAt": 1}
+    ).sort("createdAt", 1))
+    books = [{
+        "book_id": entry["bookId"],
+        "book_name": entry.get("bookName"),
+        "tokens_used": entry.get("tokensUsed", 0),
+        "prompt_tokens": entry.get("promptTokens"),
+        "completion_tokens": entry.get("completionTokens"),
+        "model": entry.get("model"),
+    } for entry in entries]
+    return sum(book["tokens_used"] or 0 for book in books), books
+
+def get_all_users_book_usage(mongo):
+    """Per-user totals and book rows for every user in one aggregation."""
+    pipeline = [
+        {"$sort": {"userId": 1, "createdAt": 1}},
+        {"$group": {
+            "_id": "$userId",
+            "total_tokens_used": {"$sum": "$tokensUsed"},
+            "books": {"$push": {
+                "book_id": "$bookId",
+                "book_name": "$bookName",
+                "tokens_used": "$tokensUsed",
+                "prompt_tokens": "$promptTokens",
+                "completion_tokens": "$completionTokens",
+                "model": "$model",
+            }},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return [{
+        "user_id": row["_id"],
+        "total_tokens_used": row["total_tokens_used"],
+        "books": row["books"],
+    } for row in mongo.db[TOKEN_LEDGER_COLLECTION].aggregate(pipeline)]
+
+def aggregate_usage(mongo, group_by, user_id=None, start=None, end=None, model=None):
+    """Usage totals grouped by "user", "book", "model" or "day"."""
+    group_fields = {"user": "$userId", "book": "$bookId", "model": "$model", "day": "$day"}
+    pipeline = [
+        {"$match": _match(user_id, start, end, model)},
+        {"$group": {"_id": group_fields[group_by], **_usage_totals()}},
+        {"$sort": {"_id": 1}},
+    ]
+    results = []
+    for row in mongo.db[TOKEN_LEDGER_COLLECTION].aggregate(pipeline):
+        row[group_by] = row.pop("_id")
+        results.append(row)
+    return results
+
+def backfill_token_ledger(mongo, upload_folder):
+    """Creates ledger entries for uploads processed before the ledger existed, counting entries from the structured index."""
+    recorded = 0
+    ledger_ids = set(mongo.db[TOKEN_LEDGER_COLLECTION].distinct("bookId"))
+    for upload in mongo.db[UPLOADS_COLLECTION].find({}, {"structured_data_path": 1, "user_id": 1, "filename": 1,
+                                                          "selected_llm": 1, "upload_time": 1}):
+        if str(upload["_id"]) in ledger_ids or not upload.get("structured_data_path"):
+            continue
+        structured_path = os.path.join(upload_folder, upload["structured_data_path"])
+        if not os.path.exists(structured_path):
+            continue
+        try:
+            chunks = len(load_structured_index(structured_path)["entries"])
+            upload_time = upload.get("upload_time")
+            if upload_time is not None and upload_time.tzinfo is None:
+                upload_time = upload_time.replace(tzinfo=timezone.utc)
+            record_usage(mongo, upload["_id"], upload.get("user_id"), upload.get("filename"),
+                         upload.get("selected_llm"), chunks, created_at=upload_time)
+            recorded += 1
+        except Exception as e:
+            print(f"Error backfilling token usage for {upload['_id']}: {e}")
+    return recorded
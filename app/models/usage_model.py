@@ -0,0 +1,214 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import DuplicateKeyError
+
+STORAGE_USAGE_COLLECTION = "storage_usage"
+BOOK_COLLECTION = "books"
+UPLOADS_COLLECTION = "uploads"
+
+def _user_key(user_id):
+    return f"user:{user_id}"
+
+def _role_key(role):
+    return f"role:{role}"
+
+def serialize_usage(doc):
+    return {
+        "scope": doc.get("scope"),
+        "id": doc.get("ref"),
+        "role": doc.get("role"),
+        "bytes": doc.get("bytes", 0),
+        "files": doc.get("files", 0),
+        "dedupedBytes": doc.get("dedupedBytes", 0),
+        "updatedAt": doc["updatedAt"].isoformat() if doc.get("updatedAt") else None
+    }
+
+def _charge(mongo, key, scope, ref, size, quota_bytes, extra_set=None):
+    """Atomically adds `size` bytes to a counter unless that would exceed `quota_bytes`."""
+    if quota_bytes and size > quota_bytes:
+        return False
+    query = {"_id": key}
+    if quota_bytes:
+        query["bytes"] = {"$lte": quota_bytes - size}
+    update = {
+        "$inc": {"bytes": size, "files": 1},
+        "$set": {"updatedAt": datetime.now(timezone.utc), **(extra_set or {})},
+        "$setOnInsert": {"scope": scope, "ref": ref, "dedupedBytes": 0}
+    }
+    try:
+        mongo.db[STORAGE_USAGE_COLLECTION].update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # The counter exists but the quota filter did not match
+        return False
+    return True
+
+def reserve_storage(mongo, user_id, role, size, user_quota_bytes=0, role_quota_bytes=0):
+    """
+    Charges an upload to the user's and role's counters.
+    Returns False (and charges nothing) if either quota would be exceeded.
+    """
+    user_id = str(user_id)
+    if not _charge(mongo, _user_key(user_id), "user", user_id, size, user_quota_bytes, {"role": role}):
+        return False
+    if not _charge(mongo, _role_key(role), "role", role, size, role_quota_bytes):
+        release_storage(mongo, user_id, size, release_role=False)
+        return False
+    return True
+
+def record_dedupe_hit(mongo, user_id, role, size):
+    """Counts a file whose content was already stored; no physical bytes are charged."""
+    now = datetime.now(timezone.utc)
+    inc = {"files": 1, "dedupedBytes": size}
+    mongo.db[STORAGE_USAGE_COLLECTION].bulk_write([
+        UpdateOne({"_id": _user_key(user_id)}, {
+            "$inc": inc,
+            "$set": {"updatedAt": now, "role": role},
+            "$setOnInsert": {"scope": "user", "ref": str(user_id), "bytes": 0}
+        }, upsert=True),
+        UpdateOne({"_id": _role_key(role)}, {
+            "$inc": inc,
+            "$set": {"updatedAt": now},
+            "$setOnInsert": {"scope": "role", "ref": role, "bytes": 0}
+        }, upsert=True)
+    ], ordered=False)
+
+def release_storage(mongo, user_id, size, deduped_size=0, files=1, release_role=True):
+    """
+    Reverses a previous charge. The role counter released is the one recorded
+    on the user's counter; role drift after a role change is fixed by the reconciler.
+    """
+    now = datetime.now(timezone.utc)
+    dec = {"bytes": -size, "files": -files, "dedupedBytes": -deduped_size}
+    user_doc = mongo.db[STORAGE_USAGE_COLLECTION].find_one_and_update(
+        {"_id": _user_key(user_id)},
+        {"$inc": dec, "$set": {"updatedAt": now}}
+    )
+    role = user_doc.get("role") if user_doc else None
+    if release_role and role:
+        mongo.db[STORAGE_USAGE_COLLECTION].update_one(
+            {"_id": _role_key(role)},
+            {"$inc": dec, "$set": {"updatedAt": now}}
+        )
+
+def get_user_usage(mongo, user_id):
+    doc = mongo.db[STORAGE_USAGE_COLLECTION].find_one({"_id": _user_key(user_id)})
+    return serialize_usage(doc) if doc else {
+        "scope": "user", "id": str(user_id), "role": None,
+        "bytes": 0, "files": 0, "dedupedBytes": 0, "updatedAt": None
+    }
+
+def get_all_usage(mongo, scope=None):
+    query = {"scope": scope} if scope else {}
+    docs = mongo.db[STORAGE_USAGE_COLLECTION].find(query).sort("bytes", -1)
+    return [serialize_usage(doc) for doc in docs]
+
+# ---------------------------------------------Drift reconciliation-----------------------------------------------
+
+def _stat_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def reconcile_storage_usage(mongo, book_folder, upload_folder, max_workers=8):
+    """
+    Recomputes every counter from what is actually on disk and overwrites drifted values.
+    Files are stat'ed in parallel; a file shared by several records is charged to the oldest one.
+    """
+    entries = []  # (owner_id, path, sort_key)
+    for book in mongo.db[BOOK_COLLECTION].find({}, {"fileName": 1, "createdBy": 1, "createdAt": 1}):
+        if book.get("fileName") and book.get("createdBy"):
+            entries.append((str(book["createdBy"]), os.path.join(book_folder, book["fileName"]),
+                            book.get("createdAt") or datetime.min.replace(tzinfo=timezone.utc)))
+    for upload in mongo.db[UPLOADS_COLLECTION].find({}, {"fileUrl": 1, "user_id": 1, "upload_time": 1}):
+        if upload.get("fileUrl") and upload.get("user_id"):
+            entries.append((str(upload["user_id"]), os.path.join(upload_folder, upload["fileUrl"]),
+                            upload.get("upload_time") or datetime.min.replace(tzinfo=timezone.utc)))
+
+    unique_paths = list({os.path.abspath(path) for _, path, _ in entries})
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sizes = dict(zip(unique_paths, pool.map(_stat_size, unique_paths)))
+
+    user_totals = defaultdict(lambda: {"bytes": 0, "files": 0, "dedupedBytes": 0})
+    charged_paths = set()
+    for owner_id, path, _ in sorted(entries, key=lambda e: _sort_key(e[2])):
+        path = os.path.abspath(path)
+        size = sizes.get(path)
+        if size is None:
+            continue
+        totals = user_totals[owner_id]
+        totals["files"] += 1
+        if path in charged_paths:
+            totals["dedupedBytes"] += size
+        else:
+            totals["bytes"] += size
+            charged_paths.add(path)
+
+    owner_ids = [ObjectId(uid) for uid in user_totals if ObjectId.is_valid(uid)]
+    roles = {
+        str(user["_id"]): user.get("role", "user")
+        for user in mongo.db.users.find({"_id": {"$in": owner_ids}}, {"role": 1})
+    }
+    role_totals = defaultdict(lambda: {"bytes": 0, "files": 0, "dedupedBytes": 0})
+    for owner_id, totals in user_totals.items():
+        for field, value in totals.items():
+            role_totals[roles.get(owner_id, "user")][field] += value
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"_id": _user_key(owner_id)},
+                  {"$set": {**totals, "scope": "user", "ref": owner_id,
+                            "role": roles.get(owner_id, "user"), "updatedAt": now}}, upsert=True)
+        for owner_id, totals in user_totals.items()
+    ] + [
+        UpdateOne({"_id": _role_key(role)},
+                  {"$set": {**totals, "scope": "role", "ref": role, "updatedAt": now}}, upsert=True)
+        for role, totals in role_totals.items()
+    ]
+    # Counters for owners that no longer have any files are zeroed
+    live_keys = [_user_key(uid) for uid in user_totals] + [_role_key(role) for role in role_totals]
+    operations.append(UpdateMany(
+        {"_id": {"$nin": live_keys}},
+        {"$set": {"bytes": 0, "files": 0, "dedupedBytes": 0, "updatedAt": now}}
+    ))
+    mongo.db[STORAGE_USAGE_COLLECTION].bulk_write(operations, ordered=False)
+    return {"users": len(user_totals), "files": len(unique_paths)}
+
+def _sort_key(value):
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def release_book_storage(mongo, book):
+    """Releases the charge recorded on a `books` document when it was uploaded."""
+    if "storageBytes" not in book or not book.get("createdBy"):
+        return
+    release_storage(
+        mongo, str(book["createdBy"]), book["storageBytes"],
+        deduped_size=max((book.get("fileSize") or 0) - book["storageBytes"], 0)
+    )
+
+def release_books_storage(mongo, books):
+    """release_book_storage for many books, with one release per uploader."""
+    totals = {}
+    for book in books:
+        if "storageBytes" not in book or not book.get("createdBy"):
+            continue
+        size, deduped, files = totals.get(str(book["createdBy"]), (0, 0, 0))
+        totals[str(book["createdBy"])] = (
+            size + book["storageBytes"],
+            deduped + max((book.get("fileSize") or 0) - book["storageBytes"], 0),
+            files + 1,
+        )
+    for user_id, (size, deduped, files) in totals.items():
+        release_storage(mongo, user_id, size, deduped_size=deduped, files=files)
+
+def release_upload_storage(mongo, upload):
+    """Releases the charge recorded on an `uploads` document when it was uploaded."""
+    if "file_size" not in upload or not upload.get("user_id"):
+        return
+    release_storage(mongo, str(upload["user_id"]), upload["file_size"])
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from pymongo import UpdateOne
+
+USAGE_EVENTS_COLLECTION = "usage_events"
+USAGE_ROLLUPS_COLLECTION = "usage_rollups"
+ROLLUP_STATE_COLLECTION = "usage_rollup_state"
+ROLLUP_STATE_ID = "usage_rollup"
+
+GRANULARITIES = ("hour", "day")
+GROUP_FIELDS = ("userId", "model", "endpoint")
+METRICS = ("events", "chunks", "promptTokens", "completionTokens", "totalTokens", "cost", "durationMs")
+
+def _utc(value):
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _expires_at(start, retention_days):
+    return start + timedelta(days=retention_days) if retention_days else None
+
+def usage_cost(model, prompt_tokens, completion_tokens):
+    """Cost from LLM_TOKEN_PRICES (per million tokens) at the time the tokens were used."""
+    prices = current_app.config["LLM_TOKEN_PRICES"].get(model) or {}
+    return round(
+        (prompt_tokens or 0) * prices.get("prompt", 0) / 1_000_000
+        + (completion_tokens or 0) * prices.get("completion", 0) / 1_000_000,
+        6
+    )
+
+def record_usage_event(mongo, user_id, model, endpoint, chunks, prompt_tokens=None,
+                       completion_tokens=None, duration_ms=None, created_at=None):
+    """Appends one raw usage event; it expires after USAGE_EVENT_RETENTION_DAYS."""
+    created_at = created_at or datetime.now(timezone.utc)
+    event = {
+        "userId": str(user_id),
+        "model": model or "unknown",
+        "endpoint": endpoint,
+        "chunks": chunks,
+        "promptTokens": prompt_tokens or 0,
+        "completionTokens": completion_tokens or 0,
+        "totalTokens": (prompt_tokens or 0) + (completion_tokens or 0),
+        "cost": usage_cost(model, prompt_tokens, completion_tokens),
+        "durationMs": duration_ms or 0,
+        "createdAt": created_at,
+        "expiresAt": _expires_at(created_at, current_app.config["USAGE_EVENT_RETENTION_DAYS"]),
+    }
+    mongo.db[USAGE_EVENTS_COLLECTION].insert_one(event)
+    return event
+
+def _metric_sums(count_rows=True):
+    """$group sums of every metric; raw events count as one each, rollup rows carry their own count."""
+    sums = {metric: {"$sum": f"${metric}"} for metric in METRICS}
+    if count_rows:
+        sums["events"] = {"$sum": 1}
+    return sums
+
+def _rollup_op(granularity, bucket_start, row, now):
+    key = row["_id"]
+    retention = current_app.config["USAGE_HOURLY_RETENTION_DAYS" if granularity == "hour" else "USAGE_DAILY_RETENTION_DAYS"]
+    doc_id = ":".join([granularity, bucket_start.isoformat()] + [str(key.get(field)) for field in GROUP_FIELDS])
+    return UpdateOne({"_id": doc_id}, {"$set": {
+        "granularity": granularity,
+        "bucketStart": bucket_start,
+        **{field: key.get(field) for field in GROUP_FIELDS},
+        **{metric: row[metric] for metric in METRICS},
+        "updatedAt": now,
+        "expiresAt": _expires_at(bucket_start, retention),
+    }}, upsert=True)
+
+def rollup_usage(mongo, now=None):
+    """
+    Incrementally rolls raw usage events into hourly and daily buckets. Every
+    hour touched since the watermark is recomputed from raw events, and every day
+    touched is recomputed from its hourly buckets, with $set rather than $inc, so
+    a rerun or crash never double counts. Events newer than USAGE_ROLLUP_LAG_SECONDS
+    are left for the next run. Returns the number of hourly buckets written.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=current_app.config["USAGE_ROLLUP_LAG_SECONDS"])
+    state = mongo.db[ROLLUP_STATE_COLLECTION].find_one({"_id": ROLLUP_STATE_ID})
+    watermark = _utc(state["watermark"]) if state else None
+    if watermark is None:
+        first = mongo.db[USAGE_EVENTS_COLLECTION].find_one({}, {"createdAt": 1}, sort=[("createdAt", 1)])
+        if not first:
+            return 0
+        watermark = _utc(first["createdAt"])
+    if watermark >= cutoff:
+        return 0
+
+    start = watermark.replace(minute=0, second=0, microsecond=0)
+    hourly = list(mongo.db[USAGE_EVENTS_COLLECTION].aggregate([
+        {"$match": {"createdAt": {"$gte": start, "$lt": cutoff}}},
+        {"$group": {
+            "_id": {
+                **{field: f"${field}" for field in GROUP_FIELDS},
+                "hour": {"$dateToString": {"format": "%Y-%m-%dT%H", "date": "$createdAt"}},
+            },
+            **_metric_sums(),
+        }},
+    ]))
+
+    operations = []
+    touched_days = set()
+    for row in hourly:
+        hour = datetime.strptime(row["_id"]["hour"], "%Y-%m-%dT%H").replace(tzinfo=timezone.utc)
+        touched_days.add(hour.replace(hour=0))
+        operations.append(_rollup_op("hour", hour, row, now))
+    if operations:
+        mongo.db[USAGE_ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+
+    daily_operations = []
+    for day in sorted(touched_days):
+        for row in mongo.db[USAGE_ROLLUPS_COLLECTION].aggregate([
+            {"$match": {"granularity": "hour", "bucketStart": {"$gte": day, "$lt": day + timedelta(days=1)}}},
+            {"$group": {"_id": {field: f"${field}" for field in GROUP_FIELDS}, **_metric_sums(count_rows=False)}},
+        ]):
+            daily_operations.append(_rollup_op("day", day, row, now))
+    if daily_operations:
+        mongo.db[USAGE_ROLLUPS_COLLECTION].bulk_write(daily_operations, ordered=False)
+
+    mongo.db[ROLLUP_STATE_COLLECTION].update_one(
+        {"_id": ROLLUP_STATE_ID}, {"$set": {"watermark": cutoff, "updatedAt": now}}, upsert=True
+    )
+    return len(operations)
+
+def get_usage_timeseries(mongo, granularity, start=None, end=None, group_by=None,
+                         user_id=None, model=None, endpoint=None):
+    """
+    Time series from the rollups only: one point per bucket, or per bucket and
+    group_by value ("userId", "model" or "endpoint").
+    """
+    match = {"granularity": granularity}
+    if start or end:
+        match["bucketStart"] = {}
+        if start:
+            match["bucketStart"]["$gte"] = start
+        if end:
+            match["bucketStart"]["$lt"] = end
+    for field, value in (("userId", user_id), ("model", model), ("endpoint", endpoint)):
+        if value:
+            match[field] = value
+
+    group_id = {"bucketStart": "$bucketStart"}
+    if group_by:
+        group_id[group_by] = f"${group_by}"
+    series = []
+    for row in mongo.db[USAGE_ROLLUPS_COLLECTION].aggregate([
+        {"$match": match},
+        {"$group": {"_id": group_id, **_metric_sums(count_rows=False)}},
+        {"$sort": {"_id.bucketStart": 1}},
+    ]):
+        key = row.pop("_id")
+        row["cost"] = round(row["cost"], 6)
+        series.append({**key, "bucketStart": _utc(key["bucketStart"]).isoformat(), **row})
+    return series
+
+def get_rollup_watermark(mongo):
+    state = mongo.db[ROLLUP_STATE_COLLECTION].find_one({"_id": ROLLUP_STATE_ID})
+    return _utc(state["watermark"]).isoformat() if state else None
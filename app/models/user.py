@@ -1,4 +1,5 @@
 from ..extensions import mongo, bcrypt
+from ..helpers.pagination import paginate
 from bson.objectid import ObjectId
 import pymongo
 from datetime import datetime, timezone
@@ -53,10 +54,13 @@ class User:
         except:
             return None
 
+    # Fields returned by find_by_ids, so member lists never read password hashes or tokens
+    MEMBER_PROJECTION = {"fullName": 1, "email": 1, "role": 1, "isActive": 1, "isBlocked": 1, "createdAt": 1}
+
     @staticmethod
     def find_by_ids(user_ids):
         try:
-            users = mongo.db.users.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}})
+            users = mongo.db.users.find({"_id": {"$in": [ObjectId(uid) for uid in user_ids]}}, User.MEMBER_PROJECTION)
             return [
                 {
                     "_id": str(user["_id"]),
@@ -80,10 +84,14 @@ class User:
             return_document=pymongo.ReturnDocument.AFTER if return_document else pymongo.ReturnDocument.BEFORE
         )
 
+    # Public sort names for user lists, each backed by a (<field>, _id) index
+    SORTS = {"createdAt": "createdAt", "fullName": "fullName"}
+
     @staticmethod
-    def get_all_users():
-        users = mongo.db.users.find()
-        return [
+    def get_all_users(page):
+        """(users, next cursor) for one page of every user; users are serialized lazily."""
+        users, next_cursor = paginate(mongo.db.users, {}, page)
+        return (
             {
                 "_id": str(user["_id"]),
                 "fullName": user.get("fullName"),
@@ -94,4 +102,4 @@ class User:
                 "createdAt": user.get("createdAt")
             }
             for user in users
-        ]
\ No newline at end of file
+        ), next_cursor
\ No newline at end of file
@@ -1,12 +1,15 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 
 from ..extensions import mongo
 from ..models.user import User, UserRoles
-from ..helpers.auth_helpers import role_required
-from ..models import project_model
+from ..helpers.auth_helpers import role_required, project_owner_error
+from ..helpers.auth_context import invalidate_auth_context, refresh_access
+from ..helpers.response_cache import PROJECTS, invalidate
+from ..helpers.pagination import PaginationError, parse_page_request, page_response
+from ..models import project_model, usage_model
 
 import logging
 
@@ -20,12 +23,31 @@ admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 @role_required([UserRoles.ADMIN, UserRoles.PM, UserRoles.BM])
 def list_all_users():
     try:
-        users = User.get_all_users()
-        return jsonify(users), 200
+        users, next_cursor = User.get_all_users(parse_page_request(User.SORTS, "-createdAt"))
+        return page_response(users, next_cursor)
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching users: {str(e)}")
         return jsonify({"message": "Failed to fetch users"}), 500
 
+# Storage usage per user and per role, read from the maintained counters
+@admin_bp.route("/storage-usage", methods=["GET"])
+@jwt_required()
+@role_required([UserRoles.ADMIN])
+def get_storage_usage():
+    try:
+        user_id = request.args.get("userId")
+        if user_id:
+            return jsonify({"usage": usage_model.get_user_usage(mongo, user_id)}), 200
+        return jsonify({
+            "users": usage_model.get_all_usage(mongo, scope="user"),
+            "roles": usage_model.get_all_usage(mongo, scope="role")
+        }), 200
+    except Exception as e:
+        logger.error(f"Error fetching storage usage: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 # Fetch members for a project
 @admin_bp.route("/projects/<project_id>/members", methods=["GET"])
 @jwt_required()
@@ -59,12 +81,9 @@ def add_members_to_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can add members"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can add members")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         member_ids = data.get("memberIds", [])
@@ -86,6 +105,8 @@ def add_members_to_project(project_id):
         )
 
         if result.modified_count > 0:
+            invalidate(PROJECTS)
+            refresh_access(*valid_member_ids)
             return jsonify({"message": "Members added to project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -103,12 +124,9 @@ def remove_members_from_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can remove members"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can remove members")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         member_ids = data.get("memberIds", [])
@@ -130,6 +148,8 @@ def remove_members_from_project(project_id):
         )
 
         if result.modified_count > 0:
+            invalidate(PROJECTS)
+            refresh_access(*valid_member_ids)
             return jsonify({"message": "Members removed from project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -173,6 +193,7 @@ def toggle_user_status(user_id):
                 "loginAttempts": 0
             }}
         )
+        invalidate_auth_context(user_id)
 
         updated_user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
         updated_user["_id"] = str(updated_user["_id"])
@@ -224,6 +245,7 @@ def update_user_role(user_id):
                 "updatedAt": datetime.now(timezone.utc)
             }}
         )
+        invalidate_auth_context(user_id)
 
         updated_user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
         updated_user["_id"] = str(updated_user["_id"])
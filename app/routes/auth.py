@@ -4,6 +4,8 @@ from google.oauth2 import id_token
 from google.auth.transport.requests import Request
 from ..models.user import User, UserRoles
 from ..helpers.validation_helpers import is_valid_email
+from ..helpers.auth_context import invalidate_auth_context
+from ..helpers.pagination import PaginationError, parse_page_request, page_response
 from ..extensions import bcrypt, mongo  
 from bson.objectid import ObjectId
 import traceback
@@ -109,6 +111,7 @@ def update_user_status(user_id):
 
         # Update and verify directly with MongoDB
         mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"isActive": is_active, "lastLogin":datetime.now(timezone.utc), "loginAttempts":0}})
+        invalidate_auth_context(user_id)
         updated_user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
         
         if not updated_user:
@@ -136,9 +139,10 @@ def update_user_status(user_id):
 @jwt_required()
 def get_all_users():
     try:
-        users = User.get_all_users()
-        logger.info(f"Fetched all users: {users}")
-        return jsonify(users), 200
+        users, next_cursor = User.get_all_users(parse_page_request(User.SORTS, "-createdAt"))
+        return page_response(users, next_cursor)
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error fetching users: {str(e)}")
         traceback.print_exc()
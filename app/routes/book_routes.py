@@ -4,96 +4,46 @@ from werkzeug.utils import secure_filename
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 import os
-import smtplib
-from email.mime.text import MIMEText
-from dotenv import load_dotenv
-from ..models.user import User, UserRoles
-from ..models import book_model, project_model, ocr_model
+import uuid
+from ..models.user import UserRoles
+from ..models import access_model, book_model, project_model, ocr_model
+from ..models import usage_model
 from ..extensions import mongo
-from ..helpers.auth_helpers import role_required
-from ..helpers.file_helpers import allowed_file, create_pdf_preview
+from ..config import Config
+from ..helpers.auth_helpers import role_required, project_owner_error
+from ..helpers.auth_context import get_auth_context, refresh_access
+from ..helpers.pagination import PaginationError, parse_page_request, page_response
+from ..helpers.response_cache import BOOKS, PROJECTS, cached_response, invalidate
+from ..helpers.mailer import queue_email
+from ..helpers.file_helpers import allowed_file, create_pdf_preview, file_sha256
+from ..helpers.quota_helpers import storage_quota_required, reserve_upload
 from PyPDF2 import PdfReader
 
-# Load email config from .env
-load_dotenv()
-EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT"))
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASS = os.getenv("EMAIL_PASS")
-
 book_bp = Blueprint("books", __name__, url_prefix="/api/books")
 
-MAX_TOTAL_UPLOAD_MB = 150
-UPLOAD_DIR = "Uploads/books"
-
-def send_deletion_email(recipients, book_details_list, deleter_name, deleter_role, deletion_time):
-    try:
-        book_count = len(book_details_list)
-        book_term = "book" if book_count == 1 else "books"
-        verb = "has" if book_count == 1 else "have"
-        
-        # Format deletion timestamp (IST: UTC+5:30)
-        ist_time = deletion_time + timedelta(hours=5, minutes=30)
-        deletion_str = ist_time.strftime("%A, %B %d, %Y, at %I:%M %p IST")
-        
-        # Generate HTML list of books with optional second author
-        book_list_items = "".join(
-            f"<li style='margin-bottom: 10px; color: #FF0000;'>Book: {book['bookName']}, Author: {book['author']}"
-            f"{', Co-Author: ' + book['author2'] if book['author2'] != 'N/A' else ''}, Edition: {book['edition']}, Uploaded by: {book['uploaderName']}</li>"
-            for book in book_details_list
-        )
-
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; background-color: #f4f4f4; padding: 30px; margin: 0;">
-            <div style="max-width: 600px; margin: auto; background-color: #ffffff; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); overflow: hidden;">
-                <div style="background-color: #003366; padding: 20px; text-align: center;">
-                    <img src="https://raw.githubusercontent.com/Coding-with-Gaurav/KTB-LLM-web/refs/heads/main/graphiti1.png" alt="HistoAI Logo" style="max-height: 50px; display: block; margin: auto;" />
-                    <h2 style="color: white; margin: 10px 0 0; font-size: 24px;">Book Deletion Notification</h2>
-                </div>
-                <div style="padding: 30px; color: #333; font-size: 16px; line-height: 1.6;">
-                    <p style="margin: 0 0 15px;">Dear {{recipient_name}} ({{recipient_role}}),</p>
-                    <p style="margin: 0 0 15px;">We would like to notify you that the following {book_term} {verb} been deleted by <span style="color: #0000FF;">{deleter_name} ({deleter_role})</span> on {deletion_str}:</p>
-                    <ul style="list-style-type: disc; padding-left: 20px; margin: 0 0 15px;">
-                        {book_list_items}
-                    </ul>
-                    <p style="margin: 0;">Regards,<br><strong>HistoAI</strong></p>
-                </div>
-                <div style="background-color: #f1f1f1; text-align: center; padding: 15px; font-size: 12px; color: #777;">
-                    © {datetime.now(timezone.utc).year} HistoAI. All rights reserved.
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        for recipient in recipients:
-            msg = MIMEText(
-                html_content.format(
-                    recipient_name=recipient["fullName"],
-                    recipient_role=recipient["role"].capitalize(),
-                    book_term=book_term,
-                    verb=verb,
-                    deleter_name=deleter_name,
-                    deleter_role=deleter_role.capitalize()
-                ),
-                "html"
-            )
-            msg["Subject"] = "Book Deletion Notification"
-            msg["From"] = EMAIL_USER
-            msg["To"] = recipient["email"]
-
-            smtp = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-            smtp.starttls()
-            smtp.login(EMAIL_USER, EMAIL_PASS)
-            smtp.send_message(msg)
-            smtp.quit()
-
-    except Exception as e:
-        print(f"Failed to send deletion email: {str(e)}")
+UPLOAD_DIR = Config.BOOK_UPLOAD_FOLDER
+
+def queue_deletion_email(recipients, book_details_list, deleter_name, deleter_role, deletion_time):
+    """Queues one deletion notification per recipient in the email outbox."""
+    book_count = len(book_details_list)
+    # Format deletion timestamp (IST: UTC+5:30)
+    ist_time = deletion_time + timedelta(hours=5, minutes=30)
+    queue_email(
+        "email/book_deletion.html",
+        "Book Deletion Notification",
+        recipients,
+        books=book_details_list,
+        book_term="book" if book_count == 1 else "books",
+        verb="has" if book_count == 1 else "have",
+        deleter_name=deleter_name,
+        deleter_role=deleter_role,
+        deletion_str=ist_time.strftime("%A, %B %d, %Y, at %I:%M %p IST")
+    )
 
 @book_bp.route("/upload", methods=["POST"])
 @jwt_required()
 @role_required([UserRoles.BM])
+@storage_quota_required
 def upload_books():
     try:
         if 'files' not in request.files:
@@ -114,6 +64,8 @@ def upload_books():
 
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         user_id = get_jwt_identity()
+        context = get_auth_context()
+        uploader_role = context.role if context and context.role else UserRoles.BM
         uploaded = []
 
         for i, file in enumerate(files):
@@ -126,15 +78,36 @@ def upload_books():
             edition = editions[i].strip().upper() if i < len(editions) else ""
 
             if not book_name or not author:
-                return jsonify({"error": f"bookName and primary author are required for file {file.filename}"}), 400
+                return _upload_stopped(uploaded, user_id, f"bookName and primary author are required for file {file.filename}", 400)
 
             existing = mongo.db.books.find_one({"bookName": book_name})
             if existing:
-                return jsonify({"error": f"Book name '{book_name}' already exists"}), 409
+                return _upload_stopped(uploaded, user_id, f"Book name '{book_name}' already exists", 409)
 
-            filename = secure_filename(file.filename)
+            # Save under a private temporary name first, so an upload that shares
+            # a filename with another book can never overwrite or delete its file
+            temp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.tmp")
+            file.save(temp_path)
+            try:
+                file_size = os.path.getsize(temp_path)
+                content_hash = file_sha256(temp_path)
+
+                # Identical content is stored once; the new book points at the existing file
+                duplicate = mongo.db.books.find_one({"contentHash": content_hash}, {"fileName": 1})
+                if duplicate and duplicate.get("fileName") and os.path.exists(os.path.join(UPLOAD_DIR, duplicate["fileName"])):
+                    filename = duplicate["fileName"]
+                    usage_model.record_dedupe_hit(mongo, user_id, uploader_role, file_size)
+                    storage_bytes = 0
+                else:
+                    if not reserve_upload(user_id, uploader_role, file_size):
+                        return _upload_stopped(uploaded, user_id, f"Storage quota exceeded while uploading {file.filename}", 413)
+                    filename = _unused_filename(secure_filename(file.filename) or "book.pdf", content_hash)
+                    os.replace(temp_path, os.path.join(UPLOAD_DIR, filename))
+                    storage_bytes = file_size
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
             filepath = os.path.join(UPLOAD_DIR, filename)
-            file.save(filepath)
 
             try:
                 with open(filepath, "rb") as f:
@@ -152,9 +125,13 @@ def upload_books():
                 "author": author,
                 "author2": author2,  # Optional second author
                 "edition": edition,
-                "fileSize": os.path.getsize(filepath),
+                "fileSize": file_size,
+                "contentHash": content_hash,
+                "storageBytes": storage_bytes,
                 "pages": pages,
                 "visibility": "private",  # Always private initially
+                "ocrStatus": "pending",
+                "ocrProgress": 0,
                 "frontPageImagePath": preview_filename,
                 "previewUrl": preview_rel_path,
                 "ocrProcessId": None,  # Will be updated after OCR process creation
@@ -178,6 +155,9 @@ def upload_books():
                 "previewUrl": f"/{preview_rel_path}"
             })
 
+        invalidate(BOOKS)
+        if uploaded:
+            refresh_access(user_id)
         return jsonify({
             "message": "Books uploaded and OCR processes started",
             "files": uploaded
@@ -186,6 +166,23 @@ def upload_books():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _unused_filename(filename, content_hash):
+    """`filename`, or `<stem>-<hash prefix><ext>` when another book already stores a file under that name."""
+    if not os.path.exists(os.path.join(UPLOAD_DIR, filename)):
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{content_hash[:12]}{ext}"
+
+def _upload_stopped(uploaded, user_id, message, status):
+    """
+    Error response for an upload batch that stopped partway. Books saved before
+    the failing file stay saved, so they are reported under "files".
+    """
+    if uploaded:
+        invalidate(BOOKS)
+        refresh_access(user_id)
+    return jsonify({"error": message, "files": uploaded}), status
+
 @book_bp.route("/<book_id>/update", methods=["PATCH"])
 @jwt_required()
 @role_required([UserRoles.BM])
@@ -231,6 +228,7 @@ def update_book_details(book_id):
 
         success = book_model.update_book(mongo, book_id, update_fields)
         if success:
+            invalidate(BOOKS)
             return jsonify({"message": "Book details updated successfully"}), 200
         else:
             return jsonify({"error": "Failed to update book details"}), 500
@@ -259,6 +257,7 @@ def complete_ocr_process(book_id):
 
         # Update book visibility to public after OCR completion
         book_model.update_book(mongo, book_id, {"visibility": "public"})
+        invalidate(BOOKS)
 
         return jsonify({"message": "OCR process completed and book visibility set to public"}), 200
 
@@ -273,12 +272,9 @@ def add_books_to_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can add books"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can add books")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         book_ids = data.get("bookIds", [])
@@ -286,18 +282,20 @@ def add_books_to_project(project_id):
         if not book_ids:
             return jsonify({"error": "At least one book ID is required"}), 400
 
-        # Validate that books have completed OCR
-        valid_book_ids = []
-        for bid in book_ids:
-            if not ObjectId.is_valid(bid):
-                continue
-            ocr_process = ocr_model.get_ocr_process_by_book(mongo, bid)
-            if ocr_process and ocr_process["status"] == "completed":
-                valid_book_ids.append(ObjectId(bid))
+        # Validate that books have completed OCR, in one query on the mirrored status
+        valid_book_ids = [book["_id"] for book in mongo.db.books.find(
+            {"_id": {"$in": [ObjectId(bid) for bid in book_ids if ObjectId.is_valid(bid)]}, "ocrStatus": "completed"},
+            {"_id": 1}
+        )]
 
         if not valid_book_ids:
             return jsonify({"error": "No books with completed OCR provided"}), 400
 
+        # Project books are readable by every member, so only books the caller can read may be added
+        unreadable = get_auth_context().unreadable_book_ids(valid_book_ids)
+        if unreadable:
+            return jsonify({"error": "You cannot add books you do not have access to", "bookIds": unreadable}), 403
+
         result = mongo.db["project-details"].update_one(
             {"_id": ObjectId(project_id)},
             {
@@ -309,6 +307,8 @@ def add_books_to_project(project_id):
         )
 
         if result.modified_count > 0:
+            invalidate(PROJECTS)
+            refresh_access(*access_model.project_user_ids(mongo, [project_id]))
             return jsonify({"message": "Books added to project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -324,12 +324,9 @@ def remove_books_from_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can remove books"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can remove books")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         book_ids = data.get("bookIds", [])
@@ -350,6 +347,8 @@ def remove_books_from_project(project_id):
         )
 
         if result.modified_count > 0:
+            invalidate(PROJECTS)
+            refresh_access(*access_model.project_user_ids(mongo, [project_id]))
             return jsonify({"message": "Books removed from project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -360,37 +359,41 @@ def remove_books_from_project(project_id):
 @book_bp.route("/", methods=["GET"])
 @jwt_required()
 @role_required([UserRoles.ADMIN, UserRoles.BM, UserRoles.PM, UserRoles.USER])
+@cached_response(BOOKS)
 def get_all_books():
-    try:
-        # Only return books with completed OCR
-        ocr_processes = mongo.db["ocr_process"].find({"status": "completed"})
-        completed_book_ids = [str(ocr_process["bookId"]) for ocr_process in ocr_processes]
-        books = mongo.db["books"].find({"_id": {"$in": [ObjectId(bid) for bid in completed_book_ids]}})
-        return jsonify({"books": [book_model.serialize_book(book) for book in books]}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """
+    Books with completed OCR, one page at a time. Optional: visibility,
+    sort (createdAt or bookName, "-" for descending; default -createdAt),
+    limit/cursor, and all=true for the whole list.
+    """
+    return _books_by_ocr_status(["completed"])
 
 @book_bp.route("/processing", methods=["GET"])
 @jwt_required()
 @role_required([UserRoles.BM])
 def get_processing_books():
+    """Books whose OCR has not completed; same parameters as the catalog."""
+    return _books_by_ocr_status(ocr_model.OCR_ACTIVE_STATUSES)
+
+def _books_by_ocr_status(statuses):
     try:
-        ocr_processes = ocr_model.get_all_ocr_processes(mongo)
-        processing_books = []
-        for ocr_process in ocr_processes:
-            if ocr_process["status"] != "completed":
-                book = book_model.get_book_by_id(mongo, ocr_process["bookId"])
-                if book:
-                    book["ocrStatus"] = ocr_process["status"]
-                    book["progress"] = ocr_process["progress"]
-                    processing_books.append(book)
-        return jsonify({"books": processing_books}), 200
+        visibility = request.args.get("visibility")
+        if visibility and visibility not in book_model.BOOK_VISIBILITIES:
+            return jsonify({"error": "Invalid visibility. Use 'private' or 'public'"}), 400
+        try:
+            page = parse_page_request(book_model.BOOK_SORTS, "-createdAt")
+        except PaginationError as e:
+            return jsonify({"error": str(e)}), 400
+        books, next_cursor = book_model.find_books_by_ocr_status(mongo, statuses, page, visibility=visibility)
+        books = ({**book, "progress": book["ocrProgress"]} for book in books)
+        return page_response(books, next_cursor, key="books")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @book_bp.route("/projects/<project_id>/books", methods=["GET"])
 @jwt_required()
 @role_required([UserRoles.ADMIN, UserRoles.BM, UserRoles.PM, UserRoles.USER])
+@cached_response(BOOKS, PROJECTS)
 def get_project_books(project_id):
     try:
         if not ObjectId.is_valid(project_id):
@@ -433,62 +436,8 @@ def delete_book(book_id):
         if not ObjectId.is_valid(book_id):
             return jsonify({"error": "Invalid book ID"}), 400
 
-        # Capture deletion time (UTC)
-        deletion_time = datetime.now(timezone.utc)
-
-        # Fetch book details
-        book_detail = book_model.get_book_details_for_email(mongo, book_id, deletion_time)
-        if not book_detail:
+        if not _delete_books([ObjectId(book_id)]):
             return jsonify({"error": "Book not found"}), 404
-
-        # Get deleter and uploader details
-        deleter_id = get_jwt_identity()
-        deleter = User.find_by_id(deleter_id)
-        if not deleter:
-            return jsonify({"error": "Deleter not found"}), 404
-
-        uploader_id = str(mongo.db.books.find_one({"_id": ObjectId(book_id)}).get("createdBy"))
-        uploader = User.find_by_id(uploader_id) if uploader_id else None
-
-        # Get admin(s)
-        admins = mongo.db.users.find({"role": UserRoles.ADMIN})
-        admin_list = [{"fullName": admin.get("fullName", "Unknown"), "email": admin.get("email", ""), "role": admin.get("role", "admin")} for admin in admins]
-
-        # Determine recipients
-        recipients = admin_list
-        if uploader:
-            recipients.append({
-                "fullName": uploader.get("fullName", "Unknown"),
-                "email": uploader.get("email", ""),
-                "role": uploader.get("role", "book_manager")
-            })
-        if uploader_id != deleter_id:
-            recipients.append({
-                "fullName": deleter.get("fullName", "Unknown"),
-                "email": deleter.get("email", ""),
-                "role": deleter.get("role", "book_manager")
-            })
-
-        # Remove duplicates by email
-        unique_recipients = {recipient["email"]: recipient for recipient in recipients if recipient["email"]}.values()
-
-        # Delete associated OCR process
-        ocr_model.update_ocr_process(mongo, book_id, {"status": "failed", "errorMessage": "Book deleted"})
-
-        # Delete book
-        deleted = book_model.delete_book(mongo, book_id)
-        if not deleted:
-            return jsonify({"error": "Failed to delete book"}), 500
-
-        # Send email notifications
-        send_deletion_email(
-            unique_recipients,
-            [book_detail],
-            deleter.get("fullName", "Unknown"),
-            deleter.get("role", "book_manager"),
-            deletion_time
-        )
-
         return jsonify({"message": "Book deleted successfully"}), 200
 
     except Exception as e:
@@ -509,78 +458,67 @@ def delete_books():
         if not valid_book_ids:
             return jsonify({"error": "No valid book IDs provided"}), 400
 
-        # Capture deletion time (UTC)
-        deletion_time = datetime.now(timezone.utc)
-
-        # Fetch book details and uploader information
-        book_details_list = []
-        uploader_ids = set()
-        for book_id in valid_book_ids:
-            book_detail = book_model.get_book_details_for_email(mongo, book_id, deletion_time)
-            if book_detail:
-                book_details_list.append(book_detail)
-                book = mongo.db.books.find_one({"_id": ObjectId(book_id)})
-                if book and book.get("createdBy"):
-                    uploader_ids.add(str(book.get("createdBy")))
-
-        if not book_details_list:
-            return jsonify({"error": "No valid books found"}), 404
-
-        # Get deleter details
-        deleter_id = get_jwt_identity()
-        deleter = User.find_by_id(deleter_id)
-        if not deleter:
-            return jsonify({"error": "Deleter not found"}), 404
-
-        # Get admin(s)
-        admins = mongo.db.users.find({"role": UserRoles.ADMIN})
-        admin_list = [{"fullName": admin.get("fullName", "Unknown"), "email": admin.get("email", ""), "role": admin.get("role", "admin")} for admin in admins]
-
-        # Determine recipients
-        recipients = admin_list
-        for uploader_id in uploader_ids:
-            uploader = User.find_by_id(uploader_id)
-            if uploader:
-                recipients.append({
-                    "fullName": uploader.get("fullName", "Unknown"),
-                    "email": uploader.get("email", ""),
-                    "role": uploader.get("role", "book_manager")
-                })
-        if str(deleter_id) not in uploader_ids:
-            recipients.append({
-                "fullName": deleter.get("fullName", "Unknown"),
-                "email": deleter.get("email", ""),
-                "role": deleter.get("role", "book_manager")
-            })
-
-        # Remove duplicates by email
-        unique_recipients = {recipient["email"]: recipient for recipient in recipients if recipient["email"]}.values()
-
-        # Delete books and associated OCR processes
-        deleted_count = 0
-        for book_id in valid_book_ids:
-            ocr_model.update_ocr_process(mongo, book_id, {"status": "failed", "errorMessage": "Book deleted"})
-            if book_model.delete_book(mongo, book_id):
-                deleted_count += 1
-
+        deleted_count = _delete_books(valid_book_ids)
         if deleted_count == 0:
-            return jsonify({"error": "Failed to delete any books"}), 500
-
-        # Send email notifications
-        send_deletion_email(
-            unique_recipients,
-            book_details_list,
-            deleter.get("fullName", "Unknown"),
-            deleter.get("role", "book_manager"),
-            deletion_time
-        )
-
+            return jsonify({"error": "No valid books found"}), 404
         return jsonify({"message": f"{deleted_count} book{'s' if deleted_count > 1 else ''} deleted successfully"}), 200
 
     except Exception as e:
         print(f"Error in delete_books: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _delete_books(book_ids):
+    """
+    Deletes the given books and returns how many were deleted. Books, uploaders
+    and admins are read with one query each, OCR processes are failed and the
+    books deleted with one write each, and storage is released per uploader.
+    The email to admins, uploaders and the deleter goes to the outbox and file
+    removal to a worker, so the request returns right away.
+    """
+    deletion_time = datetime.now(timezone.utc)
+    books, uploaders = book_model.find_books_for_deletion(mongo, book_ids)
+    if not books:
+        return 0
+
+    found_ids = [book["_id"] for book in books]
+    ocr_model.fail_ocr_processes_for_books(mongo, found_ids, "Book deleted")
+    deleted_count = book_model.delete_books(mongo, found_ids)
+    usage_model.release_books_storage(mongo, books)
+    invalidate(BOOKS)
+
+    # Recipients: every admin, the uploaders and the deleter, once per email
+    deleter = get_auth_context().user
+    admins = mongo.db.users.find({"role": UserRoles.ADMIN}, {"fullName": 1, "email": 1, "role": 1})
+    recipients = [{"fullName": admin.get("fullName", "Unknown"), "email": admin.get("email", ""), "role": admin.get("role", "admin")} for admin in admins]
+    recipients += [
+        {"fullName": user.get("fullName", "Unknown"), "email": user.get("email", ""), "role": user.get("role", "book_manager")}
+        for user in [*uploaders.values(), deleter]
+    ]
+    unique_recipients = list({recipient["email"]: recipient for recipient in recipients if recipient["email"]}.values())
+
+    queue_deletion_email(
+        unique_recipients,
+        [book_model.book_email_details(book, uploaders.get(book.get("createdBy"))) for book in books],
+        deleter.get("fullName", "Unknown"),
+        deleter.get("role", "book_manager"),
+        deletion_time
+    )
+    _queue_file_cleanup([name for book in books for name in (book.get("fileName"), book.get("frontPageImagePath"))])
+    return deleted_count
+
+def _queue_file_cleanup(file_names):
+    """Hands removal of deleted books' files to Celery, or removes them here when no worker can be reached."""
+    try:
+        from celery_worker import cleanup_deleted_books_task
+        cleanup_deleted_books_task.delay(file_names)
+    except Exception as e:
+        print(f"Could not queue book file cleanup, running it inline: {str(e)}")
+        cleanup_deleted_books(file_names)
+
+def cleanup_deleted_books(file_names):
+    """Removes the files of deleted books that no other book shares."""
+    return book_model.remove_unreferenced_files(mongo, UPLOAD_DIR, file_names)
+
 @book_bp.route("/<book_id>/visibility", methods=["PATCH"])
 @jwt_required()
 @role_required([UserRoles.BM])
@@ -604,6 +542,7 @@ def update_book_visibility(book_id):
         success = book_model.update_book(mongo, book_id, {"visibility": new_visibility})
 
         if success:
+            invalidate(BOOKS)
             return jsonify({"message": f"Book visibility updated to '{new_visibility}'"}), 200
         else:
             return jsonify({"error": "Failed to update visibility"}), 500
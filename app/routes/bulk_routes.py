@@ -0,0 +1,53 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required
+
+from ..extensions import mongo
+from ..models import bulk_model
+from ..helpers.auth_helpers import role_required
+from ..helpers.auth_context import get_auth_context, refresh_access
+from ..helpers.response_cache import BOOKS, COLLECTIONS, PROJECTS, invalidate
+from ..models.user import UserRoles
+
+bulk_bp = Blueprint("bulk", __name__, url_prefix="/api/bulk")
+
+# Cached response namespaces to drop after writing each collection
+CHANGED_NAMESPACES = {
+    bulk_model.PROJECT_COLLECTION: (PROJECTS,),
+    bulk_model.COLLECTIONS_COLLECTION: (COLLECTIONS, PROJECTS),
+    bulk_model.BOOK_COLLECTION: (BOOKS,),
+}
+
+# ---------- Apply a batch of membership operations ----------
+@bulk_bp.route("", methods=["POST"])
+@jwt_required()
+@role_required([UserRoles.PM, UserRoles.BM])
+def apply_operations():
+    """
+    Body: {"operations": [{"op": "project.addBooks", "projectId": ..., "bookIds": [...]}, ...]}.
+    Supported ops are listed in bulk_model.OPERATIONS. Each operation gets the
+    same checks as its single endpoint and its own result; failing operations
+    do not stop the others.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "operations must be a non-empty list"}), 400
+        limit = current_app.config["BULK_MAX_OPERATIONS"]
+        if len(operations) > limit:
+            return jsonify({"error": f"At most {limit} operations per request"}), 400
+
+        outcome = bulk_model.apply_operations(mongo, operations, get_auth_context())
+        namespaces = {namespace for name in outcome["changed"] for namespace in CHANGED_NAMESPACES[name]}
+        if namespaces:
+            invalidate(*namespaces)
+        refresh_access(*outcome["userIds"])
+
+        results = outcome["results"]
+        return jsonify({
+            "results": results,
+            "applied": sum(1 for result in results if result["status"] == "ok"),
+            "failed": sum(1 for result in results if result["status"] == "error"),
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
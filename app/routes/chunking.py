@@ -1,69 +1,78 @@
-import fitz  # PyMuPDF
 from typing import List, Tuple
 from stanza import Pipeline
 from ..extensions import socketio  # Adjust if needed
+from ..helpers.page_text_store import open_page_text_store
 
 nlp = Pipeline(lang='en', processors='tokenize')
 
 def extract_full_text(file_path: str) -> str:
     """
-    Extracts the entire text from the PDF as one string.
+    Returns the entire text of the PDF as one string, read from its page-text
+    store (built from the PDF on first use).
     """
-    doc = fitz.open(file_path)
-    all_text = []
+    with open_page_text_store(file_path) as store:
+        return store.full_text()
 
-    for page in doc:
-        text = page.get_text("text").strip()
-        if text:
-            all_text.append(text)
 
-    return "\n".join(all_text)
-
-
-def stanza_chunker(text: str, chunk_size: int = 512, max_overlap_sentences: int = 4) -> List[str]:
+def stanza_chunker_with_offsets(text: str, chunk_size: int = 512, max_overlap_sentences: int = 4) -> List[Tuple[str, int]]:
     """
     Splits text into chunks using Stanza's sentence tokenizer and a token length threshold.
+    Each chunk is returned with the char offset of its first sentence in `text`.
     """
     doc = nlp(text)
     sentences = doc.sentences
 
     chunks = []
-    current_chunk = []
+    current_chunk = []  # (sentence text, start char)
     current_length = 0
 
     for sentence in sentences:
         sent_text = sentence.text.strip()
         sent_length = len(sentence.tokens)
+        sent_start = sentence.tokens[0].start_char if sentence.tokens else 0
 
         if current_length + sent_length > chunk_size and current_chunk:
-            chunks.append(" ".join(current_chunk).strip())
+            chunks.append((" ".join(s for s, _ in current_chunk).strip(), current_chunk[0][1]))
 
             # Maintain overlap
             overlap_start = max(0, len(current_chunk) - max_overlap_sentences)
             current_chunk = current_chunk[overlap_start:]
-            current_length = sum(len(s.split()) for s in current_chunk)
+            current_length = sum(len(s.split()) for s, _ in current_chunk)
 
-        current_chunk.append(sent_text)
+        current_chunk.append((sent_text, sent_start))
         current_length += sent_length
 
     if current_chunk:
-        chunks.append(" ".join(current_chunk).strip())
+        chunks.append((" ".join(s for s, _ in current_chunk).strip(), current_chunk[0][1]))
 
     return chunks
 
 
-def process_and_get_chunks(file_path: str, unique_folder: str, filename: str) -> List[Tuple[int, str, str]]:
+def stanza_chunker(text: str, chunk_size: int = 512, max_overlap_sentences: int = 4) -> List[str]:
+    """
+    Splits text into chunks using Stanza's sentence tokenizer and a token length threshold.
+    """
+    return [chunk for chunk, _ in stanza_chunker_with_offsets(text, chunk_size, max_overlap_sentences)]
+
+
+def process_and_get_chunks(file_path: str, unique_folder: str, filename: str,
+                           chunk_size: int = 512, max_overlap_sentences: int = 4) -> List[Tuple[int, str, str]]:
     """
     Processes the entire PDF as a whole and returns chunks (chunk_id, chunk_text, source_url).
+    The text comes from the book's page-text store, so re-chunking with other
+    parameters never re-parses the PDF, and each source URL points at the page
+    the chunk starts on.
     """
     try:
-        full_text = extract_full_text(file_path)
-        chunks = stanza_chunker(full_text)
-
-        chunk_results = []
-        for idx, chunk in enumerate(chunks, start=1):
-            source_url = f"{unique_folder}/{filename}#page={idx}"
-            chunk_results.append((idx, chunk, source_url))
+        with open_page_text_store(file_path) as store:
+            full_text = store.full_text()
+            chunks = stanza_chunker_with_offsets(full_text, chunk_size, max_overlap_sentences)
+
+            chunk_results = []
+            for idx, (chunk, start_char) in enumerate(chunks, start=1):
+                page = store.page_for_offset(start_char)
+                source_url = f"{unique_folder}/{filename}#page={page}"
+                chunk_results.append((idx, chunk, source_url))
 
         socketio.emit("completed", {"message": "Chunk extraction completed successfully!"})
         return chunk_results
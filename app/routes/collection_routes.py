@@ -4,13 +4,26 @@ from bson import ObjectId
 from datetime import datetime, timezone
 
 from ..extensions import mongo
-from ..models import collection_model, project_model
-from ..helpers.auth_helpers import role_required
+from ..models import access_model, collection_model, project_model
+from ..helpers.auth_helpers import role_required, project_owner_error
+from ..helpers.auth_context import get_auth_context, refresh_access
+from ..helpers.pagination import PaginationError, parse_page_request, page_response
+from ..helpers.response_cache import COLLECTIONS, PROJECTS, cached_response, invalidate
 from ..models.user import UserRoles
 
 collection_bp = Blueprint("collections", __name__, url_prefix="/api/collections")
 ALLOWED_ROLES = [UserRoles.PM, UserRoles.BM]
 
+def _unreadable_books_error(book_ids):
+    """
+    403 when the caller tries to put books they cannot read into a collection,
+    since collections grant their creator and project members access to their books.
+    """
+    unreadable = get_auth_context().unreadable_book_ids(book_ids)
+    if unreadable:
+        return jsonify({"error": "You cannot add books you do not have access to", "bookIds": unreadable}), 403
+    return None
+
 # ---------- Create Collection ----------
 @collection_bp.route("", methods=["POST"])
 @jwt_required()
@@ -29,10 +42,14 @@ def create_collection():
             return jsonify({"error": "At least one book is required"}), 400
 
         user_id = get_jwt_identity()
+        book_ids = [ObjectId(bid) for bid in book_ids if ObjectId.is_valid(bid)]
+        unreadable_error = _unreadable_books_error(book_ids)
+        if unreadable_error:
+            return unreadable_error
 
         doc = {
             "name": name,
-            "bookIds": [ObjectId(bid) for bid in book_ids if ObjectId.is_valid(bid)],
+            "bookIds": book_ids,
             "createdBy": ObjectId(user_id),
             "projectId": ObjectId(project_id) if project_id and ObjectId.is_valid(project_id) else None,
             "createdAt": datetime.now(timezone.utc),
@@ -53,7 +70,9 @@ def create_collection():
                     }
                 }
             )
-        
+
+        invalidate(COLLECTIONS, PROJECTS)
+        refresh_access(user_id, *(access_model.project_user_ids(mongo, [project_id]) if doc["projectId"] else []))
         return jsonify({"message": "Collection created", "collectionId": str(collection_id)}), 201
 
     except Exception as e:
@@ -68,12 +87,9 @@ def add_collections_to_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can add collections"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can add collections")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         collection_ids = data.get("collectionIds", [])
@@ -100,6 +116,8 @@ def add_collections_to_project(project_id):
                 {"_id": {"$in": valid_collection_ids}},
                 {"$set": {"projectId": ObjectId(project_id), "updatedAt": datetime.now(timezone.utc)}}
             )
+            invalidate(COLLECTIONS, PROJECTS)
+            refresh_access(*access_model.project_user_ids(mongo, [project_id]))
             return jsonify({"message": "Collections added to project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -116,12 +134,9 @@ def remove_collections_from_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != str(user_id):
-            return jsonify({"error": "Unauthorized: Only the project creator can remove collections"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized: Only the project creator can remove collections")
+        if owner_error:
+            return owner_error
 
         data = request.get_json()
         collection_ids = data.get("collectionIds", [])
@@ -148,6 +163,8 @@ def remove_collections_from_project(project_id):
                 {"_id": {"$in": valid_collection_ids}},
                 {"$unset": {"projectId": ""}, "$set": {"updatedAt": datetime.now(timezone.utc)}}
             )
+            invalidate(COLLECTIONS, PROJECTS)
+            refresh_access(*access_model.project_user_ids(mongo, [project_id]))
             return jsonify({"message": "Collections removed from project"}), 200
         else:
             return jsonify({"error": "No changes made to the project"}), 400
@@ -159,6 +176,7 @@ def remove_collections_from_project(project_id):
 @collection_bp.route("/projects/<project_id>/collections", methods=["GET"])
 @jwt_required()
 @role_required(ALLOWED_ROLES)
+@cached_response(COLLECTIONS, PROJECTS)
 def get_project_collections(project_id):
     try:
         if not ObjectId.is_valid(project_id):
@@ -178,15 +196,17 @@ def get_project_collections(project_id):
 @collection_bp.route("", methods=["GET"])
 @jwt_required()
 @role_required(ALLOWED_ROLES)
+@cached_response(COLLECTIONS, PROJECTS, per_user=True)
 def get_all_collections():
     try:
-        user_id = ObjectId(get_jwt_identity())
-        user_projects = project_model.get_projects_by_member(mongo, str(user_id))
-        project_ids = [ObjectId(p["_id"]) for p in user_projects]
-
-        collections = collection_model.get_visible_collections(mongo, user_id, project_ids)
-        return jsonify({"collections": collections}), 200
+        page = parse_page_request(collection_model.COLLECTION_SORTS, "-createdAt")
+        collections, next_cursor = collection_model.get_visible_collections(
+            mongo, get_auth_context().collection_ids, page
+        )
+        return page_response(collections, next_cursor, key="collections")
 
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -199,21 +219,13 @@ def get_collection(collection_id):
         if not ObjectId.is_valid(collection_id):
             return jsonify({"error": "Invalid collection ID"}), 400
 
-        user_id = ObjectId(get_jwt_identity())
         collection = collection_model.get_collection_by_id(mongo, collection_id)
         if not collection:
             return jsonify({"error": "Collection not found"}), 404
 
         # Authorization: allow if creator or project member
-        if str(collection["createdBy"]) != str(user_id):
-            project_ids = [ObjectId(pid) for pid in collection.get("projectIds", [])]
-            if project_ids:
-                project = mongo.db[PROJECT_COLLECTION].find_one({
-                    "_id": {"$in": project_ids},
-                    "memberIds": user_id
-                })
-                if not project:
-                    return jsonify({"error": "Access denied"}), 403
+        if not get_auth_context().can_access_collection(collection_id):
+            return jsonify({"error": "Access denied"}), 403
 
         return jsonify({"collection": collection}), 200
     except Exception as e:
@@ -259,11 +271,20 @@ def update_collection(collection_id):
             update_fields["bookIds"] = [ObjectId(bid) for bid in current_books if bid not in remove_ids and ObjectId.is_valid(bid)]
             print(f"Removing book IDs: {remove_ids}, New bookIds: {update_fields['bookIds']}")
 
+        if "bookIds" in update_fields:
+            current_books = {str(bid) for bid in collection.get("bookIds", [])}
+            unreadable_error = _unreadable_books_error([bid for bid in update_fields["bookIds"] if str(bid) not in current_books])
+            if unreadable_error:
+                return unreadable_error
+
         update_fields["updatedAt"] = datetime.now(timezone.utc)
 
         success = collection_model.update_collection(mongo, collection_id, update_fields)
         print(f"Update result: modified_count={success}")
         if success:
+            invalidate(COLLECTIONS)
+            if "bookIds" in update_fields:
+                refresh_access(*access_model.users_with_access(mongo, "collectionIds", [collection_id]))
             return jsonify({"message": "Collection updated"}), 200
         else:
             return jsonify({"error": "Update failed, no changes made"}), 500
@@ -288,8 +309,11 @@ def delete_collection(collection_id):
         if str(collection["createdBy"]) != str(user_id):
             return jsonify({"error": "Only the creator can delete this collection"}), 403
 
+        affected_user_ids = access_model.users_with_access(mongo, "collectionIds", [collection_id])
         success = collection_model.delete_collection(mongo, collection_id)
         if success:
+            invalidate(COLLECTIONS)
+            refresh_access(*affected_user_ids)
             return jsonify({"message": "Collection deleted"}), 200
         else:
             return jsonify({"error": "Delete failed"}), 500
@@ -1,13 +1,19 @@
-from flask import Blueprint, jsonify, send_file, request
+from flask import Blueprint, jsonify, request, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
 import json
-import pandas as pd
-import io
 from bson import ObjectId 
 from ..extensions import mongo
+from ..helpers.signed_urls import sign_source_url
+from ..helpers.structured_index import query_structured_data
+from ..helpers import export_helpers, columnar_export
+from ..helpers.zip_stream import stream_zip
+from ..helpers.batch_loader import get_loader
+from ..helpers.auth_context import get_auth_context
+from ..helpers.pagination import PaginationError, iter_batches, parse_page_request, paginate, page_response
+from ..models import event_model
+from werkzeug.utils import secure_filename
 from urllib.parse import quote
-import xlsxwriter
 import urllib.parse 
 from dotenv import load_dotenv
 
@@ -19,12 +25,20 @@ load_dotenv()
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..","uploads"))
 API_BASE_URL = os.getenv("BASE_URL")
+MAX_STRUCTURED_PAGE_SIZE = 500
+# Public sort names for upload lists, each backed by an index ending in _id
+UPLOAD_SORTS = {"uploadTime": "upload_time", "filename": "filename"}
 # print("API_BASE_URL", API_BASE_URL)
 
 
 @bp.route("/excel-data/<book_id>", methods=["GET"])
 @jwt_required()
 def get_excel_data(book_id):
+    """
+    Returns a book's structured data. Optional query parameters:
+    limit/cursor for pagination, pageFrom/pageTo, year or yearFrom/yearTo,
+    location, participant, and fields (comma-separated keys to return).
+    """
     user_id = get_jwt_identity()
     print(f"Received request for Book ID: {book_id}, User ID: {user_id}")
 
@@ -61,27 +75,61 @@ def get_excel_data(book_id):
         return jsonify({"error": "No fileUrl available"}), 404
 
     try:
-        with open(absolute_path, "r", encoding="utf-8") as json_file:
-            structured_data = json.load(json_file)
+        year = request.args.get("year", type=int)
+        filters = {
+            "page_from": request.args.get("pageFrom", type=int),
+            "page_to": request.args.get("pageTo", type=int),
+            "year_from": request.args.get("yearFrom", year, type=int),
+            "year_to": request.args.get("yearTo", year, type=int),
+            "location": (request.args.get("location") or "").strip().lower() or None,
+            "participant": (request.args.get("participant") or "").strip().lower() or None,
+        }
+        fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()] or None
+        cursor = request.args.get("cursor", "0")
+        if not cursor.isdigit():
+            return jsonify({"error": "Invalid cursor"}), 400
+        cursor = int(cursor)
+        limit = request.args.get("limit", type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_STRUCTURED_PAGE_SIZE))
+
+        structured_data, next_cursor = query_structured_data(
+            absolute_path, filters=filters, cursor=cursor, limit=limit, fields=fields
+        )
+        for entry in structured_data:
+            if isinstance(entry, dict) and entry.get("Source URL"):
+                entry["Source URL"] = sign_source_url(entry["Source URL"], user_id)
         print("✅ Successfully loaded structured data!")
-        return jsonify({"data": structured_data}), 200
+        return jsonify({"data": structured_data, "nextCursor": next_cursor}), 200
     except FileNotFoundError:
         print("❌ Structured data file not found at:", absolute_path)
         return jsonify({"error": "Structured data file not found"}), 404
     except json.JSONDecodeError:
         print("❌ Error decoding JSON data!")
         return jsonify({"error": "Error decoding structured data"}), 500
+    except ValueError as e:
+        # Raised for a cursor past the end; JSONDecodeError is handled above
+        return jsonify({"error": str(e)}), 400
 
 # ---------------------------------------------Excel Download API-----------------------------------------------
 @bp.route("/export-excel", methods=["GET"])
 @jwt_required()
 def export_excel():
+    """
+    Exports a book's structured data. `format` selects xlsx (default), or parquet /
+    arrow for a typed, columnar file of the book's events.
+    """
     user_id = get_jwt_identity()
     book_id = request.args.get("bookId")
+    export_format = request.args.get("format", "xlsx").lower()
     print(f"Received request for Book ID: {book_id}")
 
     if not book_id:
         return jsonify({"error": "Book ID is required"}), 400
+    if export_format != "xlsx" and export_format not in columnar_export.COLUMNAR_FORMATS:
+        return jsonify({"error": "Unsupported export format"}), 400
+    if export_format != "xlsx" and not columnar_export.columnar_available():
+        return jsonify({"error": "Columnar exports require pyarrow"}), 501
     
     try:
         book_object_id =(book_id)  
@@ -91,7 +139,7 @@ def export_excel():
     
     user_upload = mongo.db.uploads.find_one(
         {"user_id": user_id, "_id": book_object_id}, 
-        {"structured_data_path": 1, "filename": 1}
+        {"structured_data_path": 1, "filename": 1, "events_count": 1, "user_id": 1}
     )
     if not user_upload:
         return jsonify({"error": "No structured data found"}), 404
@@ -102,123 +150,108 @@ def export_excel():
     absolute_path = os.path.join(BASE_DIR, structured_data_path)
     print("Absolute Path for export excel:", absolute_path)
 
-    if not structured_data_path or not os.path.exists(absolute_path):
+    if user_upload.get("events_count") is None and (not structured_data_path or not os.path.exists(absolute_path)):
         return jsonify({"error": "Structured data file not found"}), 404
 
-    # Load JSON data from the structured data file
-    with open(absolute_path, "r", encoding="utf-8") as json_file:
-        structured_data = json.load(json_file)
+    # Rows are streamed from the events collection (or the NDJSON copy) into the export cache;
+    # repeat downloads of an unchanged book are served from there
+    cache_path, cache_key = export_helpers.build_book_export(
+        mongo, user_upload, absolute_path, user_id, fmt=export_format, link_base=API_BASE_URL
+    )
+    if not cache_path:
+        return jsonify({"error": "No structured data to export"}), 400
 
-    # Process data into a structured format
-    extracted_rows = []
-    sr_no = 1
-    
-    for entry in structured_data:
-        sr_no = 1
-        source_url = entry.get("Source URL")
-        result_data = entry.get("Result")
-        
-        if not result_data or result_data.strip() == "":
-            parsed_result = {}
-        else:
-            try:
-                parsed_result = json.loads(result_data)
-                if not isinstance(parsed_result, dict):  
-                    parsed_result = {}
-            except json.JSONDecodeError:
-                parsed_result = {}
-        events = parsed_result.get("Events")
-        if not isinstance(events, list):
-            events = []
-
-        if not events:
-            row = {
-                # "Sr. No": sr_no,
-                "Event Name": "N/A",
-                "Description": "N/A",
-                "Participants/People": "N/A",
-                "Location": "N/A",
-                "Place": "N/A",
-                "Start Date": "N/A",
-                "End Date": "N/A",
-                "Key Details": "N/A",
-                "Day": "N/A",
-                "Month": "N/A",
-                "Year": "N/A",
-                "General Comments": "N/A",
-                "Source URL": source_url
-            }
-
-            # Skip if all values (except Sr. No and Source URL) are N/A
-            data_fields = [v for k, v in row.items() if k not in ["Sr. No", "Source URL"]]
-            if all(val == "N/A" for val in data_fields):
-                continue
-
-            extracted_rows.append(row)
-            sr_no += 1
-        else:
-            for event in events:
-                if not isinstance(event, dict):
-                    continue
-                row = {
-                    # "Sr. No": sr_no,
-                    "Event Name": event.get("Event Name", "N/A"),
-                    "Description": event.get("Description", "N/A"),
-                    "Participants": ", ".join(str(p) for p in event.get("Participants/People", []) if p) if isinstance(event.get("Participants/People"), list) else "N/A",
-                    "Location": event.get("Location", "N/A"),
-                    "Place": event.get("Place", "N/A"),
-                    "Start Date": event.get("Start Date", "N/A"),
-                    "End Date": event.get("End Date", "N/A"),
-                    "Key Details": event.get("Key Details", "N/A"),
-                    "Day": event.get("Day", "N/A"),
-                    "Month": event.get("Month", "N/A"),
-                    "Year": event.get("Year", "N/A"),
-                    "General Comments": event.get("General Comments", "N/A"),
-                    "Source URL": source_url
-                }
-
-                # Check if all fields except Sr. No and Source URL are N/A
-                data_fields = [v for k, v in row.items() if k not in ["Sr. No", "Source URL"]]
-                if all(val == "N/A" for val in data_fields):
-                    continue  # Skip this row
-
-                extracted_rows.append(row)
-                sr_no += 1
-
-
-    if not extracted_rows:
+    # Extract filename without extension and append the format's extension
+    download_name = f"{os.path.splitext(original_filename)[0]}.{export_format}"
+    return export_helpers.send_cached_export(cache_path, cache_key, download_name)
+
+@bp.route("/export-dataset", methods=["GET"])
+@jwt_required()
+def export_dataset():
+    """
+    Exports the events of every book in a collection (collectionId) or project
+    (projectId) as one hive-partitioned Parquet or Arrow dataset, zipped.
+    """
+    export_format = request.args.get("format", "parquet").lower()
+    if export_format not in columnar_export.COLUMNAR_FORMATS:
+        return jsonify({"error": "Unsupported export format"}), 400
+    if not columnar_export.columnar_available():
+        return jsonify({"error": "Columnar exports require pyarrow"}), 501
+
+    context = get_auth_context()
+    scope, status = export_helpers.resolve_export_scope(
+        mongo, context,
+        collection_id=request.args.get("collectionId"),
+        project_id=request.args.get("projectId")
+    )
+    if status != 200:
+        return jsonify(scope), status
+
+    # Library books resolve to the caller's own linked uploads; events are keyed by upload id
+    uploads, skipped = export_helpers.resolve_scope_uploads(mongo, context, scope["bookIds"], {"_id": 1})
+    upload_ids = [str(upload["_id"]) for upload in uploads]
+    book_ids = event_model.books_with_events(mongo, upload_ids) if upload_ids else []
+    if not book_ids:
         return jsonify({"error": "No structured data to export"}), 400
 
-    
-    column_order = list(extracted_rows[0].keys())
+    root_name = secure_filename(scope["name"]) or "dataset"
+    manifest = {
+        "name": scope["name"],
+        "bookIds": scope["bookIds"],
+        "uploads": {upload["libraryBookId"]: str(upload["_id"]) for upload in uploads},
+        "booksWithEvents": sorted(book_ids),
+        "skipped": [{"bookId": bid, "reason": "Book is not accessible"} for bid in scope["unreachableIds"]] + skipped,
+    }
+    zip_path = export_helpers.new_export_path("zip")
+    events = event_model.get_books_events(mongo, book_ids, {"_id": 0})
+    columnar_export.build_dataset_archive(
+        events, current_app.config["EXPORT_FOLDER"], zip_path, export_format, manifest, root_name
+    )
+    return export_helpers.send_export_file(zip_path, f"{root_name}-{export_format}.zip")
 
- 
-    df = pd.DataFrame(extracted_rows)[column_order]
+@bp.route("/export-bulk", methods=["GET"])
+@jwt_required()
+def export_bulk():
+    """
+    Exports every book of a collection (collectionId) or project (projectId) as
+    one ZIP of per-book files in `format` (xlsx, parquet or arrow). Books are
+    exported in parallel and each file is streamed as soon as it is ready.
+    """
+    user_id = get_jwt_identity()
+    export_format = request.args.get("format", "xlsx").lower()
+    if export_format != "xlsx" and export_format not in columnar_export.COLUMNAR_FORMATS:
+        return jsonify({"error": "Unsupported export format"}), 400
+    if export_format != "xlsx" and not columnar_export.columnar_available():
+        return jsonify({"error": "Columnar exports require pyarrow"}), 501
+
+    context = get_auth_context()
+    scope, status = export_helpers.resolve_export_scope(
+        mongo, context,
+        collection_id=request.args.get("collectionId"),
+        project_id=request.args.get("projectId")
+    )
+    if status != 200:
+        return jsonify(scope), status
+
+    # Library books resolve to the caller's own linked uploads, whatever else the scope holds
+    uploads, skipped = export_helpers.resolve_scope_uploads(
+        mongo, context, scope["bookIds"],
+        {"structured_data_path": 1, "filename": 1, "events_count": 1, "user_id": 1}
+    )
+    if not uploads:
+        return jsonify({"error": "No structured data to export"}), 400
+    skipped = [{"bookId": bid, "reason": "Book is not accessible"} for bid in scope["unreachableIds"]] + skipped
+
+    members = export_helpers.iter_bulk_export_members(
+        current_app._get_current_object(), mongo, uploads, skipped, user_id,
+        export_format, API_BASE_URL, current_app.config["EXPORT_WORKERS"]
+    )
+    root_name = secure_filename(scope["name"]) or "export"
+    response = Response(stream_zip(members), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(root_name)}-{export_format}.zip"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-    
-    output = io.BytesIO()
-    df["Source URL"]
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Structured Data")
-         # Apply formatting for hyperlinks
-        workbook = writer.book
-        worksheet = writer.sheets["Structured Data"]
-        hyperlink_format = workbook.add_format({'font_color': 'blue', 'underline': 1})
-        source_url_column_index = df.columns.get_loc("Source URL")
-        for row_num, url in enumerate(df["Source URL"], start=0):
-            if url and url != "N/A":
-                # Prepend the API base URL
-                full_url = f"{API_BASE_URL}/{url}"
-                
-                # Write clickable link to Excel
-                worksheet.write_url(row_num + 1, source_url_column_index, full_url, hyperlink_format, "Open PDF")
-
-    output.seek(0)
-
-    # Extract filename without extension and append .xlsx
-    excel_filename = f"{os.path.splitext(original_filename)[0]}.xlsx"
-
-    return send_file(output, as_attachment=True, download_name=excel_filename)
 @bp.route("/users", methods=["GET"])
 def get_users():
     try:
@@ -232,28 +265,36 @@ def get_users():
 
 @bp.route("/uploads", methods=["GET"])
 def get_uploads():
+    """
+    Every user's uploads as a list, one page at a time: sort (uploadTime or
+    filename), limit, and cursor from the X-Next-Cursor header, or all=true.
+    """
     try:
-        uploads_collection = mongo.db.uploads
-        users_collection = mongo.db.users
-
-        uploads = list(uploads_collection.find({}, {
+        page = parse_page_request(UPLOAD_SORTS, "-uploadTime")
+        uploads, next_cursor = paginate(mongo.db.uploads, {}, page, {
             "_id": 1, "filename": 1, "folder_name": 1, "upload_time": 1, "file_size": 1, "user_id": 1
-        }))
+        })
+        return page_response(_serialize_uploads(uploads), next_cursor)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        for upload in uploads:
+
+
+def _serialize_uploads(uploads):
+    """Adds uploader name and email, loading the users of each batch of uploads in one query."""
+    users_loader = get_loader(mongo, "users", projection={"name": 1, "email": 1})
+    for batch in iter_batches(uploads, current_app.config["NDJSON_BATCH_SIZE"]):
+        users_loader.prime(upload.get("user_id") for upload in batch)
+        for upload in batch:
             upload["_id"] = str(upload["_id"])
             upload["user_id"] = str(upload["user_id"])
 
-            
-            user = users_collection.find_one({"_id": ObjectId(upload["user_id"])}, {"name": 1, "email": 1})
+            user = users_loader.load(upload["user_id"])
             upload["uploaded_by"] = user["name"] if user else "Unknown"
             upload["uploader_email"] = user["email"] if user else "Unknown"
-
-        return jsonify(uploads), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-
+            yield upload
 
 @bp.route("/users/<user_id>", methods=["DELETE"])
 def delete_user(user_id):
@@ -1,23 +1,25 @@
-from flask import Blueprint, send_from_directory, current_app,request, jsonify, request
-import os
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from bson import ObjectId
 from ..extensions import mongo, socketio
-from ..models.file_handling import rename_book, delete_book
+from ..models.file_handling import rename_book, delete_book, link_library_book
+from ..helpers.auth_context import get_auth_context
+from ..helpers.file_serving import send_stored_file
+from ..helpers.signed_urls import signed_url_required
+from ..helpers.pdf_pages import wants_page_extract, send_page_extract
 
 bp = Blueprint("file_bp",__name__, url_prefix="/api")
 
 @bp.route("/uploads/<path:foldername>/<path:filename>")
+@signed_url_required("/api/uploads/")
 def serve_file(foldername, filename):
     """
     Serve the requested file (PDF or image) from the uploads directory.
+    With ?page=N or ?pages=N-M only those pages of a PDF are returned.
     """
-    upload_folder = current_app.config["UPLOAD_FOLDER"]
-    file_path = os.path.join(upload_folder, foldername, filename)
-
-    if not os.path.exists(file_path):
-        return {"error": "File not found"}, 404
-
-    return send_from_directory(os.path.dirname(file_path), os.path.basename(file_path))
+    if wants_page_extract():
+        return send_page_extract(current_app.config["UPLOAD_FOLDER"], f"{foldername}/{filename}")
+    return send_stored_file(current_app.config["UPLOAD_FOLDER"], f"{foldername}/{filename}")
 
 
 @bp.route("/rename-file", methods=["PUT"])
@@ -37,6 +39,29 @@ def rename_upload():
 
     return jsonify(response), status
 
+@bp.route("/link-book", methods=["PUT"])
+@jwt_required()
+def link_upload_to_book():
+    """
+    API route to link an upload to the library book it was extracted from, so
+    collection and project exports can find its structured data.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    book_id = data.get("book_id")
+    library_book_id = data.get("library_book_id")
+
+    if not book_id:
+        return jsonify({"error": "Missing book_id"}), 400
+    if library_book_id is not None:
+        if not isinstance(library_book_id, str) or not ObjectId.is_valid(library_book_id):
+            return jsonify({"error": "Invalid library_book_id"}), 400
+        if get_auth_context().unreadable_book_ids([library_book_id]):
+            return jsonify({"error": "Library book not found"}), 404
+
+    response, status = link_library_book(mongo, book_id, library_book_id, user_id)
+    return jsonify(response), status
+
 @bp.route("/delete-file", methods=["DELETE"])
 @jwt_required()
 def delete_upload():
@@ -1,10 +1,19 @@
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from ..helpers.file_helpers import allowed_file, create_pdf_preview
+from ..helpers.quota_helpers import storage_quota_required, reserve_upload
+from ..helpers.file_serving import send_stored_file
+from ..helpers.signed_urls import signed_url_required, sign_path
+from ..helpers.pdf_pages import wants_page_extract, send_page_extract
+from ..helpers.structured_index import build_structured_index
+from ..helpers.export_helpers import invalidate_book_exports
+from ..helpers.auth_context import get_auth_context
+from ..helpers.pagination import PaginationError, parse_page_request, paginate, page_response
+from ..models import event_model, token_ledger_model, usage_rollup_model
 from ..extensions import mongo, socketio
 from flask_socketio import emit
-from .data import get_excel_data
+from .data import get_excel_data, UPLOAD_SORTS
 import os
 from .chunking import process_and_get_chunks
 import requests
@@ -15,7 +24,6 @@ import sys
 import time
 from bson import ObjectId 
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -28,6 +36,7 @@ bp = Blueprint("upload", __name__, url_prefix="/api")
 
 @bp.route("/upload-pdf", methods=["POST"])
 @jwt_required()
+@storage_quota_required
 def upload_pdf():
     global selected_llm_model 
     user_id = get_jwt_identity()
@@ -41,6 +50,12 @@ def upload_pdf():
         return jsonify({"error": "Invalid file type"}), 400
     
     selected_llm_model = request.form.get("model", "local")
+    # Optional: the library book (books id) this PDF is a copy of, for collection/project exports
+    library_book_id = request.form.get("bookId") or None
+    if library_book_id is not None and (
+        not ObjectId.is_valid(library_book_id) or get_auth_context().unreadable_book_ids([library_book_id])
+    ):
+        return jsonify({"error": "Library book not found"}), 404
     print(f"Selected model type: {selected_llm_model}")
     
     LLM_URL = {
@@ -66,6 +81,13 @@ def upload_pdf():
 
     file_path = os.path.join(book_folder, filename)
     file.save(file_path)
+    file_size = os.path.getsize(file_path)
+
+    context = get_auth_context()
+    uploader_role = context.role if context and context.role else "user"
+    if not reserve_upload(user_id, uploader_role, file_size):
+        os.remove(file_path)
+        return jsonify({"error": "Storage quota exceeded"}), 413
     
     book_id = str(ObjectId())
     socketio.emit("upload_status", {"message": f"File {filename} uploaded successfully!","book_id": book_id}, room=user_id)
@@ -108,14 +130,14 @@ def upload_pdf():
         book_id,
         os.path.join(book_folder, f"{book_name}.csv"), 
         book_folder, book_name, user_id, filename, preview_url,file_path, unique_folder_name,
-        selected_llm_url
+        selected_llm_url, file_size, library_book_id
     )
 
 # ***************************************************** Send Chunks to the LLM *****************************************************
 
 
 
-def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id, filename, preview_url, file_path, unique_folder_name, selected_llm_url):
+def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id, filename, preview_url, file_path, unique_folder_name, selected_llm_url, file_size=None, library_book_id=None):
     """ Sends CSV data as an SSE request and processes responses in real time. """
     csv_file_path = os.path.join(book_folder, f"{book_name}.csv")
 
@@ -161,6 +183,7 @@ def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id,
 
             first_entry = True
             total_chunks = 0
+            usage_counter = token_ledger_model.UsageCounter()
             start_time = time.time()
             processed_chunks = 0
             
@@ -176,6 +199,7 @@ def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id,
 
                         chunk_response = json.loads(decoded_line)
                         structured_data.append(chunk_response)
+                        usage_counter.add(chunk_response)
                         total_chunks += 1  
                         processed_chunks += 1  
 
@@ -211,6 +235,28 @@ def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id,
             }, room=user_id)
 
         print(f"✅ Structured data successfully saved to {structured_data_path}")
+        build_structured_index(structured_data_path)
+        invalidate_book_exports(book_id)
+
+        event_count = None
+        try:
+            event_count = event_model.ingest_structured_data(mongo, structured_data, book_id, user_id)
+            print(f"✅ Normalized {event_count} events into the events collection")
+        except Exception as e:
+            print(f"❌ Error normalizing events: {e}")
+
+        try:
+            token_ledger_model.record_usage(
+                mongo, book_id, user_id, filename, selected_llm_model, usage_counter.chunks,
+                prompt_tokens=usage_counter.prompt_tokens, completion_tokens=usage_counter.completion_tokens
+            )
+            usage_rollup_model.record_usage_event(
+                mongo, user_id, selected_llm_model, "upload-pdf", usage_counter.chunks,
+                prompt_tokens=usage_counter.prompt_tokens, completion_tokens=usage_counter.completion_tokens,
+                duration_ms=int((end_time - start_time) * 1000)
+            )
+        except Exception as e:
+            print(f"❌ Error recording token usage: {e}")
 
     except requests.exceptions.RequestException as e:
         socketio.emit("progress_update", {"message": "Error communicating with LLM", "progress": -1, "book_id": book_id}, room=user_id)
@@ -228,6 +274,12 @@ def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id,
             "structured_data_path": f"{unique_folder_name}/{structured_data_filename}",
             "selected_llm": selected_llm_model
         }
+        if file_size is not None:
+            upload_record["file_size"] = file_size
+        if library_book_id:
+            upload_record["libraryBookId"] = library_book_id
+        if event_count is not None:
+            upload_record["events_count"] = event_count
 
         result = mongo.db.uploads.insert_one(upload_record)
         print("✅ MongoDB record saved successfully:",book_id, result.inserted_id)
@@ -255,13 +307,11 @@ def send_chunks_to_llm(book_id, csv_file_path, book_folder, book_name, user_id,
 # --------------------------------------------------------------------Function for Data Routes----------------------------------------------------------------------
 
 @bp.route("/uploads/<path:file_path>")
+@signed_url_required("/api/uploads/")
 def serve_file(file_path):
-    full_path = os.path.join(current_app.config["UPLOAD_FOLDER"], file_path)
-    
-    if not os.path.exists(full_path):
-        return jsonify({"error": "File not found"}), 404
-    
-    return send_from_directory(os.path.dirname(full_path), os.path.basename(full_path))
+    if wants_page_extract():
+        return send_page_extract(current_app.config["UPLOAD_FOLDER"], file_path)
+    return send_stored_file(current_app.config["UPLOAD_FOLDER"], file_path)
 
 def serialize_document(doc):
     """Convert MongoDB ObjectId to string in a document"""
@@ -270,37 +320,48 @@ def serialize_document(doc):
 @bp.route("/upload-history", methods=["GET"])
 @jwt_required()
 def get_upload_history():
+    """
+    The user's uploads, one page at a time: sort (uploadTime or filename, "-"
+    for descending; default -uploadTime), limit/cursor, or all=true.
+    """
     user_id = get_jwt_identity()
 
-    books = list(
-        mongo.db.uploads.find(
-            {"user_id": user_id},
-            {"_id": 1,
-             "filename": 1,
-             "fileUrl":1,
-             "folder_name": 1,
-             "preview_url": 1,
-             "upload_time": 1, 
-             "structured_data_path": 1,
-             "selected_llm": 1,
-            }
-        )
+    try:
+        page = parse_page_request(UPLOAD_SORTS, "-uploadTime")
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    books, next_cursor = paginate(
+        mongo.db.uploads,
+        {"user_id": user_id},
+        page,
+        {"_id": 1,
+         "filename": 1,
+         "fileUrl":1,
+         "folder_name": 1,
+         "preview_url": 1,
+         "upload_time": 1, 
+         "structured_data_path": 1,
+         "selected_llm": 1,
+        }
     )
+    return page_response(_serialize_upload_history(books, user_id), next_cursor, key="uploads")
+
+def _serialize_upload_history(books, user_id):
     for book in books:
         book["book_id"] = str(book["_id"])
         
         if "folder_name" in book and book["folder_name"]:
-            book["fileUrl"] = f"{book['folder_name']}/{book['filename']}"
+            book["fileUrl"] = sign_path(f"{book['folder_name']}/{book['filename']}", user_id)
             
         if "preview_url" in book and book["preview_url"]:
-            book["preview_url"] = f"{book['preview_url']}"
+            book["preview_url"] = sign_path(book["preview_url"], user_id)
             
         
         if "structured_data_path" in book and book["structured_data_path"]:
             structured_data_filename = os.path.basename(book["structured_data_path"])
-            book["structured_Data_path"] = f"{book['folder_name']}/{structured_data_filename}"
+            book["structured_Data_path"] = sign_path(f"{book['folder_name']}/{structured_data_filename}", user_id)
             
         if "selected_llm" in book:
             book["selected_llm"] = book["selected_llm"]           
 
-    return jsonify({"uploads": books}), 200
\ No newline at end of file
+        yield book
\ No newline at end of file
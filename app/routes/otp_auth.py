@@ -1,20 +1,10 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import random
-import smtplib
-import os
-from email.mime.text import MIMEText
-from dotenv import load_dotenv
 from bson.objectid import ObjectId
 from ..models.user import User
 from ..extensions import bcrypt, mongo
-
-# Load email config from .env
-load_dotenv()
-EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT"))
-EMAIL_USER = os.getenv("EMAIL_USER")
-EMAIL_PASS = os.getenv("EMAIL_PASS")
+from ..helpers.mailer import send_email_now
 
 otp_bp = Blueprint("otp", __name__, url_prefix="/api")
 
@@ -69,42 +59,18 @@ def register_init():
 
 
     try:
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; background-color: #f4f4f4; padding: 30px;">
-            <div style="max-width: 600px; margin: auto; background-color: #ffffff; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.05); overflow: hidden;">
-            <div style="background-color: #003366; padding: 20px; text-align: center;">
-                <img src="https://raw.githubusercontent.com/Coding-with-Gaurav/KTB-LLM-web/refs/heads/main/graphiti1.png" alt="Company Logo" style="max-height: 50px;" />
-                <h2 style="color: white; margin: 10px 0 0;">Histo AI wants to verify your email</h2>
-            </div>
-            <div style="padding: 30px; color: #333;">
-                <p>Dear <strong>{full_name}</strong>,</p>
-                <p>Thank you for registering. Please use the following One Time Password (OTP) to verify your email address:</p>
-                <p style="font-size: 22px; font-weight: bold; letter-spacing: 2px; color: #003366;">{otp}</p>
-                <p>This OTP is valid for <strong>10 minutes</strong>.</p>
-                <p>If you did not initiate this request, please ignore this email.</p>
-                <p>Regards,<br><strong>Graphiti Multimedia</strong></p>
-            </div>
-            <div style="background-color: #f1f1f1; text-align: center; padding: 15px; font-size: 12px; color: #777;">
-                © {datetime.now(timezone.utc).year} Graphiti Multimedia. All rights reserved.
-            </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        msg = MIMEText(html_content, "html")
-        msg["Subject"] = "Verify Your Email - OTP Inside"
-        msg["From"] = EMAIL_USER
-        msg["To"] = email
-
-
-        smtp = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        smtp.starttls()
-        smtp.login(EMAIL_USER, EMAIL_PASS)
-        smtp.send_message(msg)
-        smtp.quit()
-
+        # Sent inline rather than queued: the code is only good for 10 minutes
+        unsent = send_email_now(
+            "email/verify_otp.html",
+            "Verify Your Email - OTP Inside",
+            [{"email": email, "fullName": full_name, "otp": otp}],
+            deliver_by=expiry
+        )
+        if unsent:
+            return jsonify({
+                "message": "OTP email could not be sent yet; it will be retried until the code expires",
+                "temp_token": email
+            }), 202
         return jsonify({"message": "OTP sent for verification", "temp_token": email}), 200
 
     except Exception as e:
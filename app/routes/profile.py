@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.user import User
+from ..helpers.auth_context import invalidate_auth_context
 from bson.objectid import ObjectId
 from datetime import datetime, timezone
 import os
@@ -159,6 +160,7 @@ def user_profile():
         if not updated_user:
             logger.error("Failed to update profile")
             return jsonify({"error": "Failed to update profile"}), 500
+        invalidate_auth_context(user_id)
 
         # Construct full avatar URL for response
         avatar = updated_user.get("avatar")
@@ -4,9 +4,12 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from datetime import datetime, timezone
 
-from ..models import project_model
+from ..models import access_model, project_model
 from ..extensions import mongo
-from ..helpers.auth_helpers import role_required
+from ..helpers.auth_helpers import role_required, project_owner_error
+from ..helpers.auth_context import get_auth_context, refresh_access
+from ..helpers.pagination import PaginationError, parse_page_request, page_response
+from ..helpers.response_cache import PROJECTS, invalidate
 from ..models.user import UserRoles
 
 project_bp = Blueprint("project", __name__, url_prefix="/api/projects")
@@ -17,9 +20,11 @@ project_bp = Blueprint("project", __name__, url_prefix="/api/projects")
 @role_required([UserRoles.ADMIN])
 def fetch_projects():
     try:
-        projects = project_model.get_all_projects(mongo)
-        print(f"all Project{projects}")
-        return jsonify({"projects": projects}), 200
+        page = parse_page_request(project_model.PROJECT_SORTS, "-createdAt")
+        projects, next_cursor = project_model.get_all_projects(mongo, page)
+        return page_response(projects, next_cursor, key="projects")
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -36,6 +41,31 @@ def get_project(project_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# ------------------ GET: Project Workspace ------------------
+@project_bp.route("/<project_id>/workspace", methods=["GET"])
+@jwt_required()
+@role_required([UserRoles.ADMIN, UserRoles.PM, UserRoles.BM, UserRoles.USER])
+def get_project_workspace(project_id):
+    """
+    Everything the project screen needs in one response: the project, its
+    members, books with OCR status and progress, collections, and a count of
+    books per OCR status. Open to admins and to the project's creator and members.
+    """
+    try:
+        if not ObjectId.is_valid(project_id):
+            return jsonify({"error": "Invalid project ID"}), 400
+
+        context = get_auth_context()
+        if context.role != UserRoles.ADMIN and not context.in_project(project_id):
+            return jsonify({"error": "Unauthorized"}), 403
+
+        workspace = project_model.get_project_workspace(mongo, project_id)
+        if not workspace:
+            return jsonify({"error": "Project not found"}), 404
+        return jsonify(workspace), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # ------------------ POST: Create Project ------------------
 @project_bp.route("", methods=["POST"])
 @jwt_required()
@@ -73,6 +103,8 @@ def create_project():
         }
 
         project_id = project_model.create_project(mongo, project_data)
+        invalidate(PROJECTS)
+        refresh_access(user_id, *valid_member_ids)
         return jsonify({"message": "Project created", "projectId": str(project_id)}), 201
 
     except Exception as e:
@@ -118,11 +150,9 @@ def update_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
         
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != get_jwt_identity():
-            return jsonify({"error": "Unauthorized"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized")
+        if owner_error:
+            return owner_error
         
         data = request.get_json()
         update_fields = {}
@@ -139,8 +169,11 @@ def update_project(project_id):
 
         update_fields["updatedAt"] = datetime.now(timezone.utc)
 
+        previous_user_ids = access_model.project_user_ids(mongo, [project_id])
         success = project_model.update_project(mongo, project_id, update_fields)
         if success:
+            invalidate(PROJECTS)
+            refresh_access(*previous_user_ids, *update_fields.get("memberIds", []))
             return jsonify({"message": "Project updated successfully"}), 200
         else:
             return jsonify({"error": "Project not found"}), 404
@@ -156,14 +189,15 @@ def delete_project(project_id):
         if not ObjectId.is_valid(project_id):
             return jsonify({"error": "Invalid project ID"}), 400
         
-        project = project_model.get_project_by_id(mongo, project_id)
-        if not project:
-            return jsonify({"error": "Project not found"}), 404
-        if str(project.get("createdBy")) != get_jwt_identity():
-            return jsonify({"error": "Unauthorized"}), 403
+        owner_error = project_owner_error(project_id, "Unauthorized")
+        if owner_error:
+            return owner_error
         
+        affected_user_ids = access_model.project_user_ids(mongo, [project_id])
         deleted = project_model.delete_project(mongo, project_id)
         if deleted:
+            invalidate(PROJECTS)
+            refresh_access(*affected_user_ids)
             return jsonify({"message": "Project deleted successfully"}), 200
         else:
             return jsonify({"error": "Project not found"}), 404
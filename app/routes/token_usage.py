@@ -1,11 +1,16 @@
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import os
-import json
+from datetime import datetime, timezone
 from ..extensions import mongo
+from ..models import token_ledger_model, usage_rollup_model
+from ..models.user import UserRoles
+from ..helpers.auth_context import get_auth_context
 
 bp = Blueprint("token_usage", __name__, url_prefix="/api")
 
+USAGE_GROUPS = ("user", "book", "model", "day")
+TIMESERIES_GROUPS = {"user": "userId", "model": "model", "endpoint": "endpoint"}
+
 
 @bp.route("/token_usage", methods=["GET"])
 @jwt_required()
@@ -13,7 +18,7 @@ def get_user_token_usage():
     """Get total tokens used by the logged-in user along with book-wise usage"""
     user_id = get_jwt_identity()
     total_tokens_used, book_details = calculate_tokens_for_user(user_id)
-    
+
     return jsonify({
         "user_id": user_id,
         "total_tokens_used": total_tokens_used,
@@ -24,57 +29,88 @@ def get_user_token_usage():
 @jwt_required()
 def get_all_users_token_usage():
     """Admin route to get all users, their total tokens, and book-wise usage"""
-    user_ids = mongo.db.uploads.distinct("user_id")
-    
-    user_token_data = []
-
-    for user_id in user_ids:
-        total_tokens_used, book_details = calculate_tokens_for_user(user_id)
-        user_token_data.append({
-            "user_id": user_id,
-            "total_tokens_used": total_tokens_used,
-            "books": book_details
-        })
+    user_token_data = token_ledger_model.get_all_users_book_usage(mongo)
 
     return jsonify({"users": user_token_data}), 200
 
-
-def calculate_tokens_for_user(user_id):
-    """Helper function to calculate total tokens used by a user and book-wise token usage"""
-    uploads = mongo.db.uploads.find(
-        {"user_id": user_id},
-        {"structured_data_path": 1, "filename": 1, "_id": 1}  # Include book_id and name
+@bp.route("/token_usage/summary", methods=["GET"])
+@jwt_required()
+def get_token_usage_summary():
+    """
+    Ledger totals grouped by user, book, model or day (groupBy). Optional filters:
+    from/to (ISO dates, `to` exclusive), model, and userId (admins only; other
+    users always see their own usage).
+    """
+    user_id = get_jwt_identity()
+    group_by = request.args.get("groupBy", "book")
+    if group_by not in USAGE_GROUPS:
+        return jsonify({"error": f"groupBy must be one of {', '.join(USAGE_GROUPS)}"}), 400
+
+    context = get_auth_context()
+    if context and context.role == UserRoles.ADMIN:
+        scope_user_id = request.args.get("userId")
+    else:
+        scope_user_id = user_id
+
+    try:
+        start = _parse_date(request.args.get("from"))
+        end = _parse_date(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO dates"}), 400
+
+    results = token_ledger_model.aggregate_usage(
+        mongo, group_by, user_id=scope_user_id, start=start, end=end, model=request.args.get("model")
     )
+    return jsonify({"groupBy": group_by, "results": results}), 200
 
-    total_tokens_used = 0
-    book_details = []
-
-    for upload in uploads:
-        book_id = str(upload["_id"])
-        filename = upload.get("filename", "Unknown Book")
-        structured_data_path = upload.get("structured_data_path")
-
-        if not structured_data_path:
-            continue
-
-        full_path = os.path.join(current_app.config["UPLOAD_FOLDER"], structured_data_path)
-
-        if not os.path.exists(full_path):
-            print(f"Warning: File {full_path} not found.")
-            continue
+@bp.route("/usage/timeseries", methods=["GET"])
+@jwt_required()
+def get_usage_timeseries():
+    """
+    LLM usage and cost over time from the hourly/daily rollups (granularity).
+    Optional: from/to (ISO dates), groupBy (user, model or endpoint), model,
+    endpoint, and userId (admins only; other users always see their own usage).
+    """
+    user_id = get_jwt_identity()
+    granularity = request.args.get("granularity", "day")
+    if granularity not in usage_rollup_model.GRANULARITIES:
+        return jsonify({"error": "granularity must be hour or day"}), 400
+    group_by = request.args.get("groupBy")
+    if group_by and group_by not in TIMESERIES_GROUPS:
+        return jsonify({"error": f"groupBy must be one of {', '.join(TIMESERIES_GROUPS)}"}), 400
+
+    context = get_auth_context()
+    if context and context.role == UserRoles.ADMIN:
+        scope_user_id = request.args.get("userId")
+    else:
+        scope_user_id = user_id
+
+    try:
+        start = _parse_date(request.args.get("from"))
+        end = _parse_date(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "from/to must be ISO dates"}), 400
+
+    series = usage_rollup_model.get_usage_timeseries(
+        mongo, granularity, start=start, end=end,
+        group_by=TIMESERIES_GROUPS.get(group_by),
+        user_id=scope_user_id,
+        model=request.args.get("model"),
+        endpoint=request.args.get("endpoint")
+    )
+    return jsonify({
+        "granularity": granularity,
+        "series": series,
+        "rolledUpTo": usage_rollup_model.get_rollup_watermark(mongo)
+    }), 200
 
-        try:
-            with open(full_path, "r", encoding="utf-8") as json_file:
-                structured_data = json.load(json_file)
-                token_count = len(structured_data)
-                total_tokens_used += token_count
-                book_details.append({
-                    "book_id": book_id,
-                    "book_name": filename,
-                    "tokens_used": token_count
-                })
-        except Exception as e:
-            print(f"Error reading {full_path}: {e}")
 
-    return total_tokens_used, book_details
+def _parse_date(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
+def calculate_tokens_for_user(user_id):
+    """Helper function to get total tokens used by a user and book-wise token usage from the ledger"""
+    return token_ledger_model.get_user_book_usage(mongo, user_id)
@@ -10,8 +10,100 @@ celery_app = Celery(
     backend=os.getenv("REDIS_URL", "redis://localhost:6379/0")
 )
 
+celery_app.conf.beat_schedule = {
+    "reconcile-storage-usage": {
+        "task": "celery_worker.reconcile_storage_usage_task",
+        "schedule": float(os.getenv("STORAGE_RECONCILE_INTERVAL", 3600)),
+    },
+    "deliver-email-outbox": {
+        "task": "celery_worker.deliver_email_outbox_task",
+        "schedule": float(os.getenv("EMAIL_OUTBOX_INTERVAL", 30)),
+    },
+    "rollup-usage": {
+        "task": "celery_worker.rollup_usage_task",
+        "schedule": float(os.getenv("USAGE_ROLLUP_INTERVAL", 300)),
+    },
+}
+
+_flask_app = None
+
+def get_flask_app():
+    """Creates the Flask app once per worker so tasks can use its config and Mongo client."""
+    global _flask_app
+    if _flask_app is None:
+        from app import create_app
+        _flask_app = create_app()
+    return _flask_app
+
 @celery_app.task
 def process_document_task(file_path, metadata):
     # Import your existing functions and call them here
     from app.routes.upload import full_process_document
     return full_process_document(file_path, metadata)
+
+@celery_app.task
+def reconcile_storage_usage_task():
+    from app.extensions import mongo
+    from app.models.usage_model import reconcile_storage_usage
+    app = get_flask_app()
+    with app.app_context():
+        return reconcile_storage_usage(
+            mongo,
+            app.config["BOOK_UPLOAD_FOLDER"],
+            app.config["UPLOAD_FOLDER"],
+            max_workers=app.config["STORAGE_RECONCILE_WORKERS"]
+        )
+
+@celery_app.task
+def backfill_events_task():
+    from app.extensions import mongo
+    from app.models.event_model import backfill_events
+    app = get_flask_app()
+    with app.app_context():
+        return backfill_events(mongo, app.config["UPLOAD_FOLDER"])
+
+@celery_app.task
+def backfill_token_ledger_task():
+    from app.extensions import mongo
+    from app.models.token_ledger_model import backfill_token_ledger
+    app = get_flask_app()
+    with app.app_context():
+        return backfill_token_ledger(mongo, app.config["UPLOAD_FOLDER"])
+
+@celery_app.task
+def backfill_book_ocr_status_task():
+    from app.extensions import mongo
+    from app.models.ocr_model import backfill_book_ocr_status
+    app = get_flask_app()
+    with app.app_context():
+        return backfill_book_ocr_status(mongo)
+
+@celery_app.task
+def rebuild_user_access_task():
+    from app.extensions import mongo
+    from app.models.access_model import rebuild_all_user_access
+    app = get_flask_app()
+    with app.app_context():
+        return rebuild_all_user_access(mongo)
+
+@celery_app.task
+def cleanup_deleted_books_task(file_names):
+    from app.routes.book_routes import cleanup_deleted_books
+    app = get_flask_app()
+    with app.app_context():
+        return cleanup_deleted_books(file_names)
+
+@celery_app.task
+def deliver_email_outbox_task():
+    from app.helpers.mailer import deliver_outbox
+    app = get_flask_app()
+    with app.app_context():
+        return deliver_outbox()
+
+@celery_app.task
+def rollup_usage_task():
+    from app.extensions import mongo
+    from app.models.usage_rollup_model import rollup_usage
+    app = get_flask_app()
+    with app.app_context():
+        return rollup_usage(mongo)
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+mongomock = pytest.importorskip("mongomock")
+
+from app.config import Config
+from app.helpers import export_helpers
+from app.models.user import UserRoles
+
+
+class FakeMongo:
+    """Stands in for flask_pymongo's PyMongo: only `.db` is used by the helpers."""
+
+    def __init__(self):
+        self.db = mongomock.MongoClient().db
+
+
+class FakeContext:
+    def __init__(self, user_id, collection_ids=(), book_ids=(), role=UserRoles.PM):
+        self.user_id = user_id
+        self.role = role
+        self.collection_ids = {str(cid) for cid in collection_ids}
+        self.book_ids = {str(bid) for bid in book_ids}
+
+    def can_access_collection(self, collection_id):
+        return str(collection_id) in self.collection_ids
+
+    def can_access_book(self, book_id):
+        return str(book_id) in self.book_ids
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path / "uploads"), EXPORT_FOLDER=str(tmp_path / "exports"))
+    return app
+
+
+@pytest.fixture
+def library(app):
+    """A collection holding one library book, and a processed upload of it with one event."""
+    mongo = FakeMongo()
+    owner_id = str(ObjectId())
+    book_id = mongo.db.books.insert_one({"bookName": "Annals", "ocrStatus": "completed", "visibility": "public"}).inserted_id
+    collection_id = mongo.db.collections.insert_one({"name": "Chronicles", "bookIds": [book_id]}).inserted_id
+    upload_id = str(ObjectId())
+    mongo.db.uploads.insert_one({
+        "_id": upload_id, "user_id": owner_id, "libraryBookId": str(book_id), "filename": "annals.pdf",
+        "structured_data_path": "annals/annals_structured.json", "events_count": 1,
+        "upload_time": datetime.now(timezone.utc),
+    })
+    mongo.db.events.insert_one({
+        "bookId": upload_id, "chunkIndex": 0, "eventIndex": 0, "eventName": "Treaty signed",
+        "year": "1648", "sourceUrl": "annals/annals.pdf#page=3",
+    })
+    return mongo, owner_id, str(book_id), collection_id
+
+
+def _bulk_members(app, mongo, context, collection_id):
+    with app.app_context():
+        scope, status = export_helpers.resolve_export_scope(mongo, context, collection_id=str(collection_id))
+        assert status == 200
+        uploads, skipped = export_helpers.resolve_scope_uploads(
+            mongo, context, scope["bookIds"], {"structured_data_path": 1, "filename": 1, "events_count": 1, "user_id": 1}
+        )
+        members = export_helpers.iter_bulk_export_members(
+            app, mongo, uploads, skipped, context.user_id, "xlsx", "http://localhost/api/uploads", 2
+        )
+        return [(name, data if isinstance(data, bytes) else data.read()) for name, data in members]
+
+
+def test_collection_with_processed_book_exports_its_upload(app, library):
+    mongo, owner_id, book_id, collection_id = library
+    context = FakeContext(owner_id, collection_ids=[collection_id], book_ids=[book_id])
+
+    members = _bulk_members(app, mongo, context, collection_id)
+
+    names = [name for name, _ in members]
+    assert names == ["annals.xlsx", "manifest.json"]
+    assert len(members[0][1]) > 0
+    manifest = json.loads(members[1][1])
+    assert manifest["exported"][0]["bookId"] == book_id
+    assert manifest["skipped"] == []
+
+
+def test_other_users_uploads_are_not_exported(app, library):
+    mongo, _, book_id, collection_id = library
+    context = FakeContext(str(ObjectId()), collection_ids=[collection_id], book_ids=[book_id])
+
+    members = _bulk_members(app, mongo, context, collection_id)
+
+    assert [name for name, _ in members] == ["manifest.json"]
+    assert json.loads(members[0][1])["skipped"][0]["bookId"] == book_id
+
+
+def test_dataset_scope_reads_events_of_linked_upload(app, library, tmp_path):
+    mongo, owner_id, book_id, collection_id = library
+    context = FakeContext(owner_id, collection_ids=[collection_id], book_ids=[book_id])
+    pytest.importorskip("pyarrow")
+    from app.helpers import columnar_export
+    from app.models import event_model
+
+    with app.app_context():
+        scope, _ = export_helpers.resolve_export_scope(mongo, context, collection_id=str(collection_id))
+        uploads, _ = export_helpers.resolve_scope_uploads(mongo, context, scope["bookIds"], {"_id": 1})
+        upload_ids = [str(upload["_id"]) for upload in uploads]
+        assert event_model.books_with_events(mongo, upload_ids) == upload_ids
+
+        zip_path = tmp_path / "dataset.zip"
+        (tmp_path / "exports").mkdir()
+        rows = columnar_export.build_dataset_archive(
+            event_model.get_books_events(mongo, upload_ids, {"_id": 0}), str(tmp_path / "exports"),
+            str(zip_path), "parquet", {"name": scope["name"]}, "chronicles"
+        )
+    assert rows == 1
+    assert zip_path.stat().st_size > 0
+
+
+
+def test_abandoned_bulk_export_closes_files_of_running_exports(app, library, monkeypatch):
+    mongo, owner_id, book_id, _ = library
+    fast = mongo.db.uploads.find_one({"libraryBookId": book_id})
+    slow = dict(fast, _id=str(ObjectId()), filename="slow.pdf")
+    release, finished = threading.Event(), threading.Event()
+    opened = {}
+
+    def fake_export(mongo, upload, structured_path, user_id, fmt="xlsx", link_base=None):
+        if upload["_id"] == slow["_id"]:
+            release.wait(5)
+        path = os.path.join(app.config["EXPORT_FOLDER"], f"{upload['_id']}.xlsx")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"data")
+        return path, "key"
+
+    def tracking_open(path, mode="r", *args, **kwargs):
+        handle = real_open(path, mode, *args, **kwargs)
+        if mode == "rb":
+            opened[os.path.basename(path)] = handle
+            if os.path.basename(path).startswith(slow["_id"]):
+                finished.set()
+        return handle
+
+    real_open = open
+    monkeypatch.setattr(export_helpers, "build_book_export", fake_export)
+    monkeypatch.setattr("builtins.open", tracking_open)
+    members = export_helpers.iter_bulk_export_members(app, mongo, [fast, slow], [], owner_id, "xlsx", None, 2)
+
+    assert next(members)[0] == "annals.xlsx"
+    members.close()  # the client disconnects while the slow export is still running
+    release.set()
+    assert finished.wait(5)
+    # The done callback closes the file on the worker thread right after the export returns
+    deadline = time.monotonic() + 5
+    while not all(handle.closed for handle in opened.values()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert all(handle.closed for handle in opened.values())